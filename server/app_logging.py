@@ -0,0 +1,105 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# Leveled, queue-backed logging for the API server
+#
+# Modules get their logger with get_logger(__name__). Records are handed to a
+# bounded in-memory queue and written to stdout by a single background
+# thread, so request threads never block on stdout. Records below LOG_LEVEL
+# are rejected before any formatting happens, and use %-style arguments so
+# disabled debug output costs only a level check.
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()  # text | json
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s [%(process)d] %(name)s: %(message)s"
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for log shippers"""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_lock = threading.Lock()
+_handler = None
+_listener = None
+
+def _make_formatter():
+    if LOG_FORMAT == 'json':
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+def _start_listener():
+    global _listener
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(_make_formatter())
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=False)
+    _listener.start()
+
+def setup_logging():
+    """Install the queue handler on the root logger (idempotent)"""
+    global _handler
+    with _lock:
+        if _handler is not None:
+            return
+        _handler = _DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        root = logging.getLogger()
+        root.handlers[:] = [_handler]
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        _start_listener()
+        atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    if _listener is not None:
+        _listener.stop()
+
+def _after_fork_in_child():
+    # The writer thread does not survive fork. Give the child its own queue
+    # so records the parent had not written yet are not written twice.
+    if _handler is not None:
+        _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        _start_listener()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def get_logger(name):
+    """Return the logger for a module, configuring logging on first use"""
+    setup_logging()
+    return logging.getLogger(name)
+
+def logging_stats():
+    return {
+        "level": logging.getLevelName(logging.getLogger().level),
+        "queued": _handler.queue.qsize() if _handler is not None else 0,
+        "dropped": _handler.dropped if _handler is not None else 0,
+    }
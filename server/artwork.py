@@ -1,10 +1,14 @@
 from database import get_db_connection, dict_from_row, json_dumps
-from auth import verify_token
+from catalog_cache import cached, invalidate
+from pagination import keyset_clause, limit_clause, split_page
 import json
 import os
-import base64
-import time
 from decimal import Decimal
+from app_logging import get_logger
+from image_store import decode_base64_image, store_image
+from image_variants import schedule_variants, variant_urls
+
+logger = get_logger(__name__)
 
 # Create the uploads directory if it doesn't exist
 def ensure_uploads_directory():
@@ -12,14 +16,14 @@ def ensure_uploads_directory():
     uploads_dir = os.path.join(os.path.dirname(__file__), "static", "uploads")
     if not os.path.exists(uploads_dir):
         os.makedirs(uploads_dir)
-        print(f"Created directory: {uploads_dir}")
+        logger.info("Created directory: %s", uploads_dir)
 
 # Call this function to ensure directory exists
 ensure_uploads_directory()
 
 # Function to handle image storage
-def save_image_from_base64(base64_str, name_prefix="artwork"):
-    """Save a base64 image to the uploads directory and return the path"""
+def save_image_from_base64(base64_str):
+    """Save a base64 image to the content-addressed uploads store and return its path"""
     if not base64_str:
         return None
         
@@ -28,44 +32,35 @@ def save_image_from_base64(base64_str, name_prefix="artwork"):
         return base64_str
     
     try:
-        # Extract the image data from the base64 string
-        if "," in base64_str:
-            # For format like "data:image/jpeg;base64,/9j/4AAQSk..."
-            image_format, base64_data = base64_str.split(",", 1)
-            if ';base64' not in image_format:
-                print("Warning: Not a valid base64 image format")
-                return None
-        else:
-            # Assume it's just the base64 data
-            base64_data = base64_str
-        
         try:
-            # Decode the base64 data
-            image_data = base64.b64decode(base64_data)
-        except Exception as e:
-            print(f"Failed to decode base64 data: {e}")
+            decoded = decode_base64_image(base64_str)
+        except ValueError as e:
+            logger.warning("Failed to decode base64 data: %s", e)
             return "/static/uploads/placeholder.jpg"
+        if decoded is None:
+            logger.warning("Not a valid base64 image format")
+            return None
         
-        # Generate a unique filename based on timestamp
-        timestamp = time.strftime("%Y%m%d%H%M%S")
-        filename = f"{name_prefix}_{timestamp}.jpg"
-        
-        # Save to the uploads directory
-        uploads_dir = os.path.join(os.path.dirname(__file__), "static", "uploads")
-        if not os.path.exists(uploads_dir):
-            os.makedirs(uploads_dir)
-            
-        file_path = os.path.join(uploads_dir, filename)
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-        
-        # Return the URL path to the image (ALWAYS use the standard format)
-        return f"/static/uploads/{filename}"
+        # Identical images share one file
+        image_data, mime_type = decoded
+        return store_image(image_data, mime_type)
     except Exception as e:
-        print(f"Error saving image: {e}")
+        logger.error("Error saving image: %s", e)
         return None
 
-def get_all_artworks():
+def _needs_uploads_prefix(image_url):
+    """Bare file names are served from /static/uploads/; paths and inline data are not"""
+    return not (image_url.startswith('/static/') or image_url.startswith('data:') or 'base64' in image_url)
+
+def get_all_artworks(limit=None, after=None):
+    """Get artworks, newest first (served from the catalog cache when fresh)
+
+    With a limit, returns one page plus a next_cursor (None on the last page);
+    `after` is the decoded cursor of the previous page.
+    """
+    return cached('artworks', ('list', limit, after), lambda: _load_all_artworks(limit, after))
+
+def _load_all_artworks(limit=None, after=None):
     connection = get_db_connection()
     if connection is None:
         return {"error": "Database connection failed"}
@@ -73,75 +68,53 @@ def get_all_artworks():
     cursor = connection.cursor()
     
     try:
-        query = """
+        where_sql, where_params = keyset_clause("created_at", "id", after)
+        limit_sql, limit_params = limit_clause(limit)
+        query = f"""
         SELECT id, title, artist, description, price, image_url, 
-               dimensions, medium, year, status
+               dimensions, medium, year, status, created_at
         FROM artworks
-        ORDER BY created_at DESC
+        {"WHERE " + where_sql if where_sql else ""}
+        ORDER BY created_at DESC, id DESC
+        {limit_sql}
         """
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        cursor.execute(query, where_params + limit_params)
+        rows, next_cursor = split_page(cursor.fetchall(), limit,
+                                       cursor.column_names.index('created_at'), cursor.column_names.index('id'))
         
         artworks = []
         for row in rows:
             artwork = dict_from_row(row, cursor)
+            artwork.pop('created_at')
             
             # Convert id to string to match frontend expectations
             artwork['id'] = str(artwork['id'])
             
-            # Format image URL if needed - ALWAYS ensure it has the correct prefix
-            if artwork['image_url']:
-                # Handle base64 images
-                if artwork['image_url'].startswith('data:') or 'base64' in artwork['image_url']:
-                    # Save the base64 image to a file and get its path
-                    saved_path = save_image_from_base64(artwork['image_url'])
-                    if saved_path:
-                        # Update the database with the new path
-                        update_artwork_image(artwork['id'], saved_path)
-                        artwork['image_url'] = saved_path
-                        print(f"Converted base64 image to file: {saved_path}")
-                elif not artwork['image_url'].startswith('/static/'):
-                    artwork['image_url'] = f"/static/uploads/{os.path.basename(artwork['image_url'])}"
-                
-                # Log the final image URL for debugging
-                print(f"Final image URL for {artwork['title']}: {artwork['image_url']}")
+            # Bare file names get the uploads prefix; inline base64 images are
+            # returned as stored until image_migration converts them
+            if artwork['image_url'] and _needs_uploads_prefix(artwork['image_url']):
+                artwork['image_url'] = f"/static/uploads/{os.path.basename(artwork['image_url'])}"
+            # Resized variants for srcset (derived from the name, no disk access)
+            artwork['image_variants'] = variant_urls(artwork['image_url'])
                 
             artworks.append(artwork)
         
+        if limit is not None:
+            return {"artworks": artworks, "next_cursor": next_cursor}
         return {"artworks": artworks}
     except Exception as e:
-        print(f"Error getting artworks: {e}")
+        logger.error("Error getting artworks: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-def update_artwork_image(artwork_id, image_path):
-    connection = get_db_connection()
-    if connection is None:
-        return False
-    
-    cursor = connection.cursor()
-    
-    try:
-        query = """
-        UPDATE artworks
-        SET image_url = %s
-        WHERE id = %s
-        """
-        cursor.execute(query, (image_path, artwork_id))
-        connection.commit()
-        return True
-    except Exception as e:
-        print(f"Error updating artwork image: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
-
 def get_artwork(artwork_id):
+    """Get a single artwork (served from the catalog cache when fresh)"""
+    return cached('artworks', ('detail', str(artwork_id)), lambda: _load_artwork(artwork_id))
+
+def _load_artwork(artwork_id):
     connection = get_db_connection()
     if connection is None:
         return {"error": "Database connection failed"}
@@ -166,69 +139,35 @@ def get_artwork(artwork_id):
         artwork['id'] = str(artwork['id'])
         
         # Format image URL if needed
-        if artwork['image_url']:
-            # Handle base64 images
-            if artwork['image_url'].startswith('data:') or artwork['image_url'].startswith('base64,'):
-                # Save the base64 image to a file and get the file path
-                saved_path = save_image_from_base64(artwork['image_url'])
-                if saved_path:
-                    # Update the database with the new path
-                    update_artwork_image(artwork['id'], saved_path)
-                    artwork['image_url'] = saved_path
-                    print(f"Converted base64 image to file: {saved_path}")
-            elif not artwork['image_url'].startswith('/static/'):
-                artwork['image_url'] = f"/static/uploads/{os.path.basename(artwork['image_url'])}"
+        if artwork['image_url'] and _needs_uploads_prefix(artwork['image_url']):
+            artwork['image_url'] = f"/static/uploads/{os.path.basename(artwork['image_url'])}"
+        artwork['image_variants'] = variant_urls(artwork['image_url'])
         
         return artwork
     except Exception as e:
-        print(f"Error getting artwork: {e}")
+        logger.error("Error getting artwork: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-def create_artwork(auth_header, artwork_data):
+def create_artwork(claims, artwork_data):
     """Create a new artwork (admin or artist only)"""
-    print(f"\n--- Create Artwork Request ---")
-    print(f"Auth Header: {auth_header}")
-    print(f"Artwork Data: {artwork_data}")
+    logger.debug("Create Artwork Request")
+    logger.debug("Artwork Data: %s", artwork_data)
     
-    if not auth_header:
-        print("ERROR: Authentication header missing")
+    if not claims:
         return {"error": "Authentication required"}
     
-    # Extract token from header - handle both formats
-    token = None
-    if auth_header.startswith('Bearer '):
-        token = auth_header[7:]
-    else:
-        parts = auth_header.split(" ")
-        if len(parts) > 1:
-            token = parts[1]
-    
-    if not token:
-        print("ERROR: No token found in header")
-        return {"error": "Invalid authentication token"}
-    
-    # Verify token and check if user is admin or artist
-    print(f"Verifying token: {token[:20]}...")
-    payload = verify_token(token)
-    print(f"Token verification result: {payload}")
-    
-    # Check if verification returned an error
-    if isinstance(payload, dict) and "error" in payload:
-        print(f"ERROR: Token verification failed: {payload['error']}")
-        return {"error": f"Authentication failed: {payload['error']}"}
-    
     # Check if user is admin or artist
-    is_admin = payload.get("is_admin", False)
-    is_artist = payload.get("is_artist", False)
-    artist_id = payload.get("sub") if is_artist else None
-    print(f"Is admin: {is_admin}, Is artist: {is_artist}, Artist ID: {artist_id}")
+    is_admin = claims.get("is_admin", False)
+    is_artist = claims.get("is_artist", False)
+    artist_id = claims.get("sub") if is_artist else None
+    logger.debug("Is admin: %s, Is artist: %s, Artist ID: %s", is_admin, is_artist, artist_id)
     
     if not (is_admin or is_artist):
-        print("ERROR: Access denied - Neither admin nor artist")
+        logger.warning("Access denied - Neither admin nor artist")
         return {"error": "Unauthorized access: Admin or artist privileges required"}
     
     # Continue with artwork creation
@@ -244,7 +183,7 @@ def create_artwork(auth_header, artwork_data):
             try:
                 artwork_data = json.loads(artwork_data)
             except json.JSONDecodeError as e:
-                print(f"ERROR: Failed to parse artwork data: {e}")
+                logger.warning("Failed to parse artwork data: %s", e)
                 return {"error": f"Invalid artwork data format: {str(e)}"}
         
         # Handle the image - convert base64 to file if needed
@@ -254,19 +193,19 @@ def create_artwork(auth_header, artwork_data):
             saved_image_path = save_image_from_base64(image_url)
             if saved_image_path:
                 image_url = saved_image_path
-                print(f"Image saved to: {saved_image_path}")
+                logger.debug("Image saved to: %s", saved_image_path)
             else:
-                print("Failed to save image")
+                logger.error("Failed to save image")
                 image_url = "/placeholder.svg"
         
         # If artist is creating artwork, use their name from token
         if is_artist and not is_admin:
-            artist_name = payload.get("name", artwork_data.get("artist", "Unknown Artist"))
+            artist_name = claims.get("name", artwork_data.get("artist", "Unknown Artist"))
             artwork_data["artist"] = artist_name
             # Make sure we set the artist_id in the database
             artwork_data["artist_id"] = artist_id
         
-        print(f"Inserting artwork data: {artwork_data}")
+        logger.debug("Inserting artwork data: %s", artwork_data)
         query = """
         INSERT INTO artworks (title, artist, description, price, image_url,
                            dimensions, medium, year, status, artist_id)
@@ -285,51 +224,31 @@ def create_artwork(auth_header, artwork_data):
             artwork_data.get("artist_id", artist_id)  # Use artist_id from token if available
         ))
         connection.commit()
+        invalidate('artworks')
+        schedule_variants(image_url)
         
         # Return the newly created artwork
         new_artwork_id = cursor.lastrowid
-        print(f"Artwork created successfully with ID: {new_artwork_id}")
-        return get_artwork(new_artwork_id)
+        logger.info("Artwork created successfully with ID: %s", new_artwork_id)
     except Exception as e:
-        print(f"ERROR creating artwork: {e}")
+        logger.error("Error creating artwork: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
+    # Read back only after the connection is returned, so a write never holds two pool slots
+    return get_artwork(new_artwork_id)
 
-def update_artwork(auth_header, artwork_id, artwork_data):
+def update_artwork(claims, artwork_id, artwork_data):
     """Update an existing artwork (admin or artist who owns it)"""
-    if not auth_header:
+    if not claims:
         return {"error": "Authentication required"}
     
-    # Extract token from header
-    token = None
-    if auth_header.startswith('Bearer '):
-        token = auth_header[7:]
-    else:
-        parts = auth_header.split(" ")
-        if len(parts) > 1:
-            token = parts[1]
-    
-    if not token:
-        return {"error": "Invalid authentication token"}
-    
-    # Debug token verification
-    print(f"Verifying token for update_artwork: {token[:20]}...")
-    
-    # Verify token and check if user is admin
-    payload = verify_token(token)
-    print(f"Token verification result: {payload}")
-    
-    # Check if verification returned an error
-    if isinstance(payload, dict) and "error" in payload:
-        return {"error": f"Token verification failed: {payload['error']}"}
-    
     # Check if user is admin or artist
-    is_admin = payload.get("is_admin", False)
-    is_artist = payload.get("is_artist", False)
-    artist_id = payload.get("sub") if is_artist else None
+    is_admin = claims.get("is_admin", False)
+    is_artist = claims.get("is_artist", False)
+    artist_id = claims.get("sub") if is_artist else None
     
     connection = get_db_connection()
     if connection is None:
@@ -355,9 +274,9 @@ def update_artwork(auth_header, artwork_id, artwork_data):
             saved_image_path = save_image_from_base64(image_url)
             if saved_image_path:
                 image_url = saved_image_path
-                print(f"Image saved to: {saved_image_path}")
+                logger.debug("Image saved to: %s", saved_image_path)
             else:
-                print("Failed to save image")
+                logger.error("Failed to save image")
                 # Keep the original image URL if saving fails
                 cursor.execute("SELECT image_url FROM artworks WHERE id = %s", (artwork_id,))
                 result = cursor.fetchone()
@@ -385,53 +304,31 @@ def update_artwork(auth_header, artwork_id, artwork_data):
             artwork_id
         ))
         connection.commit()
+        invalidate('artworks')
+        schedule_variants(image_url)
         
         # Check if artwork was found and updated
         if cursor.rowcount == 0:
             return {"error": "Artwork not found"}
-        
-        # Return the updated artwork
-        return get_artwork(artwork_id)
     except Exception as e:
-        print(f"Error updating artwork: {e}")
+        logger.error("Error updating artwork: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
+    # Read back only after the connection is returned, so a write never holds two pool slots
+    return get_artwork(artwork_id)
 
-def delete_artwork(auth_header, artwork_id):
+def delete_artwork(claims, artwork_id):
     """Delete an artwork (admin or artist who owns it)"""
-    if not auth_header:
+    if not claims:
         return {"error": "Authentication required"}
     
-    # Extract token from header
-    token = None
-    if auth_header.startswith('Bearer '):
-        token = auth_header[7:]
-    else:
-        parts = auth_header.split(" ")
-        if len(parts) > 1:
-            token = parts[1]
-    
-    if not token:
-        return {"error": "Invalid authentication token"}
-    
-    # Debug token verification
-    print(f"Verifying token for delete_artwork: {token[:20]}...")
-    
-    # Verify token and check if user is admin or artist
-    payload = verify_token(token)
-    print(f"Token verification result: {payload}")
-    
-    # Check if verification returned an error
-    if isinstance(payload, dict) and "error" in payload:
-        return {"error": f"Token verification failed: {payload['error']}"}
-    
     # Check if user is admin or artist
-    is_admin = payload.get("is_admin", False)
-    is_artist = payload.get("is_artist", False)
-    artist_id = payload.get("sub") if is_artist else None
+    is_admin = claims.get("is_admin", False)
+    is_artist = claims.get("is_artist", False)
+    artist_id = claims.get("sub") if is_artist else None
     
     connection = get_db_connection()
     if connection is None:
@@ -451,6 +348,7 @@ def delete_artwork(auth_header, artwork_id):
         query = "DELETE FROM artworks WHERE id = %s"
         cursor.execute(query, (artwork_id,))
         connection.commit()
+        invalidate('artworks')
         
         # Check if artwork was found and deleted
         if cursor.rowcount == 0:
@@ -458,7 +356,7 @@ def delete_artwork(auth_header, artwork_id):
         
         return {"success": True, "message": "Artwork deleted successfully"}
     except Exception as e:
-        print(f"Error deleting artwork: {e}")
+        logger.error("Error deleting artwork: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
@@ -5,9 +5,11 @@ import secrets
 import string
 import time
 from database import get_db_connection
+# Tokens are signed with the key middleware verifies them with
+from middleware import SECRET_KEY
+from app_logging import get_logger
 
-# Secret key for JWT
-SECRET_KEY = "your_secret_key_for_jwt"  # In production, use an environment variable
+logger = get_logger(__name__)
 
 # Token expiry (24 hours in seconds)
 TOKEN_EXPIRY = 60 * 60 * 24
@@ -31,27 +33,10 @@ def check_password(password, hashed_password):
     hashed_bytes = hashed_password.encode('utf-8')
     return bcrypt.checkpw(password_bytes, hashed_bytes)
 
-def verify_token(token):
-    """Verify a JWT token"""
-    try:
-        print(f"Verifying token: {token[:20]}...")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        print(f"Token decoded successfully: {payload}")
-        return payload
-    except jwt.ExpiredSignatureError:
-        print("Token verification failed: Token expired")
-        return {"error": "Token expired"}
-    except jwt.InvalidTokenError as e:
-        print(f"Token verification failed: Invalid token - {str(e)}")
-        return {"error": f"Invalid token: {str(e)}"}
-    except Exception as e:
-        print(f"Unexpected error during token verification: {str(e)}")
-        return {"error": f"Token verification error: {str(e)}"}
-
 def generate_token(user_id, name, is_admin=False, is_artist=False, is_corporate=False):
     """Generate a JWT token for authentication"""
     payload = {
-        "sub": user_id,
+        "sub": str(user_id),  # PyJWT rejects non-string subjects
         "name": name,
         "is_admin": is_admin,
         "is_artist": is_artist,
@@ -97,7 +82,7 @@ def register_user(name, email, password, phone=""):
         return {"token": token, "user_id": user_id, "name": name}
         
     except Exception as e:
-        print(f"Error registering user: {e}")
+        logger.error("Error registering user: %s", e)
         connection.rollback()
         return {"error": str(e)}
     finally:
@@ -140,7 +125,7 @@ def register_artist(name, email, password, phone="", bio=""):
         return {"token": token, "artist_id": artist_id, "name": name}
         
     except Exception as e:
-        print(f"Error registering artist: {e}")
+        logger.error("Error registering artist: %s", e)
         connection.rollback()
         return {"error": str(e)}
     finally:
@@ -188,7 +173,7 @@ def register_corporate_user(name, email, password, phone="", company_name="", re
         return {"token": token, "corporate_user_id": corporate_id, "name": name}
         
     except Exception as e:
-        print(f"Error registering corporate user: {e}")
+        logger.error("Error registering corporate user: %s", e)
         connection.rollback()
         return {"error": str(e)}
     finally:
@@ -224,7 +209,7 @@ def login_user(email, password):
         return {"token": token, "user_id": user_id, "name": name}
         
     except Exception as e:
-        print(f"Error logging in user: {e}")
+        logger.error("Error logging in user: %s", e)
         return {"error": str(e)}
     finally:
         cursor.close()
@@ -259,7 +244,7 @@ def login_artist(email, password):
         return {"token": token, "artist_id": artist_id, "name": name}
         
     except Exception as e:
-        print(f"Error logging in artist: {e}")
+        logger.error("Error logging in artist: %s", e)
         return {"error": str(e)}
     finally:
         cursor.close()
@@ -294,7 +279,7 @@ def login_corporate_user(email, password):
         return {"token": token, "corporate_user_id": corporate_id, "name": name}
         
     except Exception as e:
-        print(f"Error logging in corporate user: {e}")
+        logger.error("Error logging in corporate user: %s", e)
         return {"error": str(e)}
     finally:
         cursor.close()
@@ -329,7 +314,7 @@ def login_admin(email, password):
         return {"token": token, "admin_id": admin_id, "name": name}
         
     except Exception as e:
-        print(f"Error logging in admin: {e}")
+        logger.error("Error logging in admin: %s", e)
         return {"error": str(e)}
     finally:
         cursor.close()
@@ -0,0 +1,389 @@
+"""Load-test the API server against a local SQLite stand-in database
+
+Starts RequestHandler in a child process on a SQLite file (see sqlite_db.py)
+seeded by generate_data.py, with a fake M-Pesa API, then drives a weighted mix of
+workloads from concurrent keep-alive clients:
+
+    browse   - artwork/exhibition lists (with cursor paging) and details
+    login    - user login (includes the bcrypt check)
+    booking  - exhibition booking through /mpesa/stk-push
+    admin    - admin ticket/order/artist listings
+
+Throughput and p50/p95/p99 latency, overall, per workload and per route, are
+written to a JSON file. Pass --baseline with an earlier result file to fail
+(exit status 1) when throughput or p95 latency regressed by more than
+--tolerance.
+
+    python benchmark.py --duration 30 --concurrency 16 --output bench.json
+    python benchmark.py --baseline bench.json --output bench-new.json
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from generate_data import DEFAULT_COUNTS, user_email
+
+DEFAULT_MIX = "browse=70,login=5,booking=10,admin=15"
+DEFAULT_SIZES = ("users=500,artists=50,corporate_users=20,artworks=2000,exhibitions=100,"
+                 "artwork_orders=2000,exhibition_bookings=5000,contact_messages=200")
+
+BENCH_PASSWORD = "benchmark-password"
+ADMIN_EMAIL = "admin@bench.local"
+
+def _parse_pairs(text, cast=int):
+    pairs = {}
+    for item in text.split(','):
+        name, _, value = item.partition('=')
+        pairs[name.strip()] = cast(value)
+    return pairs
+
+# ---- Dataset ----
+
+def seed_database(path, sizes, seed):
+    """Create the schema in a SQLite file and fill it with synthetic rows"""
+    from auth import hash_password
+    from generate_data import generate
+    import sqlite_db
+
+    sqlite_db.create_schema(path)
+    password = hash_password(BENCH_PASSWORD)
+    connection = sqlite_db.connect(path)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("INSERT INTO admins (name, email, password) VALUES (%s, %s, %s)",
+                       ("Bench Admin", ADMIN_EMAIL, password))
+        cursor.close()
+        connection.commit()
+        generate(connection, sizes, seed=seed, password_hash=password)
+    finally:
+        connection.close()
+
+# ---- Server side (child process) ----
+
+def _start_fake_mpesa(latency):
+    """Serve canned Daraja responses so bookings never leave the machine"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class FakeMpesa(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self, data):
+            if latency:
+                time.sleep(latency)
+            body = json.dumps(data).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply({"access_token": "bench-token", "expires_in": "3599"})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+            if 'stkpushquery' in self.path:
+                self._reply({"ResultCode": "0", "ResultDesc": "The service request is processed successfully."})
+            else:
+                self._reply({"ResponseCode": "0", "CheckoutRequestID": f"ws_CO_{uuid.uuid4().hex}",
+                             "MerchantRequestID": uuid.uuid4().hex[:12]})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeMpesa)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def _serve(db_path, sizes, seed, workers, mpesa_latency, ready):
+    """Child process: seed the stand-in database and run the API server"""
+    seed_database(db_path, sizes, seed)
+
+    import sqlite_db
+    import database
+    import mpesa
+    import server
+    from worker_server import ThreadPoolServer
+
+    database.set_connect_function(lambda: sqlite_db.connect(db_path))
+    mpesa.API_BASE_URL = _start_fake_mpesa(mpesa_latency)
+
+    httpd = ThreadPoolServer(('127.0.0.1', 0), server.RequestHandler, workers=workers)
+    ready.send(httpd.server_address[1])
+    ready.close()
+    httpd.serve_forever()
+
+# ---- Client side ----
+
+class Client:
+    """Keep-alive HTTP client that reconnects when the server closes the socket"""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = None
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        if body is not None:
+            body = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, ConnectionError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+                continue
+            if response.getheader('Connection', '').lower() == 'close':
+                self.conn.close()
+                self.conn = None
+            return response.status, data, response.getheader('Content-Encoding')
+
+    def json(self, method, path, body=None, token=None):
+        status, data, encoding = self.request(method, path, body, token)
+        if encoding == 'gzip':
+            import gzip
+            data = gzip.decompress(data)
+        return status, json.loads(data or b'null')
+
+class Workload:
+    """The benchmark scenarios; each call performs one user action"""
+
+    def __init__(self, sizes, admin_token):
+        self.sizes = sizes
+        self.admin_token = admin_token
+
+    def browse(self, client, rng, record):
+        choice = rng.random()
+        if choice < 0.4:
+            status, page = client.json('GET', '/artworks?limit=20')
+            record('GET /artworks', status)
+            if status == 200 and page.get('next_cursor') and rng.random() < 0.5:
+                record('GET /artworks?cursor', client.request('GET', f"/artworks?limit=20&cursor={page['next_cursor']}")[0])
+        elif choice < 0.7:
+            record('GET /artworks/{id}', client.request('GET', f"/artworks/{rng.randint(1, self.sizes['artworks'])}")[0])
+        elif choice < 0.85:
+            record('GET /exhibitions', client.request('GET', '/exhibitions?limit=20')[0])
+        else:
+            record('GET /exhibitions/{id}', client.request('GET', f"/exhibitions/{rng.randint(1, self.sizes['exhibitions'])}")[0])
+
+    def login(self, client, rng, record):
+        user = rng.randint(1, self.sizes['users'])
+        status, _ = client.json('POST', '/login', {"email": user_email(user), "password": BENCH_PASSWORD})
+        record('POST /login', status)
+
+    def booking(self, client, rng, record):
+        body = {
+            "phoneNumber": "0712345678",
+            "amount": 1000,
+            "orderType": "exhibition",
+            "orderId": rng.randint(1, self.sizes['exhibitions']),
+            "userId": rng.randint(1, self.sizes['users']),
+            "slots": 1,
+        }
+        status, result = client.json('POST', '/mpesa/stk-push', body)
+        record('POST /mpesa/stk-push', status if not (isinstance(result, dict) and 'error' in result) else 500)
+
+    def admin(self, client, rng, record):
+        path = rng.choice(('/tickets', '/orders', '/artists'))
+        record(f'GET {path}', client.request('GET', f'{path}?limit=50', token=self.admin_token)[0])
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(samples, elapsed):
+    """samples: list of (seconds, ok)"""
+    latencies = sorted(seconds for seconds, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if count else 0.0,
+    }
+
+def run_workload(port, workload, mix, concurrency, duration, warmup, seed):
+    """Drive the mix from concurrent clients; returns (results, measured seconds)"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    results = []  # (scenario, label, seconds, ok)
+    lock = threading.Lock()
+
+    def client_loop(index):
+        rng = random.Random(seed * 1000 + index)
+        client = Client(port)
+        local = []
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            scenario = rng.choices(names, weights)[0]
+            last = [time.perf_counter()]
+
+            def record(label, status):
+                finished = time.perf_counter()
+                if time.monotonic() >= measure_from:
+                    local.append((scenario, label, finished - last[0], status < 400))
+                last[0] = finished
+
+            try:
+                getattr(workload, scenario)(client, rng, record)
+            except Exception:
+                record(f'{scenario} (exception)', 599)
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, min(duration, time.monotonic() - measure_from)
+
+def build_report(results, elapsed, config, sizes):
+    by_scenario, by_label = {}, {}
+    for scenario, label, seconds, ok in results:
+        by_scenario.setdefault(scenario, []).append((seconds, ok))
+        by_label.setdefault(label, []).append((seconds, ok))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "dataset": sizes,
+        "overall": summarize([(seconds, ok) for _, _, seconds, ok in results], elapsed),
+        "scenarios": {name: summarize(samples, elapsed) for name, samples in sorted(by_scenario.items())},
+        "routes": {name: summarize(samples, elapsed) for name, samples in sorted(by_label.items())},
+    }
+
+def compare(report, baseline, tolerance):
+    """Return human-readable regressions of throughput or p95 beyond tolerance"""
+    regressions = []
+    sections = [("overall", report["overall"], baseline.get("overall", {}))]
+    sections += [(f"route {name}", stats, baseline.get("routes", {}).get(name))
+                 for name, stats in report["routes"].items()]
+    for name, current, previous in sections:
+        if not previous or not previous.get("requests"):
+            continue
+        if previous["throughput_rps"] and current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} rps")
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+    return regressions
+
+def print_report(report):
+    print(f"{'':28} {'reqs':>8} {'err':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("overall", report["overall"])] + sorted(report["routes"].items())
+    for name, stats in rows:
+        print(f"{name:28} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput_rps']:>9} "
+              f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds (default 30)')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds first (default 5)')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients (default 16)')
+    parser.add_argument('--workers', type=int, default=16, help='server worker threads (default 16)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'workload weights (default {DEFAULT_MIX})')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'rows to seed (default {DEFAULT_SIZES})')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for data and clients')
+    parser.add_argument('--mpesa-latency-ms', type=float, default=0, help='delay added by the fake M-Pesa API')
+    parser.add_argument('--log-level', default='WARNING', help='server LOG_LEVEL during the run')
+    parser.add_argument('--output', default='benchmark-results.json', help='where to write the JSON report')
+    parser.add_argument('--baseline', help='earlier JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed regression vs baseline (default 0.10)')
+    args = parser.parse_args(argv)
+
+    mix = _parse_pairs(args.mix, float)
+    unknown = set(mix) - {'browse', 'login', 'booking', 'admin'}
+    if unknown:
+        parser.error(f"unknown workloads in --mix: {', '.join(sorted(unknown))}")
+    sizes = _parse_pairs(DEFAULT_SIZES)
+    sizes.update(_parse_pairs(args.sizes))
+    unknown = set(sizes) - set(DEFAULT_COUNTS)
+    if unknown:
+        parser.error(f"unknown tables in --sizes: {', '.join(sorted(unknown))}")
+
+    os.environ['LOG_LEVEL'] = args.log_level
+    workdir = tempfile.mkdtemp(prefix='afriart-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+
+    context = multiprocessing.get_context('fork')
+    ready_recv, ready_send = context.Pipe(duplex=False)
+    server_process = context.Process(
+        target=_serve, daemon=True,
+        args=(db_path, sizes, args.seed, args.workers, args.mpesa_latency_ms / 1000, ready_send))
+    server_process.start()
+    try:
+        if not ready_recv.poll(600):
+            sys.exit("Server did not start")
+        port = ready_recv.recv()
+
+        status, login = Client(port).json('POST', '/admin-login', {"email": ADMIN_EMAIL, "password": BENCH_PASSWORD})
+        if status != 200 or 'token' not in login:
+            sys.exit(f"Admin login failed: {status} {login}")
+
+        workload = Workload(sizes, login['token'])
+        results, elapsed = run_workload(port, workload, mix, args.concurrency, args.duration, args.warmup, args.seed)
+    finally:
+        server_process.terminate()
+        server_process.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+    report = build_report(results, elapsed, config, sizes)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+if __name__ == '__main__':
+    main()
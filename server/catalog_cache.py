@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from catalog_version import bump_version, get_version
+from singleflight import SingleFlight
+
+# Process-local read-through cache for catalog payloads (artwork and
+# exhibition lists and details)
+#
+# Each entry remembers the catalog version it was loaded under. A write bumps
+# the shared version, so entries cached by any pre-fork worker stop matching
+# immediately; invalidate() also drops this process's entries right away.
+
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', 60))  # seconds
+CATALOG_CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', 512))  # entries
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL"""
+
+    def __init__(self, max_size=512, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, version, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key, version):
+        """Return the cached value, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, entry_version, value = entry
+                if expires_at > now and entry_version == version:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self, predicate=None):
+        """Drop every entry, or only those whose key matches predicate"""
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if predicate(key)]:
+                    del self._entries[key]
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._entries)
+            snapshot["max_size"] = self.max_size
+            snapshot["ttl"] = self.ttl
+            lookups = snapshot["hits"] + snapshot["misses"]
+            snapshot["hit_ratio"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+        return snapshot
+
+_cache = TTLCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+_flights = SingleFlight()
+
+def cached(collection, key, loader):
+    """Return the payload for key, calling loader() on a miss
+
+    Concurrent misses for the same key and version share a single loader
+    call. Error payloads ({"error": ...}) are never cached.
+    """
+    cache_key = (collection,) + tuple(key)
+    # Read the version before loading so a write that lands mid-load leaves
+    # the entry tagged with the old version
+    version = get_version(collection)
+    value = _cache.get(cache_key, version)
+    if value is not None:
+        return value
+
+    def load():
+        value = loader()
+        if not (isinstance(value, dict) and "error" in value):
+            _cache.set(cache_key, version, value)
+        return value
+
+    return _flights.do(cache_key + (version,), load)
+
+def invalidate(collection):
+    """Mark a collection as changed in every process and drop local entries"""
+    bump_version(collection)
+    _cache.clear(lambda key: key[0] == collection)
+
+def cache_stats():
+    """Return hit/miss/eviction and coalescing counters for sizing the cache"""
+    snapshot = _cache.stats()
+    snapshot["coalescing"] = _flights.stats()
+    return snapshot
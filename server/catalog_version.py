@@ -0,0 +1,43 @@
+import multiprocessing
+import secrets
+
+# Catalog version counters used to build ETags for catalog responses
+#
+# Every write to artworks or exhibitions bumps the matching counter, so an
+# ETag can be computed without touching the database or hashing the body.
+# The counters live in shared memory created at import time, which means the
+# pre-fork worker processes (forked after import) all see each other's bumps.
+
+COLLECTIONS = ('artworks', 'exhibitions')
+
+_versions = multiprocessing.RawArray('q', len(COLLECTIONS))
+_lock = multiprocessing.Lock()
+
+# Changes on every server start so ETags from a previous run never match
+_boot_id = secrets.token_hex(4)
+
+def _index(collection):
+    try:
+        return COLLECTIONS.index(collection)
+    except ValueError:
+        raise ValueError(f"Unknown catalog collection: {collection}")
+
+def bump_version(collection):
+    """Record that a collection changed; returns the new version"""
+    index = _index(collection)
+    with _lock:
+        _versions[index] += 1
+        return _versions[index]
+
+def get_version(collection):
+    """Return the current version of a collection"""
+    return _versions[_index(collection)]
+
+def catalog_etag(collection, *parts):
+    """Build a strong ETag for a collection response
+
+    Extra parts (e.g. a record id or query string) distinguish different
+    representations built from the same collection version.
+    """
+    tag = "-".join([collection, _boot_id, str(get_version(collection))] + [str(part) for part in parts])
+    return f'"{tag}"'
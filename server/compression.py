@@ -0,0 +1,97 @@
+import gzip
+import os
+import zlib
+
+# Response compression helpers for RequestHandler
+
+# Compression settings (override with environment variables)
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes; smaller bodies are sent as-is
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))  # 1 (fastest) - 9 (smallest)
+
+# Encodings we can produce on the fly, in order of preference
+DYNAMIC_ENCODINGS = ('gzip', 'deflate')
+
+# Precompressed sidecar files for static assets: encoding -> file suffix
+SIDECAR_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+# Static content types worth serving precompressed
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+)
+
+def parse_accept_encoding(header):
+    """Parse an Accept-Encoding header into a dict of encoding -> q-value"""
+    accepted = {}
+    if not header:
+        return accepted
+    for part in header.split(','):
+        pieces = part.strip().split(';')
+        coding = pieces[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+def choose_encoding(header, available):
+    """Pick the best encoding from `available` that the client accepts, or None"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def is_compressible(content_type):
+    """Whether a static file of this type benefits from compression"""
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+def compress_body(body, accept_encoding):
+    """Compress a response body if it is large enough and the client allows it
+
+    Returns (body, encoding) where encoding is None for an unchanged body.
+    """
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return body, None
+
+    encoding = choose_encoding(accept_encoding, DYNAMIC_ENCODINGS)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=COMPRESSION_LEVEL, mtime=0), encoding
+    if encoding == 'deflate':
+        return zlib.compress(body, COMPRESSION_LEVEL), encoding
+    return body, None
+
+def find_sidecar(file_path, accept_encoding):
+    """Return (path, encoding) of a precompressed copy of file_path, if one fits
+
+    A sidecar is only used when it is at least as new as the original so a
+    stale .gz never shadows an updated asset.
+    """
+    candidates = []
+    for encoding, suffix in SIDECAR_SUFFIXES:
+        sidecar = file_path + suffix
+        try:
+            if os.path.getmtime(sidecar) >= os.path.getmtime(file_path):
+                candidates.append(encoding)
+        except OSError:
+            continue
+    if not candidates:
+        return None, None
+
+    encoding = choose_encoding(accept_encoding, candidates)
+    if encoding is None:
+        return None, None
+    return file_path + dict(SIDECAR_SUFFIXES)[encoding], encoding
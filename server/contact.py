@@ -6,6 +6,9 @@ import os
 from decimal import Decimal
 from middleware import SECRET_KEY
 from datetime import datetime
+from app_logging import get_logger
+
+logger = get_logger(__name__)
 
 # Custom JSON encoder to handle Decimal types and datetime objects
 class CustomJSONEncoder(json.JSONEncoder):
@@ -39,30 +42,30 @@ def create_contact_message(data):
         return {"error": "Missing required fields"}
     
     # Print data for debugging
-    print(f"Saving contact message: {name}, {email}, {message}, source: {source}")
+    logger.debug("Saving contact message: %s, %s, %s, source: %s", name, email, message, source)
     
     # Save the message
     result = save_contact_message(name, email, phone, message, source)
     
     # Print result for debugging
-    print(f"Save result: {result}")
+    logger.debug("Save result: %s", result)
     
     # Convert any Decimal values to float
     if isinstance(result, dict):
         return json.loads(json_dumps(result))
     return result
 
-def get_messages(auth_header):
+def get_messages(auth_header, limit=None, after=None):
     """Get all contact messages (admin only)"""
     if not auth_header:
-        print("No auth header provided")
+        logger.warning("No auth header provided")
         return {"error": "Authentication required"}
     
-    print("Admin authorized, fetching all contact messages")
-    result = get_all_contact_messages()
+    logger.debug("Admin authorized, fetching all contact messages")
+    result = get_all_contact_messages(limit, after)
     
     # Print result for debugging
-    print(f"Fetch messages result: {result}")
+    logger.debug("Fetch messages result: %s", result)
     
     # Use custom JSON encoder for Decimal and datetime values
     if isinstance(result, dict) and 'messages' in result:
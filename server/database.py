@@ -2,8 +2,17 @@
 import mysql.connector
 from mysql.connector import Error
 import json
+import os
+import threading
 from decimal import Decimal
 from datetime import datetime
+from db_pool import ConnectionPool, PoolTimeoutError
+from metrics import REGISTRY, CallbackMetric, observe_db_call
+from query_stats import enable_explain, record_query
+from pagination import keyset_clause, limit_clause, split_page
+from app_logging import get_logger
+
+logger = get_logger(__name__)
 
 # Custom JSON encoder to handle Decimal types and datetime objects
 class DecimalEncoder(json.JSONEncoder):
@@ -22,16 +31,94 @@ DB_CONFIG = {
     'database': 'artgallery'
 }
 
+# Connection pool configuration (override with environment variables)
+DB_POOL_CONFIG = {
+    'size': int(os.environ.get('DB_POOL_SIZE', 10)),
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 5)),  # seconds to wait for a free connection
+    'max_uses': int(os.environ.get('DB_POOL_MAX_USES', 1000)),  # recycle after N checkouts (0 = never)
+    'max_age': float(os.environ.get('DB_POOL_MAX_AGE', 1800)),  # recycle after N seconds (0 = never)
+    'ping_interval': float(os.environ.get('DB_POOL_PING_INTERVAL', 30)),  # ping idle connections older than this
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _connect():
+    """Open a new raw MySQL connection"""
+    return mysql.connector.connect(**DB_CONFIG)
+
+_connect_fn = _connect
+
+def set_connect_function(connect_fn):
+    """Open pooled connections with connect_fn instead of MySQL
+
+    Used by the benchmark to run against a local stand-in database. The
+    current pool, if any, is closed and replaced on next use.
+    """
+    global _pool, _connect_fn
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = None
+        _connect_fn = connect_fn
+
+def _observe_query(sql, params, seconds, failed):
+    """Cursor timing hook: feeds /metrics and the per-fingerprint slow query log"""
+    observe_db_call(sql, seconds, failed)
+    record_query(sql, params, seconds, failed)
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(_connect_fn, on_query=_observe_query, **DB_POOL_CONFIG)
+    return _pool
+
+def _reset_pool_after_fork():
+    """Drop the parent's pool in forked children so sockets are never shared"""
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+def get_pool_stats():
+    """Return connection pool counters (checkouts, reuse, recycling, waits)"""
+    return get_pool().stats()
+
+def _pool_connection_gauges():
+    stats = get_pool_stats()
+    return {(state,): stats[state] for state in ("open", "idle", "in_use", "waiting")}
+
+def _pool_event_counters():
+    stats = get_pool_stats()
+    return {(event,): stats[event] for event in ("checkouts", "created", "recycled", "timeouts", "connect_failures")}
+
+REGISTRY.register(CallbackMetric(
+    'db_pool_connections', 'Connection pool occupancy', _pool_connection_gauges, ('state',)))
+REGISTRY.register(CallbackMetric(
+    'db_pool_events_total', 'Connection pool events', _pool_event_counters, ('event',), type='counter'))
+
 def get_db_connection():
-    """Create and return a database connection"""
+    """Borrow a database connection from the pool
+
+    The returned connection behaves like a regular MySQL connection; calling
+    close() hands it back to the pool. Returns None if no connection could be
+    obtained.
+    """
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        if connection.is_connected():
-            return connection
+        return get_pool().get_connection()
+    except PoolTimeoutError as e:
+        logger.error("Error getting MySQL connection: %s", e)
     except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+        logger.error("Error connecting to MySQL: %s", e)
     return None
 
+enable_explain(get_db_connection)
+
 # Helper function to safely encode JSON with Decimal and datetime values
 def json_dumps(data):
     """Safely convert data to JSON string, handling Decimal and datetime types"""
@@ -62,7 +149,7 @@ def save_contact_message(name, email, phone, message, source='contact_form'):
         
         if not source_exists:
             # Add source column if it doesn't exist
-            print("Adding source column to contact_messages table")
+            logger.info("Adding source column to contact_messages table")
             cursor.execute("ALTER TABLE contact_messages ADD COLUMN source VARCHAR(50) DEFAULT 'contact_form'")
             connection.commit()
         
@@ -75,12 +162,12 @@ def save_contact_message(name, email, phone, message, source='contact_form'):
         connection.commit()
         
         message_id = cursor.lastrowid
-        print(f"Inserted new message with ID: {message_id}")
+        logger.debug("Inserted new message with ID: %s", message_id)
         
         return {"success": True, "message_id": message_id}
     
     except Error as e:
-        print(f"Error saving contact message: {e}")
+        logger.error("Error saving contact message: %s", e)
         return {"error": str(e)}
     
     finally:
@@ -88,8 +175,8 @@ def save_contact_message(name, email, phone, message, source='contact_form'):
             cursor.close()
             connection.close()
 
-def get_all_contact_messages():
-    """Get all contact messages"""
+def get_all_contact_messages(limit=None, after=None):
+    """Get all contact messages (optionally one keyset page)"""
     connection = get_db_connection()
     if connection is None:
         return {"error": "Database connection failed"}
@@ -98,23 +185,30 @@ def get_all_contact_messages():
         cursor = connection.cursor()
         
         # Get all messages ordered by date (newest first)
-        query = """
+        where_sql, where_params = keyset_clause("date", "id", after)
+        limit_sql, limit_params = limit_clause(limit)
+        query = f"""
         SELECT * FROM contact_messages
-        ORDER BY date DESC
+        {"WHERE " + where_sql if where_sql else ""}
+        ORDER BY date DESC, id DESC
+        {limit_sql}
         """
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        cursor.execute(query, where_params + limit_params)
+        rows, next_cursor = split_page(cursor.fetchall(), limit,
+                                       cursor.column_names.index('date'), cursor.column_names.index('id'))
         
         messages = []
         for row in rows:
             message_dict = dict_from_row(row, cursor)
             messages.append(message_dict)
         
-        print(f"Retrieved {len(messages)} messages")
+        logger.debug("Retrieved %s messages", len(messages))
+        if limit is not None:
+            return {"messages": messages, "next_cursor": next_cursor}
         return {"messages": messages}
     
     except Error as e:
-        print(f"Error getting contact messages: {e}")
+        logger.error("Error getting contact messages: %s", e)
         return {"error": str(e)}
     
     finally:
@@ -141,14 +235,14 @@ def update_message_status(message_id, status):
         connection.commit()
         
         if cursor.rowcount == 0:
-            print(f"Message with ID {message_id} not found")
+            logger.warning("Message with ID %s not found", message_id)
             return {"error": "Message not found"}
         
-        print(f"Updated message {message_id} status to {status}")
+        logger.debug("Updated message %s status to %s", message_id, status)
         return {"success": True, "message_id": message_id, "status": status}
     
     except Error as e:
-        print(f"Error updating message status: {e}")
+        logger.error("Error updating message status: %s", e)
         return {"error": str(e)}
     
     finally:
@@ -1,8 +1,12 @@
 
 from database import get_db_connection
+from pagination import keyset_clause, limit_clause, split_page
 from decimal import Decimal
 import random
 import string
+from app_logging import get_logger
+
+logger = get_logger(__name__)
 
 def generate_ticket_code():
     """Generate a unique ticket code"""
@@ -49,7 +53,7 @@ def create_order(user_id, order_type, reference_id, amount):
         else:
             return {"error": "Invalid order type"}
     except Exception as e:
-        print(f"Error creating order: {e}")
+        logger.error("Error creating order: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
@@ -79,15 +83,15 @@ def create_ticket(user_id, exhibition_id, slots):
         ticket_id = cursor.lastrowid
         return {"success": True, "ticket_id": ticket_id, "ticket_code": ticket_code}
     except Exception as e:
-        print(f"Error creating ticket: {e}")
+        logger.error("Error creating ticket: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-def get_all_orders():
-    """Get all orders from database"""
+def get_all_orders(limit=None, after=None):
+    """Get all orders from database, newest first (optionally one keyset page)"""
     connection = get_db_connection()
     if connection is None:
         return {"error": "Database connection failed"}
@@ -96,31 +100,39 @@ def get_all_orders():
     
     try:
         # Get artwork orders
-        query = """
+        where_sql, where_params = keyset_clause("ao.order_date", "ao.id", after)
+        limit_sql, limit_params = limit_clause(limit)
+        query = f"""
         SELECT ao.*, u.name as user_name, a.title as item_title
         FROM artwork_orders ao
         JOIN users u ON ao.user_id = u.id
         JOIN artworks a ON ao.artwork_id = a.id
-        ORDER BY ao.order_date DESC
+        {"WHERE " + where_sql if where_sql else ""}
+        ORDER BY ao.order_date DESC, ao.id DESC
+        {limit_sql}
         """
-        cursor.execute(query)
-        artwork_orders = [dict(zip([col[0] for col in cursor.description], row)) for row in cursor.fetchall()]
+        cursor.execute(query, where_params + limit_params)
+        columns = [col[0] for col in cursor.description]
+        rows, next_cursor = split_page(cursor.fetchall(), limit, columns.index('order_date'), columns.index('id'))
+        artwork_orders = [dict(zip(columns, row)) for row in rows]
         
         for order in artwork_orders:
             order['type'] = 'artwork'
             order['reference_id'] = order['artwork_id']
-            
+        
+        if limit is not None:
+            return {"orders": artwork_orders, "next_cursor": next_cursor}
         return {"orders": artwork_orders}
     except Exception as e:
-        print(f"Error getting orders: {e}")
+        logger.error("Error getting orders: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-def get_all_tickets():
-    """Get all tickets from database"""
+def get_all_tickets(limit=None, after=None):
+    """Get all tickets from database, newest first (optionally one keyset page)"""
     connection = get_db_connection()
     if connection is None:
         return {"error": "Database connection failed"}
@@ -129,7 +141,9 @@ def get_all_tickets():
     
     try:
         # Get exhibition bookings
-        query = """
+        where_sql, where_params = keyset_clause("eb.booking_date", "eb.id", after)
+        limit_sql, limit_params = limit_clause(limit)
+        query = f"""
         SELECT eb.id, eb.user_id, u.name as user_name, eb.exhibition_id, 
                e.title as exhibition_title, e.image_url as exhibition_image_url,
                eb.booking_date, eb.ticket_code, eb.slots, eb.status,
@@ -137,18 +151,24 @@ def get_all_tickets():
         FROM exhibition_bookings eb
         JOIN users u ON eb.user_id = u.id
         JOIN exhibitions e ON eb.exhibition_id = e.id
-        ORDER BY eb.booking_date DESC
+        {"WHERE " + where_sql if where_sql else ""}
+        ORDER BY eb.booking_date DESC, eb.id DESC
+        {limit_sql}
         """
-        cursor.execute(query)
+        cursor.execute(query, where_params + limit_params)
+        rows, next_cursor = split_page(cursor.fetchall(), limit,
+                                       cursor.column_names.index('booking_date'), cursor.column_names.index('id'))
         
         tickets = []
-        for row in cursor.fetchall():
+        for row in rows:
             ticket = dict(zip([col[0] for col in cursor.description], row))
             tickets.append(ticket)
-            
+        
+        if limit is not None:
+            return {"tickets": tickets, "next_cursor": next_cursor}
         return {"tickets": tickets}
     except Exception as e:
-        print(f"Error getting tickets: {e}")
+        logger.error("Error getting tickets: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
@@ -193,7 +213,7 @@ def get_user_orders(user_id):
         
         return {"orders": orders, "bookings": bookings}
     except Exception as e:
-        print(f"Error getting user orders: {e}")
+        logger.error("Error getting user orders: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
@@ -210,7 +230,7 @@ def get_artist_artworks(artist_id):
     
     try:
         # Debug to check the artist_id being used
-        print(f"Finding artworks for artist_id: {artist_id}")
+        logger.debug("Finding artworks for artist_id: %s", artist_id)
         
         # Get all artworks where the artist_id matches or where the artist name matches
         # the name associated with the artist_id
@@ -225,11 +245,11 @@ def get_artist_artworks(artist_id):
         cursor.execute(query, (artist_id, artist_id))
         artworks = [dict(zip([col[0] for col in cursor.description], row)) for row in cursor.fetchall()]
         
-        print(f"Artist {artist_id} artworks query result: {artworks}")
+        logger.debug("Artist %s artworks query result: %s", artist_id, artworks)
         
         # If no results found, try an alternative query to find by artist name only
         if not artworks:
-            print(f"No artworks found with artist_id={artist_id}, trying to find by artist name")
+            logger.debug("No artworks found with artist_id=%s, trying to find by artist name", artist_id)
             name_query = """
             SELECT name FROM artists WHERE id = %s
             """
@@ -238,7 +258,7 @@ def get_artist_artworks(artist_id):
             
             if artist_name_row:
                 artist_name = artist_name_row[0]
-                print(f"Found artist name: {artist_name}, searching artworks by this name")
+                logger.debug("Found artist name: %s, searching artworks by this name", artist_name)
                 
                 backup_query = """
                 SELECT a.*, 
@@ -249,11 +269,11 @@ def get_artist_artworks(artist_id):
                 """
                 cursor.execute(backup_query, (artist_name,))
                 artworks = [dict(zip([col[0] for col in cursor.description], row)) for row in cursor.fetchall()]
-                print(f"Backup query results: {artworks}")
+                logger.debug("Backup query results: %s", artworks)
         
         return {"artworks": artworks}
     except Exception as e:
-        print(f"Error getting artist artworks: {e}")
+        logger.error("Error getting artist artworks: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
@@ -281,19 +301,19 @@ def get_artist_orders(artist_id):
         cursor.execute(query, (artist_id, artist_id))
         orders = [dict(zip([col[0] for col in cursor.description], row)) for row in cursor.fetchall()]
         
-        print(f"Artist {artist_id} orders query result: {orders}")
+        logger.debug("Artist %s orders query result: %s", artist_id, orders)
         
         return {"orders": orders}
     except Exception as e:
-        print(f"Error getting artist orders: {e}")
+        logger.error("Error getting artist orders: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-def get_all_artists():
-    """Get all artists from database"""
+def get_all_artists(limit=None, after=None):
+    """Get all artists from database, newest first (optionally one keyset page)"""
     connection = get_db_connection()
     if connection is None:
         return {"error": "Database connection failed"}
@@ -301,18 +321,26 @@ def get_all_artists():
     cursor = connection.cursor()
     
     try:
-        query = """
+        where_sql, where_params = keyset_clause("a.created_at", "a.id", after)
+        limit_sql, limit_params = limit_clause(limit)
+        query = f"""
         SELECT a.id, a.name, a.email, a.bio, a.profile_image_url, a.phone, a.created_at,
                (SELECT COUNT(*) FROM artworks WHERE artist_id = a.id) as artwork_count
         FROM artists a
-        ORDER BY a.created_at DESC
+        {"WHERE " + where_sql if where_sql else ""}
+        ORDER BY a.created_at DESC, a.id DESC
+        {limit_sql}
         """
-        cursor.execute(query)
-        artists = [dict(zip([col[0] for col in cursor.description], row)) for row in cursor.fetchall()]
+        cursor.execute(query, where_params + limit_params)
+        rows, next_cursor = split_page(cursor.fetchall(), limit,
+                                       cursor.column_names.index('created_at'), cursor.column_names.index('id'))
+        artists = [dict(zip([col[0] for col in cursor.description], row)) for row in rows]
         
+        if limit is not None:
+            return {"artists": artists, "next_cursor": next_cursor}
         return {"artists": artists}
     except Exception as e:
-        print(f"Error getting artists: {e}")
+        logger.error("Error getting artists: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
@@ -0,0 +1,275 @@
+import threading
+import time
+from collections import deque
+
+# Connection pool used behind database.get_db_connection()
+#
+# Connections are handed out wrapped in a PooledConnection so existing code
+# that calls connection.close() in its finally block returns the connection
+# to the pool instead of tearing down the TCP/auth session.
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out within the timeout"""
+    pass
+
+class TimedCursor:
+    """Cursor proxy that reports how long each execute/fetch call took
+
+    on_query(operation, params, seconds, failed) is called after every call;
+    operation and params are those passed to execute, or None for fetches.
+    """
+
+    def __init__(self, raw_cursor, on_query):
+        self._raw = raw_cursor
+        self._on_query = on_query
+
+    def _timed(self, operation, params, fn, *args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self._on_query(operation, params, time.perf_counter() - started, failed)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._timed(operation, params, self._raw.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._timed(operation, None, self._raw.executemany, operation, seq_params, *args, **kwargs)
+
+    def fetchone(self):
+        return self._timed(None, None, self._raw.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed(None, None, self._raw.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed(None, None, self._raw.fetchall)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._raw.close()
+
+class PooledConnection:
+    """Proxy around a raw connection that returns it to the pool on close()"""
+
+    def __init__(self, pool, raw_connection, created_at):
+        self._pool = pool
+        self._raw = raw_connection
+        self._created_at = created_at
+        self._last_used = time.monotonic()
+        self._uses = 0
+        self._checked_out = False
+
+    def is_connected(self):
+        # Callers only use this in their finally blocks to decide whether to
+        # close. Liveness is checked on borrow, so answer without a round trip
+        # and make sure the connection always finds its way back to the pool.
+        return self._checked_out
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        if not self._checked_out:
+            return
+        self._checked_out = False
+        self._pool._release(self)
+
+    def cursor(self, *args, **kwargs):
+        raw_cursor = self._raw.cursor(*args, **kwargs)
+        if self._pool.on_query is None:
+            return raw_cursor
+        return TimedCursor(raw_cursor, self._pool.on_query)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of database connections
+
+    connect_fn      -- callable returning a new raw connection
+    size            -- maximum number of open connections
+    timeout         -- seconds to wait for a free connection before giving up
+    max_uses        -- recycle a connection after this many checkouts (0 = never)
+    max_age         -- recycle a connection after this many seconds (0 = never)
+    ping_interval   -- ping idle connections older than this on borrow (0 = always)
+    on_query        -- optional on_query(operation, params, seconds, failed) callback;
+                       cursors are wrapped in TimedCursor when set
+    """
+
+    def __init__(self, connect_fn, size=10, timeout=5.0, max_uses=1000,
+                 max_age=1800, ping_interval=30, on_query=None):
+        self._connect_fn = connect_fn
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.ping_interval = ping_interval
+        self.on_query = on_query
+
+        self._idle = deque()
+        self._open_count = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._waiters = 0
+
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "reused": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "connect_failures": 0,
+            "timeouts": 0,
+        }
+
+    def get_connection(self, timeout=None):
+        """Borrow a connection, creating one if the pool is not yet full"""
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            pooled = None
+            with self._lock:
+                while not self._idle and self._open_count >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {timeout}s waiting for a database connection"
+                        )
+                    self._waiters += 1
+                    try:
+                        self._available.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    # Reserve the slot before connecting outside the lock
+                    self._open_count += 1
+
+            if pooled is None:
+                return self._checkout(self._create())
+
+            if self._is_healthy(pooled):
+                with self._lock:
+                    self._stats["reused"] += 1
+                return self._checkout(pooled)
+
+            # Stale connection: drop it and try again
+            self._discard(pooled)
+
+    def _create(self):
+        try:
+            raw = self._connect_fn()
+        except Exception:
+            with self._lock:
+                self._open_count -= 1
+                self._stats["connect_failures"] += 1
+                self._available.notify()
+            raise
+        with self._lock:
+            self._stats["created"] += 1
+        return PooledConnection(self, raw, time.monotonic())
+
+    def _checkout(self, pooled):
+        pooled._uses += 1
+        pooled._checked_out = True
+        with self._lock:
+            self._stats["checkouts"] += 1
+        return pooled
+
+    def _is_healthy(self, pooled):
+        if self._should_recycle(pooled):
+            with self._lock:
+                self._stats["recycled"] += 1
+            return False
+
+        idle_for = time.monotonic() - pooled._last_used
+        if idle_for < self.ping_interval:
+            return True
+
+        try:
+            pooled._raw.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._lock:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    def _should_recycle(self, pooled):
+        if self.max_uses and pooled._uses >= self.max_uses:
+            return True
+        if self.max_age and time.monotonic() - pooled._created_at >= self.max_age:
+            return True
+        return False
+
+    def _release(self, pooled):
+        # Never hand out a connection with an open transaction: roll back
+        # anything the caller left uncommitted (this also drops the read
+        # snapshot so the next borrower sees fresh data).
+        try:
+            if getattr(pooled._raw, "in_transaction", True):
+                pooled._raw.rollback()
+        except Exception:
+            self._discard(pooled)
+            return
+
+        if self._should_recycle(pooled):
+            with self._lock:
+                self._stats["recycled"] += 1
+            self._discard(pooled)
+            return
+
+        pooled._last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(pooled)
+            self._available.notify()
+
+    def _discard(self, pooled):
+        try:
+            pooled._raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open_count -= 1
+            self._available.notify()
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones close on release)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def stats(self):
+        """Return a snapshot of pool counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "size": self.size,
+                "open": self._open_count,
+                "idle": len(self._idle),
+                "in_use": self._open_count - len(self._idle),
+                "waiting": self._waiters,
+            })
+        return snapshot
@@ -1,7 +1,5 @@
 
 import os
-import psycopg2
-import sqlite3
 from database import get_db_connection
 
 def initialize_database():
@@ -1,11 +1,15 @@
 
 from database import get_db_connection, dict_from_row, json_dumps
-from auth import verify_token
+from catalog_cache import cached, invalidate
+from pagination import keyset_clause, limit_clause, split_page
 import json
 import os
-import base64
-import time
 from decimal import Decimal
+from app_logging import get_logger
+from image_store import UPLOADS_URL, decode_base64_image, store_image
+from image_variants import schedule_variants, variant_urls
+
+logger = get_logger(__name__)
 
 # Default exhibition image path
 DEFAULT_EXHIBITION_IMAGE = "/static/uploads/default_exhibition.jpg"
@@ -16,15 +20,14 @@ def ensure_uploads_directory():
     uploads_dir = os.path.join(os.path.dirname(__file__), "static", "uploads")
     if not os.path.exists(uploads_dir):
         os.makedirs(uploads_dir)
-        print(f"Created directory: {uploads_dir}")
+        logger.info("Created directory: %s", uploads_dir)
 
 # Call this function to ensure directory exists
 ensure_uploads_directory()
 
 # Function to handle image storage
-def save_image_from_base64(base64_str, name_prefix="exhibition"):
-    """Save a base64 image to the uploads directory and return the path"""
-    # Handle empty strings or None values
+def save_image_from_base64(base64_str):
+    """Save a base64 image to the content-addressed uploads store and return its path"""
     if not base64_str:
         return None
         
@@ -33,44 +36,31 @@ def save_image_from_base64(base64_str, name_prefix="exhibition"):
         return base64_str
     
     try:
-        # Extract the image data from the base64 string
-        if "," in base64_str:
-            # For format like "data:image/jpeg;base64,/9j/4AAQSk..."
-            image_format, base64_data = base64_str.split(",", 1)
-            if ';base64' not in image_format:
-                print("Warning: Not a valid base64 image format")
-                return None
-        else:
-            # Assume it's just the base64 data
-            base64_data = base64_str
-        
-        # Decode the base64 data
         try:
-            image_data = base64.b64decode(base64_data)
-        except Exception as e:
-            print(f"Failed to decode base64 data: {e}")
+            decoded = decode_base64_image(base64_str)
+        except ValueError as e:
+            logger.warning("Failed to decode base64 data: %s", e)
             return DEFAULT_EXHIBITION_IMAGE
+        if decoded is None:
+            logger.warning("Not a valid base64 image format")
+            return None
         
-        # Generate a unique filename based on timestamp
-        timestamp = time.strftime("%Y%m%d%H%M%S")
-        filename = f"{name_prefix}_{timestamp}.jpg"
-        
-        # Save to the uploads directory
-        uploads_dir = os.path.join(os.path.dirname(__file__), "static", "uploads")
-        if not os.path.exists(uploads_dir):
-            os.makedirs(uploads_dir)
-            
-        file_path = os.path.join(uploads_dir, filename)
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-        
-        # Return the URL path to the image (ALWAYS use the standard format)
-        return f"/static/uploads/{filename}"
+        # Identical images share one file
+        image_data, mime_type = decoded
+        return store_image(image_data, mime_type)
     except Exception as e:
-        print(f"Error saving image: {e}")
+        logger.error("Error saving image: %s", e)
         return DEFAULT_EXHIBITION_IMAGE
 
-def get_all_exhibitions():
+def get_all_exhibitions(limit=None, after=None):
+    """Get all exhibitions, earliest start first (served from the catalog cache when fresh)
+
+    With a limit, returns one page plus a next_cursor (None on the last page);
+    `after` is the decoded cursor of the previous page.
+    """
+    return cached('exhibitions', ('list', limit, after), lambda: _load_all_exhibitions(limit, after))
+
+def _load_all_exhibitions(limit=None, after=None):
     """Get all exhibitions from the database"""
     connection = get_db_connection()
     if connection is None:
@@ -79,14 +69,19 @@ def get_all_exhibitions():
     cursor = connection.cursor()
     
     try:
-        query = """
+        where_sql, where_params = keyset_clause("start_date", "id", after, descending=False, nullable=False)
+        limit_sql, limit_params = limit_clause(limit)
+        query = f"""
         SELECT id, title, description, location, start_date, end_date,
                ticket_price, image_url, total_slots, available_slots, status
         FROM exhibitions
-        ORDER BY start_date ASC
+        {"WHERE " + where_sql if where_sql else ""}
+        ORDER BY start_date ASC, id ASC
+        {limit_sql}
         """
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        cursor.execute(query, where_params + limit_params)
+        rows, next_cursor = split_page(cursor.fetchall(), limit,
+                                       cursor.column_names.index('start_date'), cursor.column_names.index('id'))
         
         exhibitions = []
         for row in rows:
@@ -102,18 +97,11 @@ def get_all_exhibitions():
             # Convert ticket_price to camelCase
             exhibition['ticketPrice'] = exhibition.pop('ticket_price')
             
-            # Convert image_url to camelCase and ensure it's valid
+            # Convert image_url to camelCase; inline base64 images are returned as
+            # stored until image_migration converts them
             image_url = exhibition.pop('image_url')
-            # Convert base64 images to file paths
-            if image_url and (image_url.startswith('data:') or 'base64' in image_url):
-                # Save the base64 image to a file and get its path
-                saved_path = save_image_from_base64(image_url)
-                exhibition['imageUrl'] = saved_path
-                # Also update the database with the new path
-                update_exhibition_image(exhibition['id'], saved_path)
-                print(f"Converted base64 image to file: {saved_path}")
-            else:
-                exhibition['imageUrl'] = image_url if image_url else DEFAULT_EXHIBITION_IMAGE
+            exhibition['imageUrl'] = image_url if image_url else DEFAULT_EXHIBITION_IMAGE
+            exhibition['imageVariants'] = variant_urls(exhibition['imageUrl'])
             
             # Convert total_slots and available_slots to camelCase
             exhibition['totalSlots'] = exhibition.pop('total_slots')
@@ -121,42 +109,23 @@ def get_all_exhibitions():
             
             exhibitions.append(exhibition)
         
+        if limit is not None:
+            return {"exhibitions": exhibitions, "next_cursor": next_cursor}
         return {"exhibitions": exhibitions}
     except Exception as e:
-        print(f"Error getting exhibitions: {e}")
+        logger.error("Error getting exhibitions: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-def update_exhibition_image(exhibition_id, image_path):
-    """Update the image_url in the database for an exhibition"""
-    connection = get_db_connection()
-    if connection is None:
-        return False
-    
-    cursor = connection.cursor()
-    
-    try:
-        query = """
-        UPDATE exhibitions
-        SET image_url = %s
-        WHERE id = %s
-        """
-        cursor.execute(query, (image_path, exhibition_id))
-        connection.commit()
-        return True
-    except Exception as e:
-        print(f"Error updating exhibition image: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
-
 def get_exhibition(exhibition_id):
-    """Get a specific exhibition by ID"""
+    """Get a specific exhibition by ID (served from the catalog cache when fresh)"""
+    return cached('exhibitions', ('detail', str(exhibition_id)), lambda: _load_exhibition(exhibition_id))
+
+def _load_exhibition(exhibition_id):
+    """Get a specific exhibition from the database"""
     connection = get_db_connection()
     if connection is None:
         return {"error": "Database connection failed"}
@@ -188,18 +157,11 @@ def get_exhibition(exhibition_id):
         # Convert ticket_price to camelCase
         exhibition['ticketPrice'] = exhibition.pop('ticket_price')
         
-        # Convert image_url to camelCase and ensure it's valid
+        # Convert image_url to camelCase; inline base64 images are returned as
+        # stored until image_migration converts them
         image_url = exhibition.pop('image_url')
-        # Convert base64 images to file paths
-        if image_url and (image_url.startswith('data:') or 'base64' in image_url):
-            # Save the base64 image to a file and get its path
-            saved_path = save_image_from_base64(image_url)
-            exhibition['imageUrl'] = saved_path
-            # Also update the database with the new path
-            update_exhibition_image(exhibition['id'], saved_path)
-            print(f"Converted base64 image to file: {saved_path}")
-        else:
-            exhibition['imageUrl'] = image_url if image_url else DEFAULT_EXHIBITION_IMAGE
+        exhibition['imageUrl'] = image_url if image_url else DEFAULT_EXHIBITION_IMAGE
+        exhibition['imageVariants'] = variant_urls(exhibition['imageUrl'])
         
         # Convert total_slots and available_slots to camelCase
         exhibition['totalSlots'] = exhibition.pop('total_slots')
@@ -207,52 +169,27 @@ def get_exhibition(exhibition_id):
         
         return exhibition
     except Exception as e:
-        print(f"Error getting exhibition: {e}")
+        logger.error("Error getting exhibition: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-def create_exhibition(auth_header, exhibition_data):
+def create_exhibition(claims, exhibition_data):
     """Create a new exhibition (admin only)"""
-    print(f"\n--- Create Exhibition Request ---")
-    print(f"Auth Header: {auth_header}")
-    print(f"Exhibition Data: {exhibition_data}")
+    logger.debug("Create Exhibition Request")
+    logger.debug("Exhibition Data: %s", exhibition_data)
     
-    if not auth_header:
-        print("ERROR: Authentication header missing")
+    if not claims:
         return {"error": "Authentication required"}
     
-    # Extract token from header - handle both formats
-    token = None
-    if auth_header.startswith('Bearer '):
-        token = auth_header[7:]
-    else:
-        parts = auth_header.split(" ")
-        if len(parts) > 1:
-            token = parts[1]
-    
-    if not token:
-        print("ERROR: No token found in header")
-        return {"error": "Invalid authentication token"}
-    
-    # Verify token and check if user is admin
-    print(f"Verifying token: {token[:20]}...")
-    payload = verify_token(token)
-    print(f"Token verification result: {payload}")
-    
-    # Check if verification returned an error
-    if isinstance(payload, dict) and "error" in payload:
-        print(f"ERROR: Token verification failed: {payload['error']}")
-        return {"error": f"Authentication failed: {payload['error']}"}
-    
     # Check if user is admin
-    is_admin = payload.get("is_admin", False)
-    print(f"Is admin: {is_admin}")
+    is_admin = claims.get("is_admin", False)
+    logger.debug("Is admin: %s", is_admin)
     
     if not is_admin:
-        print("ERROR: Access denied - Not an admin user")
+        logger.warning("Access denied - Not an admin user")
         return {"error": "Unauthorized access: Admin privileges required"}
     
     # Continue with exhibition creation
@@ -268,7 +205,7 @@ def create_exhibition(auth_header, exhibition_data):
             try:
                 exhibition_data = json.loads(exhibition_data)
             except json.JSONDecodeError as e:
-                print(f"ERROR: Failed to parse exhibition data: {e}")
+                logger.warning("Failed to parse exhibition data: %s", e)
                 return {"error": f"Invalid exhibition data format: {str(e)}"}
         
         # Handle the image - convert base64 to file if needed
@@ -278,12 +215,12 @@ def create_exhibition(auth_header, exhibition_data):
             saved_image_path = save_image_from_base64(image_url)
             if saved_image_path:
                 image_url = saved_image_path
-                print(f"Image saved to: {saved_image_path}")
+                logger.debug("Image saved to: %s", saved_image_path)
             else:
-                print("Failed to save image")
+                logger.error("Failed to save image")
                 image_url = DEFAULT_EXHIBITION_IMAGE
         
-        print(f"Inserting exhibition data: {exhibition_data}")
+        logger.debug("Inserting exhibition data: %s", exhibition_data)
         query = """
         INSERT INTO exhibitions (title, description, location, start_date, end_date,
                                ticket_price, image_url, total_slots, available_slots, status)
@@ -310,21 +247,26 @@ def create_exhibition(auth_header, exhibition_data):
             exhibition_data.get("status")
         ))
         connection.commit()
+        invalidate('exhibitions')
+        schedule_variants(image_url)
         
         # Return the newly created exhibition
         new_exhibition_id = cursor.lastrowid
-        print(f"Exhibition created successfully with ID: {new_exhibition_id}")
-        return get_exhibition(new_exhibition_id)
+        logger.info("Exhibition created successfully with ID: %s", new_exhibition_id)
     except Exception as e:
-        print(f"ERROR creating exhibition: {e}")
+        logger.error("Error creating exhibition: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
+    # Read back only after the connection is returned, so a write never holds two pool slots
+    return get_exhibition(new_exhibition_id)
 
-def update_exhibition(auth_header, exhibition_id, exhibition_data):
-    # ... keep existing code (verification of admin and auth token)
+def update_exhibition(claims, exhibition_id, exhibition_data):
+    """Update an existing exhibition (admin only)"""
+    if not claims or not claims.get("is_admin", False):
+        return {"error": "Unauthorized access: Admin privileges required"}
     
     connection = get_db_connection()
     if connection is None:
@@ -347,11 +289,14 @@ def update_exhibition(auth_header, exhibition_id, exhibition_data):
             saved_image_path = save_image_from_base64(image_url)
             if saved_image_path:
                 image_url = saved_image_path
-                print(f"Image saved to: {saved_image_path}")
+                logger.debug("Image saved to: %s", saved_image_path)
             else:
-                print("Failed to save image")
+                logger.error("Failed to save image")
                 # Keep the original image URL if saving fails
                 image_url = current_exhibition[0] if current_exhibition[0] else DEFAULT_EXHIBITION_IMAGE
+        elif image_url and image_url.startswith(UPLOADS_URL):
+            # A file already stored through a multipart upload
+            pass
         else:
             # Keep the existing image_url or use default if none
             image_url = current_exhibition[0] if current_exhibition[0] else DEFAULT_EXHIBITION_IMAGE
@@ -376,60 +321,36 @@ def update_exhibition(auth_header, exhibition_id, exhibition_data):
             exhibition_id
         ))
         connection.commit()
+        invalidate('exhibitions')
+        schedule_variants(image_url)
         
         # Check if exhibition was found and updated
         if cursor.rowcount == 0:
             return {"error": "Exhibition not found"}
-        
-        # Return the updated exhibition
-        return get_exhibition(exhibition_id)
     except Exception as e:
-        print(f"Error updating exhibition: {e}")
+        logger.error("Error updating exhibition: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
+    # Read back only after the connection is returned, so a write never holds two pool slots
+    return get_exhibition(exhibition_id)
 
-def delete_exhibition(auth_header, exhibition_id):
+def delete_exhibition(claims, exhibition_id):
     """Delete an exhibition (admin only)"""
-    print(f"\n--- Delete Exhibition Request ---")
-    print(f"Auth Header: {auth_header}")
-    print(f"Exhibition ID: {exhibition_id}")
+    logger.debug("Delete Exhibition Request")
+    logger.debug("Exhibition ID: %s", exhibition_id)
     
-    if not auth_header:
-        print("ERROR: Authentication header missing")
+    if not claims:
         return {"error": "Authentication required"}
     
-    # Extract token from header - handle both formats
-    token = None
-    if auth_header.startswith('Bearer '):
-        token = auth_header[7:]
-    else:
-        parts = auth_header.split(" ")
-        if len(parts) > 1:
-            token = parts[1]
-    
-    if not token:
-        print("ERROR: No token found in header")
-        return {"error": "Invalid authentication token"}
-    
-    # Verify token and check if user is admin
-    print(f"Verifying token: {token[:20]}...")
-    payload = verify_token(token)
-    print(f"Token verification result: {payload}")
-    
-    # Check if verification returned an error
-    if isinstance(payload, dict) and "error" in payload:
-        print(f"ERROR: Token verification failed: {payload['error']}")
-        return {"error": f"Authentication failed: {payload['error']}"}
-    
     # Check if user is admin
-    is_admin = payload.get("is_admin", False)
-    print(f"Is admin: {is_admin}")
+    is_admin = claims.get("is_admin", False)
+    logger.debug("Is admin: %s", is_admin)
     
     if not is_admin:
-        print("ERROR: Access denied - Not an admin user")
+        logger.warning("Access denied - Not an admin user")
         return {"error": "Unauthorized access: Admin privileges required"}
     
     # Proceed with deletion
@@ -448,10 +369,11 @@ def delete_exhibition(auth_header, exhibition_id):
         # Delete the exhibition
         cursor.execute("DELETE FROM exhibitions WHERE id = %s", (exhibition_id,))
         connection.commit()
+        invalidate('exhibitions')
         
         return {"success": True, "message": f"Exhibition with ID {exhibition_id} deleted successfully"}
     except Exception as e:
-        print(f"Error deleting exhibition: {e}")
+        logger.error("Error deleting exhibition: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
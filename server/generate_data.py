@@ -0,0 +1,362 @@
+"""Bulk-generate synthetic data for scale testing
+
+Fills users, artists, corporate_users, artworks, exhibitions, artwork_orders,
+exhibition_bookings, exhibition_tickets and contact_messages with realistic,
+referentially consistent rows using batched multi-row INSERTs. Output is
+deterministic for a given --seed, --anchor and set of row counts; rows are
+appended after the current MAX(id) of each table, so existing data is kept.
+
+    python generate_data.py --scale 50            # ~1M artworks, 2.5M bookings
+    python generate_data.py --artworks 1000000 --bookings 5000000 --seed 7
+    python generate_data.py --sqlite /tmp/art.db  # SQLite stand-in instead of MySQL
+
+Every generated account's password is --password (default "password123").
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+# Row counts at --scale 1
+DEFAULT_COUNTS = {
+    'users': 20000,
+    'artists': 1000,
+    'corporate_users': 200,
+    'artworks': 20000,
+    'exhibitions': 500,
+    'artwork_orders': 20000,
+    'exhibition_bookings': 50000,
+    'contact_messages': 5000,
+}
+
+# Insert order; later tables reference earlier ones
+TABLES = ('users', 'artists', 'corporate_users', 'artworks', 'exhibitions',
+          'artwork_orders', 'exhibition_bookings', 'exhibition_tickets', 'contact_messages')
+
+FIRST_NAMES = ('Amani', 'Wanjiru', 'Otieno', 'Achieng', 'Kamau', 'Njeri', 'Mwangi', 'Akinyi', 'Kiprono',
+               'Chebet', 'Baraka', 'Zawadi', 'Juma', 'Halima', 'Musa', 'Imani', 'Tendai', 'Ama',
+               'Kofi', 'Ngozi', 'Chinedu', 'Thandiwe', 'Sipho', 'Lerato', 'Abebe', 'Selam')
+LAST_NAMES = ('Odhiambo', 'Kariuki', 'Wambui', 'Mutua', 'Kimani', 'Ochieng', 'Njoroge', 'Waweru',
+              'Kiplagat', 'Mensah', 'Okafor', 'Adeyemi', 'Dlamini', 'Nkosi', 'Tesfaye', 'Banda',
+              'Phiri', 'Mwale', 'Hassan', 'Abdi')
+MEDIUMS = ('Oil on canvas', 'Acrylic', 'Watercolor', 'Charcoal', 'Bronze', 'Wood carving',
+           'Soapstone', 'Batik', 'Mixed media', 'Photography', 'Beadwork', 'Ink on paper')
+SUBJECTS = ('Sunrise', 'Market Day', 'Savannah', 'Rhythm', 'Lake Shore', 'Ancestors', 'Harvest',
+            'The Elders', 'City Lights', 'Rain Dance', 'Kilimanjaro', 'Fishermen', 'Baobab',
+            'Migration', 'Homecoming', 'Maasai Mara', 'Coastline', 'Dreamers', 'Unity', 'Echoes')
+ADJECTIVES = ('Golden', 'Silent', 'Blue', 'Crimson', 'Distant', 'Quiet', 'Bright', 'Eternal',
+              'Wild', 'Gentle', 'Burning', 'Hidden')
+CITIES = ('Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Lamu', 'Malindi', 'Thika')
+VENUES = ('National Museum', 'GoDown Arts Centre', 'Circle Art Gallery', 'Nairobi Gallery',
+          'Kuona Artists Collective', 'One Off Gallery', 'Fort Jesus', 'Alliance Francaise')
+WORDS = ('light', 'colour', 'texture', 'form', 'memory', 'landscape', 'tradition', 'movement',
+         'community', 'heritage', 'journey', 'market', 'river', 'family', 'voice', 'rhythm',
+         'contemporary', 'abstract', 'portrait', 'earth', 'harvest', 'city', 'ocean', 'dust')
+
+# Tables whose generated rows reference rows generated in the same run
+DEPENDENCIES = {
+    'artworks': ('artists',),
+    'artwork_orders': ('users', 'artworks'),
+    'exhibition_bookings': ('users', 'exhibitions'),
+}
+
+PAYMENT_STATUSES = ('completed',) * 7 + ('pending',) * 2 + ('failed',)
+
+def person_name(n):
+    """Deterministic display name for the n-th person of a table"""
+    return f"{FIRST_NAMES[n % len(FIRST_NAMES)]} {LAST_NAMES[(n // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+
+def user_email(user_id):
+    return f"user{user_id}@example.test"
+
+def artist_email(artist_id):
+    return f"artist{artist_id}@example.test"
+
+def corporate_email(corporate_id):
+    return f"corporate{corporate_id}@example.test"
+
+def ticket_code(booking_id):
+    return f"TKT-{booking_id:08d}"
+
+def _phone(rng):
+    return f"07{rng.randint(0, 99999999):08d}"
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+def _stamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+class Generator:
+    """Produces the rows for each table, batch by batch
+
+    ids[table] is the first id this run assigns in that table; foreign keys
+    are drawn from the id ranges generated in the same run. Each table uses
+    its own random stream derived from the seed, so changing one table's
+    count does not change the rows generated for the others.
+    """
+
+    def __init__(self, counts, seed, anchor, days, password_hash):
+        self.counts = counts
+        self.seed = seed
+        self.anchor = anchor
+        self.days = days
+        self.password_hash = password_hash
+        self.ids = {}
+        # Per-exhibition data needed by bookings; small enough to keep in memory
+        self.exhibition_prices = []
+        self.exhibition_dates = []
+
+    def rng(self, table):
+        return random.Random(f"{self.seed}:{table}")
+
+    def _created(self, rng):
+        return self.anchor - timedelta(seconds=rng.randint(0, self.days * 86400))
+
+    def _id_range(self, table):
+        return range(self.ids[table], self.ids[table] + self.counts[table])
+
+    def _pick(self, rng, table):
+        return self.ids[table] + rng.randrange(self.counts[table])
+
+    def users(self, rng):
+        for user_id in self._id_range('users'):
+            yield (user_id, person_name(user_id), user_email(user_id), self.password_hash,
+                   _phone(rng), _stamp(self._created(rng)))
+
+    def artists(self, rng):
+        for artist_id in self._id_range('artists'):
+            yield (artist_id, person_name(artist_id * 7), artist_email(artist_id), self.password_hash,
+                   _phone(rng), _sentence(rng, 30), f"/static/uploads/artist_{artist_id}.jpg",
+                   _stamp(self._created(rng)))
+
+    def corporate_users(self, rng):
+        for corporate_id in self._id_range('corporate_users'):
+            company = f"{rng.choice(LAST_NAMES)} {rng.choice(('Holdings', 'Group', 'Ltd', 'Partners', 'Bank'))}"
+            yield (corporate_id, person_name(corporate_id * 3), corporate_email(corporate_id),
+                   self.password_hash, _phone(rng), company, f"PVT-{corporate_id:07d}",
+                   f"P{corporate_id:09d}K", f"P.O. Box {rng.randint(100, 99999)}, {rng.choice(CITIES)}",
+                   person_name(corporate_id * 5), rng.choice(('CEO', 'Procurement', 'Office Manager')),
+                   rng.random() < 0.5, rng.randint(0, 100) * 10000, rng.choice((0, 5, 10, 15)),
+                   _stamp(self._created(rng)))
+
+    def artworks(self, rng):
+        for artwork_id in self._id_range('artworks'):
+            artist_id = self._pick(rng, 'artists')
+            yield (artwork_id, f"{rng.choice(ADJECTIVES)} {rng.choice(SUBJECTS)}", person_name(artist_id * 7),
+                   artist_id, _sentence(rng, 40), rng.randint(20, 5000) * 100,
+                   f"/static/uploads/artwork_{artwork_id}.jpg",
+                   f"{rng.randint(20, 200)}x{rng.randint(20, 200)}cm", rng.choice(MEDIUMS),
+                   rng.randint(1960, self.anchor.year), 'sold' if rng.random() < 0.15 else 'available',
+                   _stamp(self._created(rng)))
+
+    def exhibitions(self, rng):
+        for exhibition_id in self._id_range('exhibitions'):
+            start = self.anchor + timedelta(days=rng.randint(-self.days, 180))
+            end = start + timedelta(days=rng.randint(1, 60))
+            if end < self.anchor:
+                status = 'completed'
+            elif start > self.anchor:
+                status = 'upcoming'
+            else:
+                status = 'ongoing'
+            price = rng.randint(0, 40) * 50
+            total = rng.randint(50, 2000)
+            self.exhibition_prices.append(price)
+            self.exhibition_dates.append(start)
+            yield (exhibition_id, f"{rng.choice(ADJECTIVES)} {rng.choice(SUBJECTS)}: {rng.choice(WORDS).title()}",
+                   _sentence(rng, 50), f"{rng.choice(VENUES)}, {rng.choice(CITIES)}",
+                   _stamp(start), _stamp(end), price, f"/static/uploads/exhibition_{exhibition_id}.jpg",
+                   total, rng.randint(0, total), status)
+
+    def _customer(self, rng):
+        """(user_id, corporate_user_id, name, email) for an order or booking"""
+        if self.counts['corporate_users'] and rng.random() < 0.1:
+            corporate_id = self._pick(rng, 'corporate_users')
+            return None, corporate_id, person_name(corporate_id * 3), corporate_email(corporate_id)
+        user_id = self._pick(rng, 'users')
+        return user_id, None, person_name(user_id), user_email(user_id)
+
+    def artwork_orders(self, rng):
+        for order_id in self._id_range('artwork_orders'):
+            user_id, corporate_id, name, email = self._customer(rng)
+            status = rng.choice(PAYMENT_STATUSES)
+            paid = status == 'completed'
+            yield (order_id, user_id, corporate_id, self._pick(rng, 'artworks'), name, email, _phone(rng),
+                   f"{rng.randint(1, 999)} {rng.choice(WORDS).title()} Road, {rng.choice(CITIES)}",
+                   'mpesa', status, _stamp(self._created(rng)), rng.randint(20, 5000) * 100,
+                   f"ws_CO_G{order_id:012d}", f"RG{order_id:08d}" if paid else None)
+
+    def exhibition_bookings(self, rng):
+        """Yields (booking row, ticket row or None); tickets exist for paid bookings"""
+        first_exhibition = self.ids['exhibitions']
+        for booking_id in self._id_range('exhibition_bookings'):
+            user_id, corporate_id, name, email = self._customer(rng)
+            index = rng.randrange(self.counts['exhibitions'])
+            slots = rng.choice((1, 1, 1, 2, 2, 3, 4))
+            status = rng.choice(PAYMENT_STATUSES)
+            booked = self.exhibition_dates[index] - timedelta(seconds=rng.randint(0, 60 * 86400))
+            code = ticket_code(booking_id)
+            booking = (booking_id, user_id, corporate_id, first_exhibition + index, name, email, _phone(rng),
+                       slots, 'mpesa', status, _stamp(booked), self.exhibition_prices[index] * slots,
+                       code, 'active' if status != 'failed' else 'cancelled',
+                       f"ws_CO_B{booking_id:012d}", f"RB{booking_id:08d}" if status == 'completed' else None)
+            ticket = None
+            if status == 'completed':
+                used = self.exhibition_dates[index] < self.anchor and rng.random() < 0.8
+                ticket = (booking_id, code, _stamp(booked),
+                          _stamp(self.exhibition_dates[index]) if used else None, 'used' if used else 'active')
+            yield booking, ticket
+
+    def contact_messages(self, rng):
+        for message_id in self._id_range('contact_messages'):
+            yield (message_id, person_name(message_id * 11), f"visitor{message_id}@example.test",
+                   _phone(rng), _sentence(rng, 25), rng.choice(('contact_form', 'contact_form', 'newsletter')),
+                   rng.choice(('new', 'new', 'read', 'replied')), _stamp(self._created(rng)))
+
+COLUMNS = {
+    'users': ('id', 'name', 'email', 'password', 'phone', 'created_at'),
+    'artists': ('id', 'name', 'email', 'password', 'phone', 'bio', 'profile_image_url', 'created_at'),
+    'corporate_users': ('id', 'name', 'email', 'password', 'phone', 'company_name', 'registration_number',
+                        'tax_id', 'billing_address', 'contact_person', 'contact_position',
+                        'allow_invoicing', 'credit_limit', 'discount_rate', 'created_at'),
+    'artworks': ('id', 'title', 'artist', 'artist_id', 'description', 'price', 'image_url',
+                 'dimensions', 'medium', 'year', 'status', 'created_at'),
+    'exhibitions': ('id', 'title', 'description', 'location', 'start_date', 'end_date', 'ticket_price',
+                    'image_url', 'total_slots', 'available_slots', 'status'),
+    'artwork_orders': ('id', 'user_id', 'corporate_user_id', 'artwork_id', 'name', 'email', 'phone',
+                       'delivery_address', 'payment_method', 'payment_status', 'order_date',
+                       'total_amount', 'checkout_request_id', 'mpesa_receipt_number'),
+    'exhibition_bookings': ('id', 'user_id', 'corporate_user_id', 'exhibition_id', 'name', 'email', 'phone',
+                            'slots', 'payment_method', 'payment_status', 'booking_date', 'total_amount',
+                            'ticket_code', 'status', 'checkout_request_id', 'mpesa_receipt_number'),
+    'exhibition_tickets': ('booking_id', 'ticket_code', 'created_at', 'used_at', 'status'),
+    'contact_messages': ('id', 'name', 'email', 'phone', 'message', 'source', 'status', 'created_at'),
+}
+
+def insert_rows(cursor, table, rows):
+    """One multi-row INSERT for a batch of rows"""
+    columns = COLUMNS[table]
+    values = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ', '.join([values] * len(rows)),
+        [value for row in rows for value in row])
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def next_ids(cursor):
+    """First free id per generated table (rows are appended after existing data)"""
+    ids = {}
+    for table in DEFAULT_COUNTS:
+        cursor.execute(f"SELECT MAX(id) FROM {table}")
+        ids[table] = (cursor.fetchone()[0] or 0) + 1
+    return ids
+
+def generate(connection, counts, seed=1, anchor=datetime(2025, 1, 1), days=730,
+             password_hash='', batch_size=1000, progress=None):
+    """Insert the synthetic dataset through a DB-API connection; returns rows per table
+
+    Each batch is committed on its own so memory stays flat at any size.
+    progress(table, rows_done, rows_total) is called after every batch.
+    """
+    cursor = connection.cursor()
+    generator = Generator(counts, seed, anchor, days, password_hash)
+    generator.ids = next_ids(cursor)
+    for table, needed in DEPENDENCIES.items():
+        if counts[table] and not all(counts[other] for other in needed):
+            raise ValueError(f"{table} rows reference {', '.join(needed)}, so those counts must be non-zero")
+    written = dict.fromkeys(TABLES, 0)
+    try:
+        for table in DEFAULT_COUNTS:
+            rows = getattr(generator, table)(generator.rng(table))
+            for batch in _batches(rows, batch_size):
+                if table == 'exhibition_bookings':
+                    tickets = [ticket for _, ticket in batch if ticket]
+                    batch = [booking for booking, _ in batch]
+                    insert_rows(cursor, table, batch)
+                    if tickets:
+                        insert_rows(cursor, 'exhibition_tickets', tickets)
+                        written['exhibition_tickets'] += len(tickets)
+                else:
+                    insert_rows(cursor, table, batch)
+                connection.commit()
+                written[table] += len(batch)
+                if progress:
+                    progress(table, written[table], counts[table])
+    finally:
+        cursor.close()
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    for table, count in DEFAULT_COUNTS.items():
+        flag = {'artwork_orders': 'orders', 'exhibition_bookings': 'bookings',
+                'contact_messages': 'messages', 'corporate_users': 'corporate'}.get(table, table)
+        parser.add_argument(f'--{flag}', dest=table, type=int, help=f'{table} rows (default {count} x scale)')
+    parser.add_argument('--scale', type=float, default=1, help='multiply every default row count')
+    parser.add_argument('--seed', type=int, default=1, help='random seed (default 1)')
+    parser.add_argument('--anchor', type=datetime.fromisoformat, default=datetime(2025, 1, 1),
+                        help='"now" of the dataset, YYYY-MM-DD (default 2025-01-01)')
+    parser.add_argument('--days', type=int, default=730, help='history length before the anchor (default 730)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='rows per INSERT (default 1000)')
+    parser.add_argument('--password', default='password123', help='password of every generated account')
+    parser.add_argument('--sqlite', metavar='PATH', help='write to a SQLite stand-in database instead of MySQL')
+    args = parser.parse_args(argv)
+
+    # Scaled counts never round down to zero, which would orphan dependent tables
+    counts = {table: getattr(args, table) if getattr(args, table) is not None
+              else max(1, int(count * args.scale)) if args.scale > 0 else 0
+              for table, count in DEFAULT_COUNTS.items()}
+
+    from auth import hash_password
+    password_hash = hash_password(args.password)
+
+    if args.sqlite:
+        import os
+        import sqlite_db
+        if not os.path.exists(args.sqlite):
+            sqlite_db.create_schema(args.sqlite)
+        connection = sqlite_db.connect(args.sqlite)
+    else:
+        from database import get_db_connection
+        connection = get_db_connection()
+        if connection is None:
+            raise SystemExit("Failed to connect to the database")
+        # Rows are generated consistent, so skip per-row checks while loading
+        cursor = connection.cursor()
+        cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+        cursor.close()
+
+    started = time.monotonic()
+    last_report = [0.0]
+
+    def progress(table, done, total):
+        now = time.monotonic()
+        if done == total or now - last_report[0] >= 2:
+            last_report[0] = now
+            print(f"{table}: {done}/{total} rows ({now - started:.1f}s)")
+
+    try:
+        written = generate(connection, counts, args.seed, args.anchor, args.days, password_hash,
+                           args.batch_size, progress)
+    finally:
+        if not args.sqlite:
+            # The connection goes back to the pool
+            cursor = connection.cursor()
+            cursor.execute("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+            cursor.close()
+        connection.close()
+    elapsed = time.monotonic() - started
+    total = sum(written.values())
+    print(f"Inserted {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Convert inline base64 image_url values into files under static/uploads
+
+Older clients stored images as data: URLs directly in artworks.image_url and
+exhibitions.image_url. Catalog reads return rows as stored, so those rows are
+normalized here instead, in batches and outside the request path: once by hand
+after deploying, and then by a background worker that picks up anything new.
+
+    python image_migration.py               # convert every row now
+    python image_migration.py --batch 200
+"""
+import argparse
+import os
+import threading
+import time
+
+from catalog_cache import invalidate
+from image_store import store_inline_image
+from image_variants import schedule_variants
+from database import get_db_connection
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+IMAGE_MIGRATION_INTERVAL = float(os.environ.get('IMAGE_MIGRATION_INTERVAL', 300))  # seconds between passes (0 = off)
+IMAGE_MIGRATION_BATCH = int(os.environ.get('IMAGE_MIGRATION_BATCH', 50))  # rows per transaction
+
+TABLES = ('artworks', 'exhibitions')
+
+# Only values that start like inline data; file paths may contain "base64"
+INLINE_IMAGE_SQL = "(image_url LIKE 'data:%%' OR image_url LIKE 'base64,%%')"
+
+def migrate_batch(table, after_id=0, batch_size=IMAGE_MIGRATION_BATCH, failed=None):
+    """Convert up to batch_size inline images with id > after_id in one transaction
+
+    Returns (last id examined or None when there are no more rows, rows converted).
+    A row is only rewritten if its image_url is unchanged since it was read.
+    Ids of rows that cannot be converted are added to the `failed` set, and
+    rows already in it are passed over without decoding them again.
+    """
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError("Database connection failed")
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"SELECT id, image_url FROM {table} WHERE id > %s AND {INLINE_IMAGE_SQL} ORDER BY id LIMIT %s",
+            (after_id, batch_size))
+        rows = cursor.fetchall()
+        converted = 0
+        stored = []
+        for row_id, image_url in rows:
+            if failed is not None and row_id in failed:
+                continue
+            path = store_inline_image(image_url)
+            if not path:
+                logger.warning("Could not convert inline image of %s %s", table, row_id)
+                if failed is not None:
+                    failed.add(row_id)
+                continue
+            cursor.execute(f"UPDATE {table} SET image_url = %s WHERE id = %s AND image_url = %s",
+                           (path, row_id, image_url))
+            if cursor.rowcount:
+                converted += 1
+                stored.append(path)
+        connection.commit()
+        if converted:
+            invalidate(table)
+        for path in stored:
+            schedule_variants(path)
+        return (rows[-1][0] if rows else None), converted
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def migrate_all(batch_size=IMAGE_MIGRATION_BATCH, failed=None):
+    """Convert every inline image; returns {table: rows converted}
+
+    failed, if given, maps each table to the set of row ids that could not be
+    converted (see migrate_batch) and is updated in place.
+    """
+    totals = {}
+    for table in TABLES:
+        after_id, totals[table] = 0, 0
+        table_failed = None if failed is None else failed.setdefault(table, set())
+        while True:
+            after_id, converted = migrate_batch(table, after_id, batch_size, table_failed)
+            if after_id is None:
+                break
+            totals[table] += converted
+    return totals
+
+class MigrationWorker:
+    """Runs migrate_all() on a background thread every `interval` seconds
+
+    Rows whose image cannot be decoded are remembered and skipped on later
+    passes, so they are retried (and logged) once per server start instead
+    of on every pass.
+    """
+
+    def __init__(self, interval=IMAGE_MIGRATION_INTERVAL, batch_size=IMAGE_MIGRATION_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._thread = None
+        self._stop = threading.Event()
+        self._failed = {table: set() for table in TABLES}  # ids of rows that could not be converted
+        self._stats = {"passes": 0, "converted": 0, "failures": 0, "last_pass": None}
+
+    def start(self):
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='image-migration', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # First pass right away, then every interval
+        while True:
+            try:
+                totals = migrate_all(self.batch_size, self._failed)
+                converted = sum(totals.values())
+                self._stats["converted"] += converted
+                if converted:
+                    logger.info("Converted %s inline images to files: %s", converted, totals)
+            except Exception as e:
+                self._stats["failures"] += 1
+                logger.error("Image migration pass failed: %s", e)
+            self._stats["passes"] += 1
+            self._stats["last_pass"] = time.time()
+            if self._stop.wait(self.interval):
+                return
+
+    def stats(self):
+        undecodable = {table: len(ids) for table, ids in self._failed.items()}
+        return dict(self._stats, undecodable=undecodable,
+                    running=self._thread is not None and self._thread.is_alive())
+
+_worker = MigrationWorker()
+
+def start_migration_worker():
+    """Start the background worker (no-op when IMAGE_MIGRATION_INTERVAL is 0)"""
+    _worker.start()
+
+def migration_stats():
+    return _worker.stats()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--batch', type=int, default=IMAGE_MIGRATION_BATCH,
+                        help=f'rows per transaction (default {IMAGE_MIGRATION_BATCH})')
+    args = parser.parse_args(argv)
+    failed = {}
+    totals = migrate_all(args.batch, failed)
+    for table, converted in totals.items():
+        print(f"{table}: converted {converted} inline images, {len(failed[table])} could not be converted")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import base64
+import hashlib
+import os
+import tempfile
+
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Content-addressed storage for uploaded images under static/uploads
+#
+# A file is named after the SHA-256 of its bytes and placed in two levels of
+# shard directories taken from the start of the hash:
+#
+#     /static/uploads/3f/a2/3fa2...c1.jpg
+#
+# Storing the same image twice returns the existing file, uploads can never
+# overwrite each other, and because a name always refers to the same bytes the
+# static server sends them with a one-year immutable Cache-Control (see
+# static_files._IMMUTABLE_NAME_RE).
+
+UPLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "uploads")
+UPLOADS_URL = "/static/uploads/"
+
+# Hex digits of the hash used in names (128 bits)
+HASH_LENGTH = 32
+
+# Leading bytes -> extension; checked before the data URL's declared type
+_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+)
+_MIME_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/svg+xml': '.svg',
+}
+DEFAULT_EXTENSION = '.jpg'
+
+# Bytes needed to recognise any of the formats above
+SNIFF_LENGTH = 12
+
+def sniff_image_extension(head):
+    """Extension of a JPEG/PNG/GIF/WebP from its first bytes, or None"""
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+def image_extension(data, mime_type=None):
+    """File extension for image bytes, sniffed from the content first"""
+    return (sniff_image_extension(data[:SNIFF_LENGTH])
+            or _MIME_EXTENSIONS.get((mime_type or '').lower(), DEFAULT_EXTENSION))
+
+def _relative_name(digest, extension):
+    digest = digest[:HASH_LENGTH]
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+def content_name(data, extension):
+    """Relative path of the file holding `data`: <h[:2]>/<h[2:4]>/<h[:32]><ext>"""
+    return _relative_name(hashlib.sha256(data).hexdigest(), extension)
+
+def _unlink_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def _publish(temp_path, name):
+    """Move a finished temp file to its content name, unless it already exists
+
+    Returns the file's path if this call created it, else None.
+    """
+    file_path = os.path.join(UPLOADS_DIR, *name.split('/'))
+    if os.path.exists(file_path):
+        logger.debug("Image already stored: %s", name)
+        _unlink_quietly(temp_path)
+        return None
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, file_path)
+    return file_path
+
+def store_image(data, mime_type=None):
+    """Write image bytes to the store (once) and return their /static/ URL"""
+    name = content_name(data, image_extension(data, mime_type))
+    if os.path.exists(os.path.join(UPLOADS_DIR, *name.split('/'))):
+        logger.debug("Image already stored: %s", name)
+        return UPLOADS_URL + name
+
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    # Write under a temporary name and rename, so readers never see a partial
+    # file and concurrent writers of the same image are harmless
+    fd, temp_path = tempfile.mkstemp(dir=UPLOADS_DIR, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        _publish(temp_path, name)
+        return UPLOADS_URL + name
+    except BaseException:
+        _unlink_quietly(temp_path)
+        raise
+
+class ImageWriter:
+    """Streams an uploaded image into the store
+
+    Chunks go to a temporary file and into the hash as they arrive, so the
+    upload is never held in memory. commit() checks that the content is a
+    JPEG, PNG, GIF or WebP and returns the /static/ URL it is stored under.
+    abort() drops the upload; after commit() it removes the stored file again,
+    unless the same image was already in the store.
+    """
+
+    def __init__(self):
+        os.makedirs(UPLOADS_DIR, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=UPLOADS_DIR, prefix='.upload-')
+        self._file = os.fdopen(fd, 'wb')
+        self._hash = hashlib.sha256()
+        self._head = b''
+        self._created_path = None
+        self.size = 0
+
+    def write(self, chunk):
+        if len(self._head) < SNIFF_LENGTH:
+            self._head += chunk[:SNIFF_LENGTH - len(self._head)]
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        extension = sniff_image_extension(self._head)
+        if extension is None:
+            raise ValueError("Unsupported image type (expected JPEG, PNG, GIF or WebP)")
+        name = _relative_name(self._hash.hexdigest(), extension)
+        self._created_path = _publish(self.temp_path, name)
+        return UPLOADS_URL + name
+
+    def abort(self):
+        self._file.close()
+        _unlink_quietly(self.temp_path)
+        if self._created_path is not None:
+            _unlink_quietly(self._created_path)
+            self._created_path = None
+
+def decode_base64_image(value):
+    """Split a data URL or bare base64 string into (bytes, declared mime type)
+
+    Returns None if `value` is a data URL that is not base64 encoded; raises
+    ValueError if the base64 payload does not decode.
+    """
+    mime_type = None
+    if "," in value:
+        # For format like "data:image/jpeg;base64,/9j/4AAQSk..."
+        header, payload = value.split(",", 1)
+        if ';base64' not in header and header != 'base64':
+            return None
+        if header.startswith('data:'):
+            mime_type = header[len('data:'):].split(';', 1)[0]
+    else:
+        payload = value
+    return base64.b64decode(payload), mime_type
+
+def store_inline_image(value):
+    """Store an inline (data URL or bare base64) image and return its URL
+
+    Returns None if the value is not base64 or does not decode. Unlike the
+    request-path savers there is no placeholder fallback, so a caller can tell
+    a bad image from a stored one.
+    """
+    try:
+        decoded = decode_base64_image(value)
+    except ValueError:
+        return None
+    if decoded is None or not decoded[0]:
+        return None
+    return store_image(*decoded)
@@ -0,0 +1,299 @@
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is optional; without it only originals are served
+    Image = None
+
+from image_store import UPLOADS_DIR
+from static_files import STATIC_ROOT
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Resized variants of content-addressed uploads (see image_store.py)
+#
+# Every original /static/uploads/ab/cd/<hash>.<ext> gets one file per width and
+# format under /static/variants:
+#
+#     /static/variants/ab/cd/<hash>.w640.webp
+#     /static/variants/ab/cd/<hash>.w640.jpg
+#
+# Variant URLs follow from the original's name, so catalog reads list them
+# without touching the disk. Creating or updating an artwork or exhibition
+# queues rendering on a background process pool; a variant that is requested
+# before it exists (or after eviction) is rendered on demand. The variants
+# directory is a cache bounded by IMAGE_VARIANT_CACHE_MB: least recently used
+# files are deleted first. Requires Pillow; without it no variants are listed.
+
+VARIANTS_DIR = os.path.join(STATIC_ROOT, 'variants')
+VARIANTS_URL = '/static/variants/'
+
+IMAGE_VARIANT_WIDTHS = tuple(sorted(int(w) for w in os.environ.get('IMAGE_VARIANT_WIDTHS', '320,640,1280').split(',') if w.strip()))
+IMAGE_VARIANT_QUALITY = int(os.environ.get('IMAGE_VARIANT_QUALITY', 80))
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', 2))  # render processes
+IMAGE_VARIANT_CACHE_MB = float(os.environ.get('IMAGE_VARIANT_CACHE_MB', 512))  # disk budget for variants
+IMAGE_VARIANT_WAIT = float(os.environ.get('IMAGE_VARIANT_WAIT', 10))  # seconds a request waits for a render
+
+# Recency is kept in file mtimes so every process sees it; bump at most this often
+_TOUCH_INTERVAL = 3600
+# Re-read the directory this often to account for files other processes wrote
+_RESCAN_INTERVAL = 60
+
+_ORIGINAL_RE = re.compile(r'^/static/uploads/([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{28})\.(jpg|png|gif|webp)$')
+_VARIANT_RE = re.compile(r'^([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{28})\.w(\d+)\.(webp|jpg|png)$')
+
+# Fallback format for browsers without WebP; keeps transparency for PNG/GIF/WebP
+_FALLBACK_FORMAT = {'jpg': 'jpg', 'png': 'png', 'gif': 'png', 'webp': 'png'}
+_PIL_FORMAT = {'jpg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+
+WEBP_SUPPORTED = Image is not None and features.check('webp')
+
+def enabled():
+    return Image is not None and bool(IMAGE_VARIANT_WIDTHS)
+
+def _formats(original_ext):
+    fallback = _FALLBACK_FORMAT[original_ext]
+    return ('webp', fallback) if WEBP_SUPPORTED else (fallback,)
+
+def _targets(shard1, shard2, digest, original_ext):
+    """[(width, format, relative name)] for every variant of an original"""
+    return [(width, fmt, f"{shard1}/{shard2}/{digest}.w{width}.{fmt}")
+            for width in IMAGE_VARIANT_WIDTHS for fmt in _formats(original_ext)]
+
+def variant_urls(image_url):
+    """Variant descriptions for an image URL, smallest first; [] if it has none"""
+    if not image_url or not enabled():
+        return []
+    match = _ORIGINAL_RE.match(image_url)
+    if not match:
+        return []
+    return [{"width": width, "format": fmt, "url": VARIANTS_URL + name}
+            for width, fmt, name in _targets(*match.groups())]
+
+def _render(original_path, targets):
+    """Resize one original into every target; runs in a pool process
+
+    targets: [(width, format, output path)]. Returns [(output path, size)].
+    Images are never upscaled; a narrower original is re-encoded as is.
+    """
+    written = []
+    with Image.open(original_path) as image:
+        image = ImageOps.exif_transpose(image)
+        for width, fmt, out_path in targets:
+            variant = image.copy()
+            if variant.width > width:
+                variant.thumbnail((width, variant.height), Image.LANCZOS)
+            if fmt == 'jpg' and variant.mode not in ('RGB', 'L'):
+                variant = variant.convert('RGB')
+            elif fmt != 'jpg' and variant.mode == 'P':
+                variant = variant.convert('RGBA')
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(out_path), prefix='.variant-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    variant.save(f, _PIL_FORMAT[fmt], quality=IMAGE_VARIANT_QUALITY, optimize=True)
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, out_path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            written.append((out_path, os.path.getsize(out_path)))
+    return written
+
+class VariantCache:
+    """Disk-bounded LRU over the files in the variants directory"""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # path -> size, least recently used first
+        self._total = 0
+        self._scanned_at = None
+        self._lock = threading.Lock()
+        self._stats = {"added": 0, "evicted": 0}
+
+    def _scan(self):
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+        files.sort()
+        self._entries = OrderedDict((path, size) for _, path, size in files)
+        self._total = sum(size for _, _, size in files)
+        self._scanned_at = time.monotonic()
+
+    def add(self, files):
+        """Record newly written (path, size) pairs, then evict down to the budget"""
+        with self._lock:
+            if self._scanned_at is None or time.monotonic() - self._scanned_at > _RESCAN_INTERVAL:
+                self._scan()
+            for path, size in files:
+                self._total += size - self._entries.pop(path, 0)
+                self._entries[path] = size
+                self._stats["added"] += 1
+            self._evict()
+
+    def touch(self, path):
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+        try:
+            if time.time() - os.stat(path).st_mtime > _TOUCH_INTERVAL:
+                os.utime(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.unlink(path)
+                self._stats["evicted"] += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Could not evict image variant %s: %s", path, e)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, files=len(self._entries), bytes=self._total, max_bytes=self.max_bytes)
+
+class VariantRenderer:
+    """Submits renders to a process pool, one job per original at a time"""
+
+    def __init__(self, cache, workers):
+        self.cache = cache
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._pending = {}  # digest -> Future
+        self._lock = threading.Lock()
+        self._stats = {"rendered": 0, "failed": 0}
+
+    def _pool(self):
+        # Pools do not survive fork, so each pre-fork worker builds its own;
+        # spawned children never inherit the server's threads or locks
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, shard1, shard2, digest, original_ext):
+        """Queue rendering of every missing variant of one original; returns a Future or None"""
+        original = os.path.join(UPLOADS_DIR, shard1, shard2, f"{digest}.{original_ext}")
+        with self._lock:
+            future = self._pending.get(digest)
+            if future is not None:
+                return future
+            targets = [(width, fmt, os.path.join(VARIANTS_DIR, *name.split('/')))
+                       for width, fmt, name in _targets(shard1, shard2, digest, original_ext)]
+            targets = [target for target in targets if not os.path.exists(target[2])]
+            if not targets or not os.path.exists(original):
+                return None
+            try:
+                future = self._pool().submit(_render, original, targets)
+            except BrokenProcessPool:
+                # A render process died (e.g. out of memory); start a fresh pool
+                self._executor = None
+                future = self._pool().submit(_render, original, targets)
+            self._pending[digest] = future
+        future.add_done_callback(lambda f: self._done(digest, f))
+        return future
+
+    def _done(self, digest, future):
+        try:
+            written = future.result()
+        except Exception as e:
+            written = None
+            logger.warning("Rendering image variants of %s failed: %s", digest, e)
+        with self._lock:
+            self._pending.pop(digest, None)
+            if written is None:
+                self._stats["failed"] += 1
+                return
+            self._stats["rendered"] += len(written)
+        self.cache.add(written)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+_cache = VariantCache(VARIANTS_DIR, int(IMAGE_VARIANT_CACHE_MB * 1024 * 1024))
+_renderer = VariantRenderer(_cache, IMAGE_VARIANT_WORKERS)
+
+def schedule_variants(image_url):
+    """Render the variants of a newly stored image in the background"""
+    if not enabled() or not image_url:
+        return
+    match = _ORIGINAL_RE.match(image_url)
+    if match:
+        try:
+            _renderer.submit(*match.groups())
+        except Exception as e:
+            logger.warning("Could not queue image variants for %s: %s", image_url, e)
+
+def _parse_variant_path(file_path):
+    if not file_path.startswith(VARIANTS_DIR + os.sep):
+        return None
+    relative = file_path[len(VARIANTS_DIR) + 1:].replace(os.sep, '/')
+    return _VARIANT_RE.match(relative)
+
+def ensure_variant(file_path):
+    """Render a missing variant on demand; True once file_path exists
+
+    Waits up to IMAGE_VARIANT_WAIT seconds; concurrent requests for variants of
+    the same original share one render.
+    """
+    if not enabled():
+        return False
+    match = _parse_variant_path(file_path)
+    if not match:
+        return False
+    shard1, shard2, digest, width, fmt = match.groups()
+    if int(width) not in IMAGE_VARIANT_WIDTHS or fmt not in ('webp', 'jpg', 'png'):
+        return False
+    for original_ext in ('jpg', 'png', 'gif', 'webp'):
+        if fmt in _formats(original_ext) and os.path.exists(
+                os.path.join(UPLOADS_DIR, shard1, shard2, f"{digest}.{original_ext}")):
+            break
+    else:
+        return False
+    future = _renderer.submit(shard1, shard2, digest, original_ext)
+    if future is not None:
+        try:
+            future.result(timeout=IMAGE_VARIANT_WAIT)
+        except Exception as e:
+            logger.warning("On-demand image variant %s not ready: %s", file_path, e)
+    return os.path.exists(file_path)
+
+def touch_variant(file_path):
+    """Mark a served variant as recently used"""
+    if file_path.startswith(VARIANTS_DIR + os.sep):
+        _cache.touch(file_path)
+
+def variant_stats():
+    return {
+        "enabled": enabled(),
+        "webp": WEBP_SUPPORTED,
+        "widths": list(IMAGE_VARIANT_WIDTHS),
+        "cache": _cache.stats(),
+        "renders": _renderer.stats(),
+    }
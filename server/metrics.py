@@ -0,0 +1,169 @@
+import bisect
+import re
+import threading
+
+# In-process metrics exposed at GET /metrics in the Prometheus text format
+#
+# Each metric keeps its samples in a dict keyed by the tuple of label values,
+# guarded by its own lock, so recording a request or query is a dict update
+# and a bisect. Label values must come from small fixed sets (route patterns,
+# not raw paths) to keep the number of series bounded.
+
+# Request latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Database call buckets in seconds
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{_labels(self.labels, label_values)} {_number(value)}'
+
+class Histogram:
+    """Cumulative histogram with fixed buckets and optional labels"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f'{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}'
+            labels = _labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {_number(round(series[-1], 6))}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+class CallbackMetric:
+    """Gauge or counter read from another component when metrics are scraped
+
+    fn returns {label values tuple: number}.
+    """
+
+    def __init__(self, name, help, fn, labels=(), type='gauge'):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.type = type
+        self._fn = fn
+
+    def samples(self):
+        for label_values, value in sorted(self._fn().items()):
+            yield f'{self.name}{_labels(self.labels, label_values)} {_number(value)}'
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total', 'HTTP requests handled, by route pattern and status code',
+    ('method', 'route', 'status')))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Time from parsed request line to response sent',
+    ('method', 'route'), LATENCY_BUCKETS))
+DB_CALLS = REGISTRY.register(Counter(
+    'db_calls_total', 'Database cursor calls, by statement type and outcome',
+    ('operation', 'outcome')))
+DB_LATENCY = REGISTRY.register(Histogram(
+    'db_call_duration_seconds', 'Time spent in database cursor calls',
+    ('operation',), DB_BUCKETS))
+
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'DELETE', 'OPTIONS'))
+_SQL_VERB_RE = re.compile(r'\s*(\w+)')
+SQL_VERBS = frozenset(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'ALTER', 'CREATE', 'SHOW'))
+
+def observe_request(method, route, status, seconds):
+    """Record one finished HTTP request"""
+    if method not in HTTP_METHODS:
+        method = 'OTHER'
+    HTTP_REQUESTS.inc(method, route, str(status))
+    HTTP_LATENCY.observe(seconds, method, route)
+
+def sql_operation(sql):
+    """Statement type used as the operation label ('SELECT', 'INSERT', ...)"""
+    match = _SQL_VERB_RE.match(sql) if isinstance(sql, str) else None
+    verb = match.group(1).upper() if match else 'OTHER'
+    return verb if verb in SQL_VERBS else 'OTHER'
+
+def observe_db_call(sql, seconds, failed):
+    """Record one cursor execute (sql given) or fetch (sql None) call"""
+    operation = 'FETCH' if sql is None else sql_operation(sql)
+    DB_CALLS.inc(operation, 'error' if failed else 'ok')
+    DB_LATENCY.observe(seconds, operation)
+
+def render_metrics():
+    return REGISTRY.render()
@@ -1,15 +1,25 @@
 
 import jwt
 import datetime
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from http.server import BaseHTTPRequestHandler
 from decimal import Decimal
 import json
+from app_logging import get_logger
+
+logger = get_logger(__name__)
 
 # Get the secret key from environment or use a default (in production, always use environment variables)
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'afriart_default_secret_key')
 
+# Number of verified token payloads kept in memory
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
+
 # Custom JSON encoder to handle Decimal types
 class DecimalEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -17,6 +27,64 @@ class DecimalEncoder(json.JSONEncoder):
             return float(obj)
         return super(DecimalEncoder, self).default(obj)
 
+class VerifiedTokenCache:
+    """Thread-safe LRU of verified token payloads, keyed by token digest
+
+    An entry is only returned until the token's own exp claim, so a cached
+    token expires exactly when a fresh jwt.decode would reject it.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # digest -> (exp, payload)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        """Return a copy of the cached payload, or None on a miss"""
+        key = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                exp, payload = entry
+                if exp > time.time():
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(payload)
+                del self._entries[key]
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, token, payload):
+        exp = payload.get("exp")
+        # Tokens without an expiry are always verified in full
+        if not isinstance(exp, (int, float)):
+            return
+        key = self._digest(token)
+        with self._lock:
+            self._entries[key] = (exp, dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._entries)
+            snapshot["max_size"] = self.max_size
+        return snapshot
+
+_token_cache = VerifiedTokenCache(TOKEN_CACHE_SIZE)
+
+def token_cache_stats():
+    """Return hit/miss counters for the verified-token cache"""
+    return _token_cache.stats()
+
 def generate_token(user_id, name, is_admin):
     """Generate a JWT token for authentication"""
     payload = {
@@ -26,25 +94,27 @@ def generate_token(user_id, name, is_admin):
         "exp": datetime.datetime.utcnow() + datetime.timedelta(days=1)
     }
     
-    print(f"Generating token with payload: {payload}")
+    logger.debug("Generating token with payload: %s", payload)
     token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
     return token
 
 def verify_token(token):
-    """Verify a JWT token"""
+    """Verify a JWT token, reusing earlier verifications of the same token"""
+    payload = _token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
-        print(f"Verifying token: {token[:20]}...")
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        print(f"Token decoded successfully: {payload}")
+        _token_cache.set(token, payload)
         return payload
     except jwt.ExpiredSignatureError:
-        print("Token verification failed: Token expired")
+        logger.info("Token verification failed: Token expired")
         return {"error": "Token expired"}
     except jwt.InvalidTokenError as e:
-        print(f"Token verification failed: Invalid token - {str(e)}")
+        logger.warning("Token verification failed: Invalid token - %s", e)
         return {"error": f"Invalid token: {str(e)}"}
     except Exception as e:
-        print(f"Unexpected error during token verification: {str(e)}")
+        logger.error("Unexpected error during token verification: %s", e)
         return {"error": f"Token verification error: {str(e)}"}
 
 def extract_auth_token(handler):
@@ -62,7 +132,7 @@ def extract_auth_token(handler):
         auth_header = handler.headers.get('Authorization', '')
     else:
         # Unknown type
-        print(f"Warning: extract_auth_token received unknown type: {type(handler)}")
+        logger.warning("extract_auth_token received unknown type: %s", type(handler))
         return None
     
     token = None
@@ -1,10 +1,19 @@
 import requests
 import base64
 import json
+import os
+import threading
 from datetime import datetime
 import time
-from db_setup import get_db_connection, dict_from_row
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from database import get_db_connection, dict_from_row
 from mysql.connector import Error
+from catalog_cache import invalidate
+from mpesa_events import publish_status, status_message
+from app_logging import get_logger
+
+logger = get_logger(__name__)
 
 # M-Pesa API credentials
 CONSUMER_KEY = "sMwMwGZ8oOiSkNrUIrPbcCeWIO8UiQ3SV4CyX739uAyZVs1F"
@@ -14,26 +23,136 @@ PASSKEY = "bfb279f9aa9bdbcf158e97dd71a467cd2e0c893059b10f78e6b72ada1ed2c919"
 CALLBACK_URL = "https://webhook.site/3c1f62b5-4214-47d6-9f26-71c1f4b9c8f0"
 API_BASE_URL = "https://sandbox.safaricom.co.ke"
 
-def get_access_token():
-    """Get OAuth access token from M-Pesa"""
-    url = f"{API_BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
-    auth = base64.b64encode(f"{CONSUMER_KEY}:{CONSUMER_SECRET}".encode()).decode('utf-8')
-    headers = {
-        "Authorization": f"Basic {auth}"
-    }
-    
-    try:
-        response = requests.get(url, headers=headers)
-        response_data = response.json()
-        
-        if "access_token" in response_data:
-            return response_data["access_token"]
+# Outbound HTTP to the Daraja API
+MPESA_CONNECT_TIMEOUT = float(os.environ.get('MPESA_CONNECT_TIMEOUT', 5))  # seconds
+MPESA_READ_TIMEOUT = float(os.environ.get('MPESA_READ_TIMEOUT', 30))  # seconds
+MPESA_RETRIES = int(os.environ.get('MPESA_RETRIES', 2))  # per request, with backoff
+MPESA_POOL_SIZE = int(os.environ.get('MPESA_POOL_SIZE', 10))  # keep-alive connections
+# Refresh the OAuth token this many seconds before Safaricom expires it
+MPESA_TOKEN_REFRESH_MARGIN = float(os.environ.get('MPESA_TOKEN_REFRESH_MARGIN', 60))
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Shared keep-alive session for calls to the Daraja API
+
+    Connection failures are retried for every request, since nothing was sent.
+    Timeouts and 5xx answers are only retried for GET: repeating an STK push
+    could prompt the customer twice. Each pre-fork worker builds its own
+    session instead of sharing inherited sockets.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            retry = Retry(total=MPESA_RETRIES, backoff_factor=0.3,
+                          status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=frozenset({'GET'}), raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MPESA_POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+def _request(method, path, **kwargs):
+    kwargs.setdefault('timeout', (MPESA_CONNECT_TIMEOUT, MPESA_READ_TIMEOUT))
+    return get_session().request(method, f"{API_BASE_URL}{path}", **kwargs)
+
+class AccessTokenCache:
+    """Caches the OAuth token until shortly before it expires
+
+    One thread fetches a new token while the others wait for it; while the old
+    token is still valid they keep using it instead of waiting.
+    """
+
+    def __init__(self, refresh_margin):
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"fetches": 0, "failures": 0}
+
+    def get(self):
+        token, expires_at = self._token, self._expires_at
+        now = time.monotonic()
+        if token and now < expires_at - self.refresh_margin:
+            return token
+        if token and now < expires_at:
+            # Due for refresh but still valid: only one thread refreshes
+            if not self._lock.acquire(blocking=False):
+                return token
         else:
-            print("Error getting access token:", response_data)
+            self._lock.acquire()
+        try:
+            if self._token and time.monotonic() < self._expires_at - self.refresh_margin:
+                return self._token  # refreshed while we waited
+            return self._fetch() or (self._token if time.monotonic() < self._expires_at else None)
+        finally:
+            self._lock.release()
+
+    def invalidate(self, token):
+        """Drop `token` after the API rejected it"""
+        with self._lock:
+            if self._token == token:
+                self._token, self._expires_at = None, 0.0
+
+    def _fetch(self):
+        auth = base64.b64encode(f"{CONSUMER_KEY}:{CONSUMER_SECRET}".encode()).decode('utf-8')
+        headers = {
+            "Authorization": f"Basic {auth}"
+        }
+        started = time.monotonic()
+        self._stats["fetches"] += 1
+        try:
+            response = _request('GET', "/oauth/v1/generate?grant_type=client_credentials", headers=headers)
+            response_data = response.json()
+
+            if "access_token" in response_data:
+                self._token = response_data["access_token"]
+                self._expires_at = started + float(response_data.get("expires_in", 3599))
+                return self._token
+            else:
+                self._stats["failures"] += 1
+                logger.error("Error getting access token: %s", response_data)
+                return None
+        except Exception as e:
+            self._stats["failures"] += 1
+            logger.error("Exception while getting access token: %s", e)
             return None
-    except Exception as e:
-        print(f"Exception while getting access token: {e}")
-        return None
+
+    def stats(self):
+        remaining = self._expires_at - time.monotonic() if self._token else None
+        return dict(self._stats, expires_in=remaining)
+
+_token_cache = AccessTokenCache(MPESA_TOKEN_REFRESH_MARGIN)
+
+def get_access_token():
+    """Get OAuth access token from M-Pesa, cached until shortly before expiry"""
+    return _token_cache.get()
+
+def _api_post(path, payload):
+    """POST to the Daraja API with the cached token; returns the decoded JSON
+
+    A 401 means the token was revoked early: it is dropped and the call is
+    repeated once with a fresh one.
+    """
+    for attempt in range(2):
+        access_token = get_access_token()
+        if not access_token:
+            return None
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+        response = _request('POST', path, json=payload, headers=headers)
+        if response.status_code != 401 or attempt:
+            return response.json()
+        _token_cache.invalidate(access_token)
+
+def mpesa_stats():
+    return {"token": _token_cache.stats()}
 
 def generate_password():
     """Generate password for M-Pesa STK Push"""
@@ -44,10 +163,6 @@ def generate_password():
 
 def initiate_stk_push(phone_number, amount, account_reference, order_type, order_id, user_id):
     """Initiate STK Push to customer's phone"""
-    access_token = get_access_token()
-    if not access_token:
-        return {"error": "Failed to get access token"}
-    
     password, timestamp = generate_password()
     
     # Format phone number to match M-Pesa requirements
@@ -56,12 +171,6 @@ def initiate_stk_push(phone_number, amount, account_reference, order_type, order
     if phone_number.startswith('0'):
         phone_number = '254' + phone_number[1:]
     
-    url = f"{API_BASE_URL}/mpesa/stkpush/v1/processrequest"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
     payload = {
         "BusinessShortCode": BUSINESS_SHORT_CODE,
         "Password": password,
@@ -77,9 +186,10 @@ def initiate_stk_push(phone_number, amount, account_reference, order_type, order
     }
     
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        result = response.json()
-        print(f"STK Push result: {result}")
+        result = _api_post("/mpesa/stkpush/v1/processrequest", payload)
+        if result is None:
+            return {"error": "Failed to get access token"}
+        logger.debug("STK Push result: %s", result)
         
         if "ResponseCode" in result and result["ResponseCode"] == "0":
             # Save transaction to database
@@ -104,11 +214,15 @@ def initiate_stk_push(phone_number, amount, account_reference, order_type, order
                 "details": result
             }
     except Exception as e:
-        print(f"Exception during STK Push: {e}")
+        logger.error("Exception during STK Push: %s", e)
         return {"error": str(e)}
 
 def check_transaction_status(checkout_request_id):
-    """Check status of an STK Push transaction"""
+    """Status of an STK Push transaction as recorded in the database
+
+    Pending transactions are settled by the callback or by the background
+    reconciler (mpesa_reconciler.py); polling clients never reach Safaricom.
+    """
     connection = get_db_connection()
     if not connection:
         return {"error": "Database connection failed"}
@@ -116,9 +230,8 @@ def check_transaction_status(checkout_request_id):
     cursor = connection.cursor()
     
     try:
-        # Check if transaction exists in database
         query = """
-        SELECT * FROM mpesa_transactions 
+        SELECT status, result_desc FROM mpesa_transactions 
         WHERE checkout_request_id = %s
         """
         cursor.execute(query, (checkout_request_id,))
@@ -128,92 +241,122 @@ def check_transaction_status(checkout_request_id):
             return {"error": "Transaction not found"}
         
         transaction = dict_from_row(row, cursor)
-        
-        # If transaction is still pending, check status from M-Pesa
-        if transaction["status"] == "pending":
-            access_token = get_access_token()
-            if not access_token:
-                return {"error": "Failed to get access token"}
-            
-            password, timestamp = generate_password()
-            
-            url = f"{API_BASE_URL}/mpesa/stkpushquery/v1/query"
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "BusinessShortCode": BUSINESS_SHORT_CODE,
-                "Password": password,
-                "Timestamp": timestamp,
-                "CheckoutRequestID": checkout_request_id
-            }
-            
-            try:
-                response = requests.post(url, json=payload, headers=headers)
-                result = response.json()
-                print(f"Transaction status query result: {result}")
-                
-                if "ResultCode" in result:
-                    if result["ResultCode"] == "0":
-                        # Update transaction status to completed
-                        update_transaction_status(
-                            checkout_request_id,
-                            "completed",
-                            result.get("ResultCode"),
-                            result.get("ResultDesc")
-                        )
-                        
-                        # Update order status
-                        update_order_status(
-                            transaction["order_type"],
-                            transaction["order_id"],
-                            "completed"
-                        )
-                        
-                        return {
-                            "success": True,
-                            "status": "completed",
-                            "message": "Payment completed successfully"
-                        }
-                    else:
-                        # Update transaction status to failed
-                        update_transaction_status(
-                            checkout_request_id,
-                            "failed",
-                            result.get("ResultCode"),
-                            result.get("ResultDesc")
-                        )
-                        
-                        return {
-                            "success": False,
-                            "status": "failed",
-                            "message": result.get("ResultDesc", "Payment failed")
-                        }
-                else:
-                    return {
-                        "status": "pending",
-                        "message": "Payment is being processed"
-                    }
-            except Exception as e:
-                print(f"Exception during status check: {e}")
-                return {"error": str(e)}
-        else:
-            # Return status from database
-            return {
-                "status": transaction["status"],
-                "message": transaction["result_desc"] if transaction["result_desc"] else 
-                          "Payment completed" if transaction["status"] == "completed" else "Payment failed"
-            }
+        return status_message(transaction["status"], transaction["result_desc"])
     except Exception as e:
-        print(f"Error checking transaction: {e}")
+        logger.error("Error checking transaction: %s", e)
         return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
+def query_stk_status(checkout_request_id):
+    """Ask Safaricom for the result of an STK Push
+
+    Returns the API response, or None without a token. A response without
+    ResultCode means the customer has not finished yet.
+    """
+    password, timestamp = generate_password()
+    
+    payload = {
+        "BusinessShortCode": BUSINESS_SHORT_CODE,
+        "Password": password,
+        "Timestamp": timestamp,
+        "CheckoutRequestID": checkout_request_id
+    }
+    
+    result = _api_post("/mpesa/stkpushquery/v1/query", payload)
+    logger.debug("Transaction status query result: %s", result)
+    return result
+
+def settle_transaction(checkout_request_id, status, result_code=None, result_desc=None):
+    """Record the final status of a transaction and its order in one database transaction
+
+    The transaction row is locked first, so callbacks and the reconciler for
+    the same checkout_request_id run one after the other: only the first finds
+    it pending, and repeats return {"duplicate": True} without changing
+    anything.
+    """
+    connection = get_db_connection()
+    if not connection:
+        return {"error": "Database connection failed"}
+    
+    cursor = connection.cursor()
+    
+    try:
+        query = """
+        SELECT status, order_type, order_id FROM mpesa_transactions
+        WHERE checkout_request_id = %s
+        FOR UPDATE
+        """
+        cursor.execute(query, (checkout_request_id,))
+        row = cursor.fetchone()
+        
+        if not row:
+            connection.rollback()
+            return {"error": "Transaction not found"}
+        
+        current_status, order_type, order_id = row
+        if current_status != "pending":
+            connection.rollback()
+            logger.debug("Transaction %s already %s, ignoring %s", checkout_request_id, current_status, status)
+            return {"success": True, "status": current_status, "duplicate": True}
+        
+        query = """
+        UPDATE mpesa_transactions
+        SET status = %s, result_code = %s, result_desc = %s, updated_at = NOW()
+        WHERE checkout_request_id = %s
+        """
+        cursor.execute(query, (status, result_code, result_desc, checkout_request_id))
+        changed_table = _update_order_status(cursor, order_type, order_id, status)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+    
+    if changed_table:
+        invalidate(changed_table)
+    publish_status(checkout_request_id, status, result_desc)
+    return {"success": True, "status": status}
+
+def _update_order_status(cursor, order_type, order_id, payment_status):
+    """Set an order's payment status within the caller's transaction
+
+    The first completed payment of an order also marks the artwork sold or
+    takes the booked slots off the exhibition. Returns the catalog table that
+    changed, if any.
+    """
+    if order_type == "artwork":
+        cursor.execute("SELECT artwork_id, payment_status FROM artwork_orders WHERE id = %s FOR UPDATE",
+                       (order_id,))
+        row = cursor.fetchone()
+        if not row:
+            logger.warning("Artwork order %s not found", order_id)
+            return None
+        artwork_id, previous_status = row
+        cursor.execute("UPDATE artwork_orders SET payment_status = %s WHERE id = %s", (payment_status, order_id))
+        if payment_status == "completed" and previous_status != "completed" and artwork_id is not None:
+            cursor.execute("UPDATE artworks SET status = 'sold' WHERE id = %s", (artwork_id,))
+            return 'artworks'
+    elif order_type == "exhibition":
+        cursor.execute("SELECT exhibition_id, slots, payment_status FROM exhibition_bookings WHERE id = %s FOR UPDATE",
+                       (order_id,))
+        row = cursor.fetchone()
+        if not row:
+            logger.warning("Exhibition booking %s not found", order_id)
+            return None
+        exhibition_id, slots, previous_status = row
+        cursor.execute("UPDATE exhibition_bookings SET payment_status = %s WHERE id = %s", (payment_status, order_id))
+        if payment_status == "completed" and previous_status != "completed" and exhibition_id is not None:
+            cursor.execute("UPDATE exhibitions SET available_slots = available_slots - %s WHERE id = %s",
+                           (slots, exhibition_id))
+            return 'exhibitions'
+    return None
+
 def save_transaction_request(checkout_request_id, merchant_request_id, order_type, order_id, user_id, amount, phone_number):
     """Save M-Pesa transaction request to database"""
     connection = get_db_connection()
@@ -240,152 +383,59 @@ def save_transaction_request(checkout_request_id, merchant_request_id, order_typ
         connection.commit()
         return True
     except Error as e:
-        print(f"Error saving transaction: {e}")
+        logger.error("Error saving transaction: %s", e)
         return False
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-def update_transaction_status(checkout_request_id, status, result_code=None, result_desc=None):
-    """Update M-Pesa transaction status in database"""
-    connection = get_db_connection()
-    if not connection:
-        return False
+def apply_callback(callback_data):
+    """Apply an M-Pesa callback payload; returns the settle_transaction() result
+
+    Raises ValueError for a payload that can never be applied. Safaricom may
+    deliver a callback more than once; repeats change nothing.
+    """
+    if not isinstance(callback_data, dict):
+        raise ValueError("Callback payload is not an object")
+    # Daraja wraps the result in Body.stkCallback
+    callback_data = callback_data.get("Body", {}).get("stkCallback", callback_data)
+    checkout_request_id = callback_data.get("CheckoutRequestID")
+    result_code = callback_data.get("ResultCode")
+    result_desc = callback_data.get("ResultDesc")
     
-    cursor = connection.cursor()
+    if not checkout_request_id:
+        raise ValueError("Missing CheckoutRequestID")
     
-    try:
-        query = """
-        UPDATE mpesa_transactions
-        SET status = %s, result_code = %s, result_desc = %s
-        WHERE checkout_request_id = %s
-        """
-        cursor.execute(query, (status, result_code, result_desc, checkout_request_id))
-        connection.commit()
-        return True
-    except Error as e:
-        print(f"Error updating transaction: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
-
-def update_order_status(order_type, order_id, payment_status):
-    """Update order payment status in database"""
-    connection = get_db_connection()
-    if not connection:
-        return False
+    # ResultCode is a number in real callbacks
+    if result_code is not None:
+        result_code = str(result_code)
     
-    cursor = connection.cursor()
+    if result_code == "0":
+        # Payment successful
+        status = "completed"
+    else:
+        # Payment failed
+        status = "failed"
     
-    try:
-        if order_type == "artwork":
-            query = """
-            UPDATE artwork_orders
-            SET payment_status = %s
-            WHERE id = %s
-            """
-        elif order_type == "exhibition":
-            query = """
-            UPDATE exhibition_bookings
-            SET payment_status = %s
-            WHERE id = %s
-            """
-        else:
-            return False
-        
-        cursor.execute(query, (payment_status, order_id))
-        connection.commit()
-        
-        # If it's an artwork order and payment is completed, update artwork status
-        if order_type == "artwork" and payment_status == "completed":
-            query = """
-            UPDATE artworks a
-            JOIN artwork_orders o ON a.id = o.artwork_id
-            SET a.status = 'sold'
-            WHERE o.id = %s
-            """
-            cursor.execute(query, (order_id,))
-            connection.commit()
-        
-        # If it's an exhibition booking and payment is completed, update available slots
-        if order_type == "exhibition" and payment_status == "completed":
-            query = """
-            UPDATE exhibitions e
-            JOIN exhibition_bookings b ON e.id = b.exhibition_id
-            SET e.available_slots = e.available_slots - b.slots
-            WHERE b.id = %s
-            """
-            cursor.execute(query, (order_id,))
-            connection.commit()
-        
-        return True
-    except Error as e:
-        print(f"Error updating order: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+    return settle_transaction(checkout_request_id, status, result_code, result_desc)
 
 def handle_mpesa_callback(callback_data):
-    """Handle M-Pesa callback data"""
+    """Handle M-Pesa callback data inside the request (without the callback queue)"""
     try:
-        checkout_request_id = callback_data.get("CheckoutRequestID")
-        result_code = callback_data.get("ResultCode")
-        result_desc = callback_data.get("ResultDesc")
-        
-        if not checkout_request_id:
-            return {"error": "Missing CheckoutRequestID"}
-        
-        if result_code == "0":
-            # Payment successful
-            status = "completed"
-        else:
-            # Payment failed
-            status = "failed"
-        
-        # Update transaction status
-        success = update_transaction_status(checkout_request_id, status, result_code, result_desc)
-        
-        if success:
-            # Get transaction details
-            connection = get_db_connection()
-            if not connection:
-                return {"error": "Database connection failed"}
-            
-            cursor = connection.cursor()
-            
-            try:
-                query = """
-                SELECT order_type, order_id FROM mpesa_transactions 
-                WHERE checkout_request_id = %s
-                """
-                cursor.execute(query, (checkout_request_id,))
-                row = cursor.fetchone()
-                
-                if row:
-                    order_type = row[0]
-                    order_id = row[1]
-                    
-                    # Update order status
-                    update_order_status(order_type, order_id, status)
-            finally:
-                if connection.is_connected():
-                    cursor.close()
-                    connection.close()
+        result = apply_callback(callback_data)
+        if "error" in result:
+            return result
         
         return {"success": True}
     except Exception as e:
-        print(f"Error handling M-Pesa callback: {e}")
+        logger.error("Error handling M-Pesa callback: %s", e)
         return {"error": str(e)}
 
 def handle_stk_push_request(request_data):
     """Handle STK Push request from frontend"""
     try:
-        print("STK Push request received:", request_data)
+        logger.debug("STK Push request received: %s", request_data)
         
         phone_number = request_data.get("phoneNumber")
         amount = request_data.get("amount")
@@ -407,7 +457,7 @@ def handle_stk_push_request(request_data):
         
         if missing_fields:
             error_msg = f"Missing required fields: {', '.join(missing_fields)}"
-            print(error_msg)
+            logger.warning("%s", error_msg)
             return {"error": error_msg}
         
         # Initialize STK Push
@@ -457,5 +507,5 @@ def handle_stk_push_request(request_data):
                 "stk": stk_result
             }
     except Exception as e:
-        print(f"Error handling STK Push request: {e}")
+        logger.error("Error handling STK Push request: %s", e)
         return {"error": str(e)}
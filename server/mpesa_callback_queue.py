@@ -0,0 +1,262 @@
+"""Durable queue for M-Pesa callbacks
+
+POST /mpesa/callback appends the payload to a local SQLite journal and answers
+at once; a pool of worker threads applies queued callbacks to the database.
+A callback whose processing fails is retried with a doubling delay, and after
+MPESA_CALLBACK_MAX_ATTEMPTS attempts it is dead-lettered: kept in the journal
+with its last error until requeued by hand.
+
+    python mpesa_callback_queue.py               # counts by state
+    python mpesa_callback_queue.py --dead        # list dead-lettered callbacks
+    python mpesa_callback_queue.py --requeue     # retry dead-lettered callbacks
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from mpesa import apply_callback
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Journal file shared by all worker processes ('' disables the queue and
+# callbacks are processed inside the request as before)
+MPESA_CALLBACK_QUEUE = os.environ.get(
+    'MPESA_CALLBACK_QUEUE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'mpesa_callbacks.db'))
+MPESA_CALLBACK_WORKERS = int(os.environ.get('MPESA_CALLBACK_WORKERS', 2))  # threads applying callbacks
+MPESA_CALLBACK_MAX_ATTEMPTS = int(os.environ.get('MPESA_CALLBACK_MAX_ATTEMPTS', 8))
+MPESA_CALLBACK_RETRY_DELAY = float(os.environ.get('MPESA_CALLBACK_RETRY_DELAY', 2))  # seconds, doubled per attempt
+MPESA_CALLBACK_MAX_RETRY_DELAY = float(os.environ.get('MPESA_CALLBACK_MAX_RETRY_DELAY', 300))  # seconds
+MPESA_CALLBACK_POLL_INTERVAL = float(os.environ.get('MPESA_CALLBACK_POLL_INTERVAL', 1))  # seconds
+
+# A claimed callback becomes due again after this long, so one whose worker
+# died is picked up again (applying a callback twice is harmless)
+_LEASE = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS callbacks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_callbacks_state_next_attempt_at ON callbacks(state, next_attempt_at);
+"""
+
+class CallbackQueue:
+    """Callbacks journaled in a SQLite file; one connection per thread and process"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Autocommit: every put() is its own durable transaction
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=FULL')
+            connection.executescript(_SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def put(self, payload):
+        """Append a callback; once this returns it survives a crash"""
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO callbacks (payload, received_at, next_attempt_at) VALUES (?, ?, ?)",
+            (json.dumps(payload), now, now))
+        return cursor.lastrowid
+
+    def claim(self):
+        """Take the next due callback: (id, payload, attempts so far) or None"""
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                "SELECT id, payload, attempts FROM callbacks WHERE state = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, id LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE callbacks SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                                   (now + _LEASE, row[0]))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), row[2]
+
+    def complete(self, callback_id):
+        self._connection().execute("DELETE FROM callbacks WHERE id = ?", (callback_id,))
+
+    def retry(self, callback_id, delay, error):
+        self._connection().execute(
+            "UPDATE callbacks SET next_attempt_at = ?, last_error = ? WHERE id = ?",
+            (time.time() + delay, error, callback_id))
+
+    def bury(self, callback_id, error):
+        """Move a callback to the dead letters"""
+        self._connection().execute(
+            "UPDATE callbacks SET state = 'dead', last_error = ? WHERE id = ?", (error, callback_id))
+
+    def dead(self, limit=100):
+        rows = self._connection().execute(
+            "SELECT id, payload, received_at, attempts, last_error FROM callbacks WHERE state = 'dead' "
+            "ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [{"id": row[0], "payload": json.loads(row[1]), "received_at": row[2],
+                 "attempts": row[3], "last_error": row[4]} for row in rows]
+
+    def requeue_dead(self):
+        """Give every dead-lettered callback a fresh set of attempts; returns how many"""
+        cursor = self._connection().execute(
+            "UPDATE callbacks SET state = 'queued', attempts = 0, next_attempt_at = ? WHERE state = 'dead'",
+            (time.time(),))
+        return cursor.rowcount
+
+    def counts(self):
+        rows = self._connection().execute("SELECT state, COUNT(*) FROM callbacks GROUP BY state").fetchall()
+        return dict({"queued": 0, "dead": 0}, **dict(rows))
+
+def retry_delay(attempts):
+    return min(MPESA_CALLBACK_RETRY_DELAY * 2 ** (attempts - 1), MPESA_CALLBACK_MAX_RETRY_DELAY)
+
+class CallbackWorkers:
+    """Threads that drain the queue into apply_callback()"""
+
+    def __init__(self, queue, workers=MPESA_CALLBACK_WORKERS, max_attempts=MPESA_CALLBACK_MAX_ATTEMPTS,
+                 poll_interval=MPESA_CALLBACK_POLL_INTERVAL):
+        self.queue = queue
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._stop = threading.Event()
+        self._wake = threading.Condition()
+        self._lock = threading.Lock()
+        self._stats = {"processed": 0, "retried": 0, "dead_lettered": 0, "errors": 0}
+
+    def start(self):
+        if self.workers <= 0 or any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._run, name=f'mpesa-callback-{i}', daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.notify()
+
+    def notify(self):
+        """Wake a worker for a callback queued in this process"""
+        with self._wake:
+            self._wake.notify()
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.queue.claim()
+            except Exception as e:
+                self._count("errors")
+                logger.error("Could not read the M-Pesa callback queue: %s", e)
+                claimed = None
+            if claimed is None:
+                # Callbacks queued by other pre-fork workers are found by polling
+                with self._wake:
+                    self._wake.wait(self.poll_interval)
+                continue
+            try:
+                self._process(*claimed)
+            except Exception as e:
+                self._count("errors")
+                logger.error("Could not update queued M-Pesa callback %s: %s", claimed[0], e)
+
+    def _process(self, callback_id, payload, attempts):
+        attempts += 1
+        try:
+            result = apply_callback(payload)
+            error = result.get("error")
+        except ValueError as e:
+            # Malformed payload: retrying cannot help
+            logger.warning("Dead-lettering malformed M-Pesa callback %s: %s", callback_id, e)
+            self.queue.bury(callback_id, str(e))
+            self._count("dead_lettered")
+            return
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+
+        if error is None:
+            self.queue.complete(callback_id)
+            self._count("processed")
+        elif attempts >= self.max_attempts:
+            logger.error("Dead-lettering M-Pesa callback %s after %s attempts: %s", callback_id, attempts, error)
+            self.queue.bury(callback_id, error)
+            self._count("dead_lettered")
+        else:
+            # e.g. the database is down, or the callback beat the transaction's INSERT
+            logger.warning("M-Pesa callback %s failed (attempt %s), retrying: %s", callback_id, attempts, error)
+            self.queue.retry(callback_id, retry_delay(attempts), error)
+            self._count("retried")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, workers=sum(thread.is_alive() for thread in self._threads))
+
+_queue = CallbackQueue(MPESA_CALLBACK_QUEUE) if MPESA_CALLBACK_QUEUE else None
+_workers = CallbackWorkers(_queue) if _queue else None
+
+def enqueue_callback(payload):
+    """Journal a callback for the workers; False if the queue is disabled"""
+    if _queue is None:
+        return False
+    _queue.put(payload)
+    _workers.notify()
+    return True
+
+def start_callback_workers():
+    """Start draining the queue (no-op when it is disabled)"""
+    if _workers is not None:
+        _workers.start()
+
+def callback_queue_stats():
+    if _queue is None:
+        return {"enabled": False}
+    try:
+        counts = _queue.counts()
+    except sqlite3.Error as e:
+        counts = {"error": str(e)}
+    return dict(_workers.stats(), enabled=True, **counts)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dead', action='store_true', help='list dead-lettered callbacks')
+    parser.add_argument('--requeue', action='store_true', help='move dead-lettered callbacks back to the queue')
+    args = parser.parse_args(argv)
+    if _queue is None:
+        parser.error("MPESA_CALLBACK_QUEUE is disabled")
+    if args.dead:
+        for entry in _queue.dead():
+            print(json.dumps(entry))
+    elif args.requeue:
+        print(f"requeued {_queue.requeue_dead()} callbacks")
+    else:
+        print(json.dumps(_queue.counts()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+import json
+import os
+import queue
+import selectors
+import socket
+import threading
+import time
+
+from database import get_db_connection
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Server-Sent Events for M-Pesa payment status
+#
+# GET /mpesa/status/{id}/events answers with the current status and, while the
+# payment is pending, keeps the connection open until it settles. Open streams
+# are not tied to HTTP worker threads: the handler detaches the socket and one
+# notifier thread per process watches all of them with a selector.
+#
+# A payment settled in this process (callback or reconciler) is pushed at once
+# through publish_status(). Payments settled in another pre-fork worker are
+# picked up by one batched query every MPESA_SSE_POLL_INTERVAL seconds, however
+# many streams are open. Streams are closed after MPESA_SSE_MAX_AGE seconds;
+# EventSource clients then reconnect on their own.
+
+MPESA_SSE_POLL_INTERVAL = float(os.environ.get('MPESA_SSE_POLL_INTERVAL', 2))  # seconds between database checks
+MPESA_SSE_HEARTBEAT = float(os.environ.get('MPESA_SSE_HEARTBEAT', 15))  # seconds between keep-alive comments
+MPESA_SSE_MAX_AGE = float(os.environ.get('MPESA_SSE_MAX_AGE', 300))  # seconds a stream stays open
+MPESA_SSE_MAX_STREAMS = int(os.environ.get('MPESA_SSE_MAX_STREAMS', 1000))  # open streams per process
+MPESA_SSE_RETRY_MS = int(os.environ.get('MPESA_SSE_RETRY_MS', 3000))  # client reconnect delay
+
+# Ids per IN (...) list when polling the database
+_POLL_CHUNK = 500
+
+def status_message(status, result_desc=None):
+    """Client-facing body for a transaction status"""
+    if status == "pending":
+        return {
+            "status": "pending",
+            "message": "Payment is being processed"
+        }
+    return {
+        "status": status,
+        "message": result_desc if result_desc else
+                  "Payment completed" if status == "completed" else "Payment failed"
+    }
+
+def format_event(data, event='status'):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+def stream_preamble(status):
+    """First bytes of a stream: the reconnect delay and the current status"""
+    return f"retry: {MPESA_SSE_RETRY_MS}\n\n".encode() + format_event(status)
+
+def fetch_settled(checkout_request_ids):
+    """{checkout_request_id: (status, result_desc)} for those no longer pending"""
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError("Database connection failed")
+
+    cursor = connection.cursor()
+    try:
+        settled = {}
+        for start in range(0, len(checkout_request_ids), _POLL_CHUNK):
+            chunk = checkout_request_ids[start:start + _POLL_CHUNK]
+            cursor.execute(
+                "SELECT checkout_request_id, status, result_desc FROM mpesa_transactions "
+                f"WHERE status != 'pending' AND checkout_request_id IN ({', '.join(['%s'] * len(chunk))})",
+                tuple(chunk))
+            for checkout_request_id, status, result_desc in cursor.fetchall():
+                settled[checkout_request_id] = (status, result_desc)
+        return settled
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+class StatusStreams:
+    """Open event streams of this process, served by a single notifier thread
+
+    Other threads only enqueue work (new streams, published statuses); every
+    socket is written and closed by the notifier thread.
+    """
+
+    def __init__(self, max_streams=MPESA_SSE_MAX_STREAMS, poll_interval=MPESA_SSE_POLL_INTERVAL,
+                 heartbeat=MPESA_SSE_HEARTBEAT, max_age=MPESA_SSE_MAX_AGE):
+        self.max_streams = max_streams
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.max_age = max_age
+        self._streams = {}  # socket -> (checkout_request_id, opened at)
+        self._by_id = {}  # checkout_request_id -> set of sockets
+        self._open = 0
+        self._commands = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wake_r = self._wake_w = None
+        self._stats = {"opened": 0, "rejected": 0, "delivered": 0, "expired": 0, "disconnected": 0, "polls": 0}
+
+    def open(self, sock, checkout_request_id):
+        """Hand a socket whose response headers are sent over; False if at capacity"""
+        with self._lock:
+            if self._open >= self.max_streams:
+                self._stats["rejected"] += 1
+                return False
+            self._open += 1
+            self._stats["opened"] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._wake_r, self._wake_w = socket.socketpair()
+                self._wake_r.setblocking(False)
+                self._wake_w.setblocking(False)
+                self._thread = threading.Thread(target=self._run, name='mpesa-events', daemon=True)
+                self._thread.start()
+        self._send_command(('open', sock, checkout_request_id))
+        return True
+
+    def publish(self, checkout_request_id, status, result_desc=None):
+        """Push a settled status to this process's streams for the transaction"""
+        if self._open:
+            self._send_command(('publish', checkout_request_id, status, result_desc))
+
+    def _send_command(self, command):
+        self._commands.put(command)
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # a wake-up is already pending
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        next_poll = time.monotonic() + self.poll_interval
+        next_heartbeat = time.monotonic() + self.heartbeat
+        while True:
+            timeout = max(0.0, min(next_poll, next_heartbeat) - time.monotonic())
+            for key, _ in selector.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    # Clients never send on an event stream: this is a disconnect
+                    self._close(selector, key.fileobj, "disconnected")
+
+            while True:
+                try:
+                    command = self._commands.get_nowait()
+                except queue.Empty:
+                    break
+                if command[0] == 'open':
+                    _, sock, checkout_request_id = command
+                    sock.setblocking(False)
+                    selector.register(sock, selectors.EVENT_READ)
+                    self._streams[sock] = (checkout_request_id, time.monotonic())
+                    self._by_id.setdefault(checkout_request_id, set()).add(sock)
+                else:
+                    _, checkout_request_id, status, result_desc = command
+                    self._deliver(selector, checkout_request_id, status, result_desc)
+
+            now = time.monotonic()
+            if now >= next_poll:
+                next_poll = now + self.poll_interval
+                if self._by_id:
+                    self._poll(selector)
+            if now >= next_heartbeat:
+                next_heartbeat = now + self.heartbeat
+                for sock, (_, opened_at) in list(self._streams.items()):
+                    if now - opened_at > self.max_age:
+                        self._close(selector, sock, "expired")
+                    else:
+                        self._write(selector, sock, b': keep-alive\n\n')
+
+    def _poll(self, selector):
+        with self._lock:
+            self._stats["polls"] += 1
+        try:
+            settled = fetch_settled(list(self._by_id))
+        except Exception as e:
+            logger.warning("Could not check payment status for event streams: %s", e)
+            return
+        for checkout_request_id, (status, result_desc) in settled.items():
+            self._deliver(selector, checkout_request_id, status, result_desc)
+
+    def _deliver(self, selector, checkout_request_id, status, result_desc):
+        event = format_event(status_message(status, result_desc))
+        for sock in list(self._by_id.get(checkout_request_id, ())):
+            if self._write(selector, sock, event):
+                self._close(selector, sock, "delivered")
+
+    def _write(self, selector, sock, data):
+        """Send a small event without blocking; a client that can't take it is dropped"""
+        try:
+            if sock.send(data) == len(data):
+                return True
+        except OSError:
+            pass
+        self._close(selector, sock, "disconnected")
+        return False
+
+    def _close(self, selector, sock, reason):
+        entry = self._streams.pop(sock, None)
+        if entry is None:
+            return
+        sockets = self._by_id.get(entry[0])
+        if sockets is not None:
+            sockets.discard(sock)
+            if not sockets:
+                del self._by_id[entry[0]]
+        selector.unregister(sock)
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+        with self._lock:
+            self._open -= 1
+            self._stats[reason] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, open=self._open, max_streams=self.max_streams)
+
+_streams = StatusStreams()
+
+def open_status_stream(sock, checkout_request_id):
+    """Keep `sock` open until the transaction settles; False if at capacity"""
+    return _streams.open(sock, checkout_request_id)
+
+def publish_status(checkout_request_id, status, result_desc=None):
+    _streams.publish(checkout_request_id, status, result_desc)
+
+def stream_stats():
+    return _streams.stats()
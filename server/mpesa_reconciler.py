@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from mpesa import query_stk_status, settle_transaction
+from database import get_db_connection
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Settles pending M-Pesa transactions in the background
+#
+# Safaricom normally reports the outcome of an STK push through the callback.
+# When that callback is late or lost, this worker asks the STK query API
+# instead, so the status endpoint only ever reads the database. Each pending
+# transaction is first queried MPESA_RECONCILE_FIRST_DELAY seconds after it is
+# seen (the customer needs time to enter their PIN), then again with the delay
+# doubling up to MPESA_RECONCILE_MAX_DELAY. Transactions older than
+# MPESA_RECONCILE_MAX_AGE are left alone.
+
+MPESA_RECONCILE_INTERVAL = float(os.environ.get('MPESA_RECONCILE_INTERVAL', 5))  # seconds between passes (0 = off)
+MPESA_RECONCILE_BATCH = int(os.environ.get('MPESA_RECONCILE_BATCH', 20))  # queries per pass
+MPESA_RECONCILE_WORKERS = int(os.environ.get('MPESA_RECONCILE_WORKERS', 4))  # concurrent queries
+MPESA_RECONCILE_FIRST_DELAY = float(os.environ.get('MPESA_RECONCILE_FIRST_DELAY', 20))  # seconds
+MPESA_RECONCILE_MAX_DELAY = float(os.environ.get('MPESA_RECONCILE_MAX_DELAY', 300))  # seconds
+MPESA_RECONCILE_MAX_AGE = float(os.environ.get('MPESA_RECONCILE_MAX_AGE', 24 * 3600))  # seconds
+
+PENDING_SQL = """
+SELECT checkout_request_id FROM mpesa_transactions
+WHERE status = 'pending' AND created_at >= %s
+ORDER BY id
+"""
+
+def fetch_pending(max_age=MPESA_RECONCILE_MAX_AGE):
+    """Checkout request ids of pending transactions younger than max_age seconds"""
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError("Database connection failed")
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(PENDING_SQL, (datetime.now() - timedelta(seconds=max_age),))
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def reconcile(checkout_request_id):
+    """Query one transaction and settle it if Safaricom has a result
+
+    Returns the settled status, or None while it is still pending.
+    """
+    result = query_stk_status(checkout_request_id)
+    if not result or "ResultCode" not in result:
+        return None
+    status = "completed" if str(result["ResultCode"]) == "0" else "failed"
+    settle_transaction(checkout_request_id, status, str(result["ResultCode"]), result.get("ResultDesc"))
+    return status
+
+class PaymentReconciler:
+    """Polls pending transactions on a background thread, with per-transaction backoff
+
+    The schedule is kept in memory: after a restart every pending transaction
+    simply starts again from the first delay.
+    """
+
+    def __init__(self, interval=MPESA_RECONCILE_INTERVAL, batch_size=MPESA_RECONCILE_BATCH,
+                 workers=MPESA_RECONCILE_WORKERS, first_delay=MPESA_RECONCILE_FIRST_DELAY,
+                 max_delay=MPESA_RECONCILE_MAX_DELAY):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.workers = workers
+        self.first_delay = first_delay
+        self.max_delay = max_delay
+        self._schedule = {}  # checkout_request_id -> (next query at, queries so far)
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"passes": 0, "queries": 0, "completed": 0, "failed": 0,
+                       "errors": 0, "last_pass": None}
+
+    def start(self):
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='mpesa-reconciler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _due(self, pending, now):
+        """Update the schedule from the pending ids; return those due now, oldest first"""
+        pending_set = set(pending)
+        due = []
+        with self._lock:
+            for checkout_request_id in list(self._schedule):
+                if checkout_request_id not in pending_set:
+                    del self._schedule[checkout_request_id]  # settled elsewhere or too old
+            for checkout_request_id in pending:
+                if checkout_request_id not in self._schedule:
+                    self._schedule[checkout_request_id] = (now + self.first_delay, 0)
+                elif self._schedule[checkout_request_id][0] <= now:
+                    due.append(checkout_request_id)
+        return due[:self.batch_size]
+
+    def _count(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._stats[key] += 1
+
+    def _check(self, checkout_request_id):
+        try:
+            status = reconcile(checkout_request_id)
+        except Exception as e:
+            status = None
+            self._count("errors")
+            logger.warning("M-Pesa status query for %s failed: %s", checkout_request_id, e)
+        if status is not None:
+            self._count("queries", status)
+            logger.info("Reconciled M-Pesa transaction %s: %s", checkout_request_id, status)
+            with self._lock:
+                self._schedule.pop(checkout_request_id, None)
+            return
+        self._count("queries")
+        with self._lock:
+            _, attempts = self._schedule.get(checkout_request_id, (0, 0))
+            delay = min(self.first_delay * 2 ** attempts, self.max_delay)
+            self._schedule[checkout_request_id] = (time.monotonic() + delay, attempts + 1)
+
+    def run_pass(self, executor):
+        due = self._due(fetch_pending(), time.monotonic())
+        list(executor.map(self._check, due))
+        return len(due)
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mpesa-query') as executor:
+            while not self._stop.is_set():
+                try:
+                    self.run_pass(executor)
+                except Exception as e:
+                    self._count("errors")
+                    logger.error("M-Pesa reconciliation pass failed: %s", e)
+                with self._lock:
+                    self._stats["passes"] += 1
+                    self._stats["last_pass"] = time.time()
+                self._stop.wait(self.interval)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, tracked=len(self._schedule),
+                        running=self._thread is not None and self._thread.is_alive())
+
+_reconciler = PaymentReconciler()
+
+def start_reconciler():
+    """Start the background reconciler (no-op when MPESA_RECONCILE_INTERVAL is 0)"""
+    _reconciler.start()
+
+def reconciler_stats():
+    return _reconciler.stats()
@@ -0,0 +1,200 @@
+import os
+
+# Streaming multipart/form-data parser
+#
+# The body is read from the socket in MULTIPART_CHUNK_SIZE pieces and never
+# held in memory as a whole: text fields are collected (up to
+# MULTIPART_MAX_FIELD_SIZE each) and file parts are handed chunk by chunk to a
+# writer supplied by the caller, which stores them on disk. Every limit is
+# checked while reading, so an oversized upload is rejected as soon as it
+# crosses the limit.
+
+MULTIPART_MAX_BODY = int(os.environ.get('MULTIPART_MAX_BODY', 25 * 1024 * 1024))  # bytes per request
+MULTIPART_MAX_FILE_SIZE = int(os.environ.get('MULTIPART_MAX_FILE_SIZE', 10 * 1024 * 1024))  # bytes per file
+MULTIPART_MAX_FIELD_SIZE = int(os.environ.get('MULTIPART_MAX_FIELD_SIZE', 64 * 1024))  # bytes per text field
+MULTIPART_MAX_PARTS = int(os.environ.get('MULTIPART_MAX_PARTS', 32))
+MULTIPART_CHUNK_SIZE = 64 * 1024
+
+_MAX_HEADER_SIZE = 16 * 1024
+
+class MultipartError(ValueError):
+    """Malformed or unacceptable multipart body; `status` is the HTTP status to answer with"""
+    status = 400
+
+class PayloadTooLarge(MultipartError):
+    status = 413
+
+def parse_header_options(value):
+    """Split 'type; key="value"; ...' into ('type', {key: value})"""
+    parts = value.split(';')
+    options = {}
+    for part in parts[1:]:
+        key, sep, option = part.strip().partition('=')
+        if not sep:
+            continue
+        option = option.strip()
+        if len(option) >= 2 and option[0] == option[-1] == '"':
+            option = option[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+        options[key.strip().lower()] = option
+    return parts[0].strip().lower(), options
+
+def get_boundary(content_type):
+    media_type, options = parse_header_options(content_type)
+    boundary = options.get('boundary', '')
+    if media_type != 'multipart/form-data' or not 1 <= len(boundary) <= 70:
+        raise MultipartError("Missing or invalid multipart boundary")
+    return boundary.encode('latin-1')
+
+class _Reader:
+    """Buffered reader over exactly `length` bytes of a stream"""
+
+    def __init__(self, stream, length, chunk_size):
+        self.stream = stream
+        self.remaining = length
+        self.chunk_size = chunk_size
+        # A virtual CRLF in front lets the first boundary match like the others
+        self.buffer = b'\r\n'
+
+    def fill(self):
+        """Read one more chunk into the buffer; False at the end of the body"""
+        if self.remaining <= 0:
+            return False
+        data = self.stream.read(min(self.chunk_size, self.remaining))
+        if not data:
+            raise MultipartError("Request body ended early")
+        self.remaining -= len(data)
+        self.buffer += data
+        return True
+
+    def read_until(self, marker, limit):
+        """Consume and return the bytes before `marker` (which is consumed too)"""
+        while True:
+            index = self.buffer.find(marker)
+            if index >= 0:
+                data = self.buffer[:index]
+                self.buffer = self.buffer[index + len(marker):]
+                return data
+            if len(self.buffer) > limit:
+                raise MultipartError("Multipart headers too large")
+            if not self.fill():
+                raise MultipartError("Malformed multipart body")
+
+    def stream_until(self, marker):
+        """Yield the bytes before `marker` in chunks, consuming the marker"""
+        keep = len(marker) - 1
+        while True:
+            index = self.buffer.find(marker)
+            if index >= 0:
+                if index:
+                    yield self.buffer[:index]
+                self.buffer = self.buffer[index + len(marker):]
+                return
+            # The tail could be the start of a marker split across reads
+            if len(self.buffer) > keep:
+                yield self.buffer[:-keep]
+                self.buffer = self.buffer[-keep:]
+            if not self.fill():
+                raise MultipartError("Malformed multipart body")
+
+    def read_exact(self, size):
+        while len(self.buffer) < size:
+            if not self.fill():
+                raise MultipartError("Malformed multipart body")
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def drain(self):
+        """Discard the epilogue after the closing boundary"""
+        self.buffer = b''
+        while self.remaining > 0:
+            skipped = self.stream.read(min(self.chunk_size, self.remaining))
+            if not skipped:
+                break
+            self.remaining -= len(skipped)
+
+def _parse_part_headers(raw):
+    headers = {}
+    for line in raw.decode('utf-8', 'replace').split('\r\n'):
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+def parse_multipart(stream, content_length, content_type, open_file=None,
+                    max_body=None, max_file_size=None, max_field_size=None, max_parts=None):
+    """Parse a multipart/form-data body from `stream`
+
+    open_file(field_name, filename, content_type) must return a writer with
+    write(chunk), commit() -> value and abort(); file parts are streamed into
+    it and the committed value is returned in place of the file. Without
+    open_file, file parts are rejected.
+
+    Returns ({field name: text}, {field name: committed value}). Raises
+    MultipartError (or PayloadTooLarge) and aborts every file of the body,
+    including ones already committed, so a rejected body leaves nothing behind.
+    """
+    max_body = MULTIPART_MAX_BODY if max_body is None else max_body
+    max_file_size = MULTIPART_MAX_FILE_SIZE if max_file_size is None else max_file_size
+    max_field_size = MULTIPART_MAX_FIELD_SIZE if max_field_size is None else max_field_size
+    max_parts = MULTIPART_MAX_PARTS if max_parts is None else max_parts
+
+    boundary = get_boundary(content_type)
+    if content_length > max_body:
+        raise PayloadTooLarge(f"Request body exceeds {max_body} bytes")
+
+    reader = _Reader(stream, content_length, MULTIPART_CHUNK_SIZE)
+    delimiter = b'\r\n--' + boundary
+    fields, files = {}, {}
+
+    writers = []  # every file opened so far, committed or not
+    try:
+        # Skip the preamble up to the first boundary
+        for _ in reader.stream_until(delimiter):
+            pass
+
+        parts = 0
+        while True:
+            ending = reader.read_exact(2)
+            if ending == b'--':
+                reader.drain()
+                return fields, files
+            if ending != b'\r\n':
+                raise MultipartError("Malformed multipart boundary")
+
+            parts += 1
+            if parts > max_parts:
+                raise PayloadTooLarge(f"More than {max_parts} multipart parts")
+
+            headers = _parse_part_headers(reader.read_until(b'\r\n\r\n', _MAX_HEADER_SIZE))
+            disposition, options = parse_header_options(headers.get('content-disposition', ''))
+            name = options.get('name')
+            if disposition != 'form-data' or name is None:
+                raise MultipartError("Multipart part without a form-data name")
+
+            if 'filename' not in options:
+                value, size = [], 0
+                for chunk in reader.stream_until(delimiter):
+                    size += len(chunk)
+                    if size > max_field_size:
+                        raise PayloadTooLarge(f"Field '{name}' exceeds {max_field_size} bytes")
+                    value.append(chunk)
+                fields[name] = b''.join(value).decode('utf-8', 'replace')
+                continue
+
+            if open_file is None:
+                raise MultipartError("File uploads are not accepted here")
+            writer = open_file(name, options['filename'], headers.get('content-type'))
+            writers.append(writer)
+            size = 0
+            for chunk in reader.stream_until(delimiter):
+                size += len(chunk)
+                if size > max_file_size:
+                    raise PayloadTooLarge(f"File '{options['filename']}' exceeds {max_file_size} bytes")
+                writer.write(chunk)
+            if size == 0:
+                raise MultipartError(f"File '{options['filename']}' is empty")
+            files[name] = writer.commit()
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
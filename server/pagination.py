@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import date, datetime
+
+# Keyset (cursor) pagination helpers for the list endpoints
+#
+# Pages are ordered by (sort column, id). The cursor is an opaque token that
+# holds the sort value and id of the last row on the previous page, so the
+# next page is a range scan from that point instead of an OFFSET.
+#
+# Sort columns such as created_at may be NULL. MySQL (and SQLite) order NULL
+# before every value, so NULL rows come last in a descending page and first in
+# an ascending one; a cursor taken on a NULL row holds null as its sort value.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(sort_value, row_id):
+    """Build an opaque cursor from the last row of a page"""
+    if isinstance(sort_value, (datetime, date)):
+        sort_value = sort_value.isoformat(sep=' ') if isinstance(sort_value, datetime) else sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor into (sort_value, id); raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(row_id, int) or not (sort_value is None or isinstance(sort_value, (str, int, float))):
+        raise ValueError("Invalid cursor")
+    return sort_value, row_id
+
+def parse_page_params(query):
+    """Read limit/cursor from query params
+
+    Returns (limit, after) where after is the decoded cursor. Both are None
+    when the client asked for neither, which keeps the unpaginated response.
+    Raises ValueError for bad values.
+    """
+    limit = query.get('limit')
+    cursor = query.get('cursor')
+    if limit is None and cursor is None:
+        return None, None
+
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        limit = min(limit, MAX_PAGE_SIZE)
+
+    after = decode_cursor(cursor) if cursor else None
+    return limit, after
+
+def keyset_clause(sort_column, id_column, after, descending=True, nullable=True):
+    """Return (sql, params) selecting rows that come after the cursor
+
+    Pass nullable=False for NOT NULL sort columns to keep the clause a plain
+    range over the (sort column, id) index.
+    """
+    if after is None:
+        return "", ()
+    sort_value, row_id = after
+    op = "<" if descending else ">"
+    if sort_value is None:
+        # Among the NULL rows; ascending pages continue into the non-NULL ones
+        sql = f"({sort_column} IS NULL AND {id_column} {op} %s)"
+        if not descending:
+            sql = f"({sql} OR {sort_column} IS NOT NULL)"
+        return sql, (row_id,)
+    sql = f"{sort_column} {op} %s OR ({sort_column} = %s AND {id_column} {op} %s)"
+    if nullable and descending:
+        # NULL rows follow every value in a descending page
+        sql += f" OR {sort_column} IS NULL"
+    return f"({sql})", (sort_value, sort_value, row_id)
+
+def limit_clause(limit):
+    """Return (sql, params) for LIMIT, fetching one extra row to detect a next page"""
+    if limit is None:
+        return "", ()
+    return "LIMIT %s", (limit + 1,)
+
+def split_page(rows, limit, sort_index, id_index):
+    """Drop the look-ahead row and return (rows, next_cursor)"""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[sort_index], last[id_index])
@@ -0,0 +1,200 @@
+import functools
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+slow_logger = get_logger('slow_query')
+
+# Per-statement timing for everything executed through get_db_connection()
+#
+# SQL text is normalized into a fingerprint (literals and placeholders become
+# ?, whitespace is collapsed) so the same query with different arguments is
+# tracked as one entry. Each entry keeps call/error counts, cumulative and max
+# execute time and a window of recent timings for percentiles. Statements over
+# SLOW_QUERY_MS are written to the slow_query logger; with SLOW_QUERY_EXPLAIN
+# on, a background thread also logs the EXPLAIN plan for slow SELECTs.
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 250))
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', '0') == '1'
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', 600))  # seconds per fingerprint
+QUERY_STATS_MAX_FINGERPRINTS = int(os.environ.get('QUERY_STATS_MAX_FINGERPRINTS', 500))
+QUERY_STATS_SAMPLES = int(os.environ.get('QUERY_STATS_SAMPLES', 256))  # recent timings kept per fingerprint
+
+# Fingerprints beyond QUERY_STATS_MAX_FINGERPRINTS are counted here
+OVERFLOW_FINGERPRINT = '(other)'
+
+_COMMENT_RE = re.compile(r'/\*.*?\*/|--[^\n]*', re.S)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|%\(\w+\)s')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Normalize SQL so statements that differ only in values compare equal"""
+    text = _COMMENT_RE.sub(' ', sql)
+    text = _STRING_RE.sub('?', text)
+    text = _PLACEHOLDER_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text)
+    text = _IN_LIST_RE.sub('(?+)', text)
+    return _SPACE_RE.sub(' ', text).strip().lower()
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class _Entry:
+    __slots__ = ('calls', 'errors', 'slow', 'total', 'max', 'samples')
+
+    def __init__(self, sample_size):
+        self.calls = 0
+        self.errors = 0
+        self.slow = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=sample_size)
+
+class QueryStats:
+    """Thread-safe per-fingerprint execute statistics"""
+
+    def __init__(self, max_fingerprints=500, sample_size=256):
+        self.max_fingerprints = max_fingerprints
+        self.sample_size = sample_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds, failed, slow):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    key = OVERFLOW_FINGERPRINT
+                    entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = _Entry(self.sample_size)
+            entry.calls += 1
+            entry.total += seconds
+            entry.samples.append(seconds)
+            if seconds > entry.max:
+                entry.max = seconds
+            if failed:
+                entry.errors += 1
+            if slow:
+                entry.slow += 1
+
+    def snapshot(self, limit=None, order_by='total_ms'):
+        """Return per-fingerprint stats (times in ms), heaviest first"""
+        with self._lock:
+            items = [(key, entry.calls, entry.errors, entry.slow, entry.total, entry.max, sorted(entry.samples))
+                     for key, entry in self._entries.items()]
+        rows = []
+        for key, calls, errors, slow, total, max_time, samples in items:
+            rows.append({
+                "fingerprint": key,
+                "calls": calls,
+                "errors": errors,
+                "slow": slow,
+                "total_ms": round(total * 1000, 3),
+                "avg_ms": round(total * 1000 / calls, 3) if calls else 0.0,
+                "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+                "p95_ms": round(_percentile(samples, 0.95) * 1000, 3),
+                "p99_ms": round(_percentile(samples, 0.99) * 1000, 3),
+                "max_ms": round(max_time * 1000, 3),
+            })
+        rows.sort(key=lambda row: row.get(order_by, 0), reverse=True)
+        return rows[:limit] if limit else rows
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+class _Explainer:
+    """Background thread that logs EXPLAIN plans for slow SELECTs
+
+    Runs on its own pooled connection so the request that ran the slow query
+    is never delayed, and explains each fingerprint at most once per
+    SLOW_QUERY_EXPLAIN_INTERVAL.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.connection_factory = None
+        self._queue = None
+        self._thread = None
+        self._explained_at = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, sql, params):
+        if self.connection_factory is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained_at.get(key)
+            if last is not None and now - last < self.interval:
+                return
+            self._explained_at[key] = now
+            # Threads do not survive fork, so (re)start lazily in each process
+            if self._thread is None or not self._thread.is_alive():
+                self._queue = queue.Queue(maxsize=100)
+                self._thread = threading.Thread(target=self._run, name='slow-query-explain', daemon=True)
+                self._thread.start()
+            try:
+                self._queue.put_nowait((key, sql, params))
+            except queue.Full:
+                pass
+
+    def _run(self):
+        # Keep the EXPLAIN statements themselves out of the stats
+        _local.explaining = True
+        while True:
+            key, sql, params = self._queue.get()
+            connection = self.connection_factory()
+            if connection is None:
+                continue
+            cursor = connection.cursor(buffered=True)
+            try:
+                cursor.execute("EXPLAIN " + sql, params)
+                columns = [col[0] for col in cursor.description]
+                plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                slow_logger.warning("EXPLAIN %s: %s", key, plan)
+            except Exception as e:
+                logger.warning("EXPLAIN failed for %s: %s", key, e)
+            finally:
+                cursor.close()
+                connection.close()
+
+_local = threading.local()
+_stats = QueryStats(QUERY_STATS_MAX_FINGERPRINTS, QUERY_STATS_SAMPLES)
+_explainer = _Explainer(SLOW_QUERY_EXPLAIN_INTERVAL)
+
+def enable_explain(connection_factory):
+    """Let the slow log borrow connections for EXPLAIN (if SLOW_QUERY_EXPLAIN is on)"""
+    if SLOW_QUERY_EXPLAIN:
+        _explainer.connection_factory = connection_factory
+
+def record_query(sql, params, seconds, failed):
+    """Record one execute call; fetches (sql None) are not tracked here"""
+    if not isinstance(sql, str) or getattr(_local, 'explaining', False):
+        return
+    key = fingerprint(sql)
+    slow = seconds * 1000 >= SLOW_QUERY_MS
+    _stats.record(key, seconds, failed, slow)
+    if slow:
+        slow_logger.warning("%.1f ms%s: %s", seconds * 1000, " (failed)" if failed else "", key)
+        if not failed and key.startswith('select'):
+            _explainer.submit(key, sql, params)
+
+def query_stats(limit=None, order_by='total_ms'):
+    return _stats.snapshot(limit, order_by)
+
+def reset_query_stats():
+    _stats.reset()
@@ -0,0 +1,108 @@
+import re
+
+# Table-driven request routing for RequestHandler
+#
+# Routes are compiled once when they are added. Static paths are looked up in
+# a dict; parameterised paths are bucketed by method, segment count and first
+# literal segment, so matching a request only ever tries a handful of routes
+# no matter how many endpoints are registered.
+
+# Role requirements a route can declare
+PUBLIC = "public"    # no token needed
+USER = "user"        # any valid token
+ARTIST = "artist"    # token with is_artist
+ADMIN = "admin"      # token with is_admin
+
+# Converters for typed path parameters, e.g. /artworks/{artwork_id:int}
+CONVERTERS = {
+    "str": (r"[^/]+", str),
+    "int": (r"\d+", int),
+}
+
+_PARAM_RE = re.compile(r"^\{(\w+)(?::(\w+))?\}$")
+
+class Route:
+    """A single compiled route"""
+
+    def __init__(self, method, pattern, handler, roles):
+        self.method = method
+        self.pattern = pattern
+        self.handler = handler
+        # A route may accept several roles, e.g. (ADMIN, ARTIST)
+        self.roles = (roles,) if isinstance(roles, str) else tuple(roles)
+        self.segments = pattern.strip("/").split("/")
+        self.params = []  # (index, name, converter)
+        regex_parts = []
+
+        for index, segment in enumerate(self.segments):
+            match = _PARAM_RE.match(segment)
+            if match:
+                name, type_name = match.group(1), match.group(2) or "str"
+                if type_name not in CONVERTERS:
+                    raise ValueError(f"Unknown path parameter type '{type_name}' in {pattern}")
+                regex, converter = CONVERTERS[type_name]
+                self.params.append((index, name, converter))
+                regex_parts.append(regex)
+            else:
+                regex_parts.append(re.escape(segment))
+
+        self.is_static = not self.params
+        self.regex = re.compile("^/" + "/".join(regex_parts) + "$")
+
+    @property
+    def is_public(self):
+        return PUBLIC in self.roles
+
+    def bucket_key(self):
+        first = self.segments[0]
+        first = None if _PARAM_RE.match(first) else first
+        return (self.method, len(self.segments), first)
+
+    def match(self, path):
+        """Return the converted path params, or None if the path doesn't match"""
+        if not self.regex.match(path):
+            return None
+        parts = path.strip("/").split("/")
+        return {name: converter(parts[index]) for index, name, converter in self.params}
+
+class Router:
+    """Registry of routes keyed for constant-time lookup"""
+
+    def __init__(self):
+        self._static = {}
+        self._dynamic = {}
+
+    def add(self, method, pattern, handler, roles=PUBLIC):
+        """Register `handler` for `method` requests to `pattern`"""
+        route = Route(method.upper(), pattern, handler, roles)
+        if route.is_static:
+            self._static[(route.method, pattern)] = route
+        else:
+            self._dynamic.setdefault(route.bucket_key(), []).append(route)
+        return route
+
+    def match(self, method, path):
+        """Find the route for a request; returns (route, params) or (None, None)"""
+        route = self._static.get((method, path))
+        if route is not None:
+            return route, {}
+
+        segments = path.strip("/").split("/")
+        count = len(segments)
+        for key in ((method, count, segments[0]), (method, count, None)):
+            for route in self._dynamic.get(key, ()):
+                params = route.match(path)
+                if params is not None:
+                    return route, params
+        return None, None
+
+def check_roles(roles, claims):
+    """Return an (status_code, error) tuple if the claims don't satisfy roles"""
+    if PUBLIC in roles or USER in roles:
+        return None
+    if ADMIN in roles and claims.get("is_admin", False):
+        return None
+    if ARTIST in roles and claims.get("is_artist", False):
+        return None
+    names = " or ".join(role.capitalize() for role in roles)
+    return 403, f"Unauthorized access: {names} privileges required"
@@ -114,6 +114,8 @@ CREATE TABLE IF NOT EXISTS exhibition_bookings (
     payment_status VARCHAR(20) DEFAULT 'pending',
     booking_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     total_amount DECIMAL(10, 2) NOT NULL,
+    ticket_code VARCHAR(20),
+    status VARCHAR(20) DEFAULT 'active',
     checkout_request_id VARCHAR(50),
     mpesa_receipt_number VARCHAR(20)
 );
@@ -139,6 +141,22 @@ CREATE TABLE IF NOT EXISTS contact_messages (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE IF NOT EXISTS mpesa_transactions (
+    id SERIAL PRIMARY KEY,
+    checkout_request_id VARCHAR(50) UNIQUE NOT NULL,
+    merchant_request_id VARCHAR(50),
+    order_type VARCHAR(20) NOT NULL,
+    order_id INTEGER NOT NULL,
+    user_id INTEGER,
+    amount DECIMAL(10, 2) NOT NULL,
+    phone_number VARCHAR(20),
+    status VARCHAR(20) DEFAULT 'pending',
+    result_code VARCHAR(10),
+    result_desc TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_artworks_artist_id ON artworks(artist_id);
 CREATE INDEX IF NOT EXISTS idx_artwork_orders_artwork_id ON artwork_orders(artwork_id);
@@ -148,3 +166,11 @@ CREATE INDEX IF NOT EXISTS idx_exhibition_bookings_exhibition_id ON exhibition_b
 CREATE INDEX IF NOT EXISTS idx_exhibition_bookings_user_id ON exhibition_bookings(user_id);
 CREATE INDEX IF NOT EXISTS idx_exhibition_bookings_corporate_user_id ON exhibition_bookings(corporate_user_id);
 CREATE INDEX IF NOT EXISTS idx_exhibition_tickets_booking_id ON exhibition_tickets(booking_id);
+CREATE INDEX IF NOT EXISTS idx_mpesa_transactions_status_created_at ON mpesa_transactions(status, created_at);
+
+-- Composite indexes backing keyset pagination on the list endpoints
+CREATE INDEX IF NOT EXISTS idx_artworks_created_at_id ON artworks(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_exhibitions_start_date_id ON exhibitions(start_date, id);
+CREATE INDEX IF NOT EXISTS idx_artwork_orders_order_date_id ON artwork_orders(order_date, id);
+CREATE INDEX IF NOT EXISTS idx_exhibition_bookings_booking_date_id ON exhibition_bookings(booking_date, id);
+CREATE INDEX IF NOT EXISTS idx_artists_created_at_id ON artists(created_at, id);
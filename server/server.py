@@ -1,9 +1,8 @@
 import os
 import json
-import http.server
-import socketserver
 import urllib.parse
 import mimetypes
+import time
 from http import HTTPStatus
 from datetime import datetime
 from urllib.parse import parse_qs, urlparse
@@ -15,20 +14,50 @@ from artwork import get_all_artworks, get_artwork, create_artwork, update_artwor
 from exhibition import get_all_exhibitions, get_exhibition, create_exhibition, update_exhibition, delete_exhibition
 from contact import create_contact_message, get_messages, update_message, json_dumps
 from db_setup import initialize_database
-from middleware import auth_required, admin_required, extract_auth_token, verify_token
-from mpesa import handle_stk_push_request, check_transaction_status, handle_mpesa_callback
+from middleware import auth_required, admin_required, extract_auth_token, verify_token, token_cache_stats
+from mpesa import handle_stk_push_request, check_transaction_status, handle_mpesa_callback, mpesa_stats
 from db_operations import get_all_tickets, get_all_orders, get_artist_artworks, get_artist_orders, get_all_artists
-from database import get_db_connection  # Add this import
+from database import get_db_connection, get_pool_stats  # Add this import
+from worker_server import PooledRequestHandler, ThreadPoolServer, serve_prefork
+from router import Router, check_roles, PUBLIC, USER, ARTIST, ADMIN
+from compression import compress_body, find_sidecar, is_compressible, DYNAMIC_ENCODINGS
+from catalog_version import catalog_etag
+from catalog_cache import cache_stats
+from pagination import parse_page_params
+from static_files import resolve_static_path, cache_control, http_date, not_modified_since, parse_range
+from app_logging import get_logger, logging_stats
+from query_stats import query_stats
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, observe_request, render_metrics
+from image_migration import migration_stats, start_migration_worker
+from mpesa_reconciler import reconciler_stats, start_reconciler
+from mpesa_events import open_status_stream, stream_preamble, stream_stats
+from mpesa_callback_queue import callback_queue_stats, enqueue_callback, start_callback_workers
+from image_variants import ensure_variant, schedule_variants, touch_variant, variant_stats, variant_urls
+from image_store import UPLOADS_URL, ImageWriter
+from multipart import MultipartError, parse_multipart
+
+logger = get_logger(__name__)
+access_logger = get_logger('access')
 
 # Define the port
 PORT = 8000
 
+# Server concurrency settings (override with environment variables)
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 16))  # worker threads per process
+SERVER_PROCESSES = int(os.environ.get('SERVER_PROCESSES', 1))  # >1 enables pre-fork mode
+SERVER_BACKLOG = int(os.environ.get('SERVER_BACKLOG', 128))  # listen() accept backlog
+
+# HTTP keep-alive settings
+KEEPALIVE_TIMEOUT = int(os.environ.get('KEEPALIVE_TIMEOUT', 15))  # seconds an idle connection stays open
+KEEPALIVE_MAX_REQUESTS = int(os.environ.get('KEEPALIVE_MAX_REQUESTS', 100))  # requests per connection
+KEEPALIVE_BUSY_TIMEOUT = float(os.environ.get('KEEPALIVE_BUSY_TIMEOUT', 1))  # idle seconds allowed while others wait for a worker
+
 # Ensure the static/uploads directory exists
 def ensure_uploads_directory():
     uploads_dir = os.path.join(os.path.dirname(__file__), "static", "uploads")
     if not os.path.exists(uploads_dir):
         os.makedirs(uploads_dir)
-        print(f"Created directory: {uploads_dir}")
+        logger.info("Created directory: %s", uploads_dir)
 
 # Call this function to ensure directory exists
 ensure_uploads_directory()
@@ -46,14 +75,14 @@ def create_default_exhibition_image():
             source_placeholder = os.path.join(os.path.dirname(__file__), "..", "public", "placeholder.svg")
             if os.path.exists(source_placeholder):
                 copyfile(source_placeholder, default_image_path)
-                print(f"Created default exhibition image from placeholder")
+                logger.info("Created default exhibition image from placeholder")
             else:
                 # Create an empty file as fallback
                 with open(default_image_path, "w") as f:
                     f.write("Default Exhibition Image Placeholder")
-                print(f"Created empty default exhibition image")
+                logger.info("Created empty default exhibition image")
         except Exception as e:
-            print(f"Failed to create default exhibition image: {e}")
+            logger.error("Failed to create default exhibition image: %s", e)
 
 # Call this function to ensure the default exhibition image exists
 create_default_exhibition_image()
@@ -67,80 +96,8 @@ class DecimalEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super(DecimalEncoder, self).default(obj)
 
-# Mock data for tickets (in a real app, this would come from a database)
-# We'll use this for demo purposes
-mock_tickets = [
-    {
-        "id": "ticket-001",
-        "userId": "user-123",
-        "userName": "John Doe",
-        "exhibitionId": "exhibition-1",
-        "exhibitionTitle": "Modern Art Showcase",
-        "bookingDate": "2025-04-20T14:00:00",
-        "ticketCode": "EXHB-001-123",
-        "slots": 2,
-        "status": "active"
-    },
-    {
-        "id": "ticket-002",
-        "userId": "user-456",
-        "userName": "Jane Smith",
-        "exhibitionId": "exhibition-2",
-        "exhibitionTitle": "Classical Paintings",
-        "bookingDate": "2025-04-21T10:30:00",
-        "ticketCode": "EXHB-002-456",
-        "slots": 1,
-        "status": "used"
-    },
-    {
-        "id": "ticket-003",
-        "userId": "user-789",
-        "userName": "Alex Johnson",
-        "exhibitionId": "exhibition-1",
-        "exhibitionTitle": "Modern Art Showcase",
-        "bookingDate": "2025-04-22T16:15:00",
-        "ticketCode": "EXHB-001-789",
-        "slots": 3,
-        "status": "cancelled"
-    }
-]
-
-# Function to get all tickets (mock implementation)
-def get_all_tickets(auth_header):
-    """Get all tickets (admin only)"""
-    print(f"Getting all tickets with auth header: {auth_header[:20]}... (truncated)")
-    
-    # Extract and verify token - directly use the token from auth_header
-    token = extract_auth_token(auth_header)
-    if not token:
-        print("Authentication required - no token found")
-        return {"error": "Authentication required"}
-    
-    payload = verify_token(token)
-    if isinstance(payload, dict) and "error" in payload:
-        print(f"Authentication failed: {payload['error']}")
-        return {"error": payload["error"]}
-    
-    # Check if user is admin
-    if not payload.get("is_admin", False):
-        print("Access denied - not an admin user")
-        return {"error": "Unauthorized access: Admin privileges required"}
-    
-    print(f"Admin user authenticated, returning {len(mock_tickets)} tickets")
-    # Return tickets data
-    return {"tickets": mock_tickets}
-
 # Function to generate exhibition ticket (mock implementation)
-def generate_ticket(booking_id, auth_header):
-    # Extract and verify token
-    token = extract_auth_token(auth_header)
-    if not token:
-        return {"error": "Authentication required"}
-    
-    payload = verify_token(token)
-    if isinstance(payload, dict) and "error" in payload:
-        return {"error": payload["error"]}
-    
+def generate_ticket(booking_id):
     # In a real application, we would generate a PDF here
     # For demo purposes, we'll return mock data
     return {
@@ -148,881 +105,747 @@ def generate_ticket(booking_id, auth_header):
         "success": True
     }
 
-class RequestHandler(http.server.BaseHTTPRequestHandler):
+class RequestHandler(PooledRequestHandler):
+    # Persistent connections: idle sockets are closed after `timeout` seconds,
+    # or `busy_idle_timeout` while other connections are waiting for a worker
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    busy_idle_timeout = KEEPALIVE_BUSY_TIMEOUT
+    # Headers and body go out as separate writes; with Nagle on, the body
+    # waits for the client's delayed ACK (~40 ms) on every keep-alive response
+    disable_nagle_algorithm = True
+    
+    def setup(self):
+        super().setup()
+        self.requests_served = 0
+    
+    def handle_one_request(self):
+        self.body_read = False
+        self.request_started = None
+        super().handle_one_request()
+        self.requests_served += 1
+        # Time is measured from the parsed request line, so keep-alive idle
+        # time is not counted; connections closed while idle record nothing
+        if self.request_started is not None and self.response_status is not None:
+            observe_request(self.command, self.route_label, self.response_status,
+                            time.perf_counter() - self.request_started)
     
-    def _set_response(self, status_code=200, content_type='application/json'):
+    def parse_request(self):
+        self.request_started = time.perf_counter()
+        self.response_status = None
+        self.route_label = 'unmatched'
+        return super().parse_request()
+    
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+    
+    def end_headers(self):
+        # Close the connection if this is the last request we allow on it, if
+        # the request body was never read (it would corrupt the next request),
+        # or if other connections are queued for a worker
+        if not self.close_connection:
+            headers = getattr(self, 'headers', None)
+            unread_body = bool(headers) and not self.body_read and int(headers.get('Content-Length', 0) or 0) > 0
+            if unread_body or self.requests_served + 1 >= KEEPALIVE_MAX_REQUESTS or self.server_busy():
+                self.send_header('Connection', 'close')
+            else:
+                self.send_header('Keep-Alive', f'timeout={KEEPALIVE_TIMEOUT}, max={KEEPALIVE_MAX_REQUESTS}')
+        super().end_headers()
+    
+    def log_message(self, format, *args):
+        # Access lines go through the queued logger instead of blocking on stderr
+        access_logger.info("%s " + format, self.address_string(), *args)
+    
+    def log_error(self, format, *args):
+        access_logger.warning("%s " + format, self.address_string(), *args)
+    
+    def _read_body(self):
+        """Read the full request body as bytes"""
+        content_length = int(self.headers.get('Content-Length', 0) or 0)
+        self.body_read = True
+        if content_length <= 0:
+            return b''
+        return self.rfile.read(content_length)
+    
+    def _set_response(self, status_code=200, content_type='application/json', content_length=None, headers=None):
         self.send_response(status_code)
         self.send_header('Content-type', content_type)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if content_length is not None:
+            self.send_header('Content-Length', str(content_length))
+        else:
+            # Without a length the client can only find the end of the body
+            # when we close the socket
+            self.send_header('Connection', 'close')
         self.end_headers()
     
-    def do_OPTIONS(self):
-        self._set_response()
+    def _send_json(self, data, status_code=200, etag=None):
+        """Send a JSON response with an accurate Content-Length, compressed if the client allows
+
+        When an ETag is given it is only attached to successful responses, and
+        gets the content coding appended so compressed and plain bodies differ.
+        """
+        body = json_dumps(data).encode()
+        body, encoding = compress_body(body, self.headers.get('Accept-Encoding', ''))
+        headers = {'Vary': 'Accept-Encoding'}
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        if etag and status_code == 200 and not (isinstance(data, dict) and "error" in data):
+            headers['ETag'] = etag[:-1] + f'-{encoding}"' if encoding else etag
+            headers['Cache-Control'] = 'no-cache'
+        self._set_response(status_code, content_length=len(body), headers=headers)
+        self.wfile.write(body)
     
-    def serve_static_file(self, file_path):
-        """Serve a static file based on its MIME type"""
-        try:
-            # Check if file exists
-            if not os.path.exists(file_path):
-                self.send_response(404)
+    def _not_modified(self, etag):
+        """Send 304 Not Modified if the client's If-None-Match matches etag"""
+        if_none_match = self.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        
+        # Accept the tag with or without a content-coding suffix
+        matching = {'*', etag} | {etag[:-1] + f'-{encoding}"' for encoding in DYNAMIC_ENCODINGS}
+        for candidate in if_none_match.split(','):
+            candidate = candidate.strip()
+            if candidate.startswith('W/'):
+                candidate = candidate[2:]
+            if candidate in matching:
+                self.send_response(304)
+                self.send_header('ETag', candidate)
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Vary', 'Accept-Encoding')
+                self.send_header('Access-Control-Allow-Origin', '*')
                 self.end_headers()
-                return
-                
-            # Determine the content type
-            content_type, _ = mimetypes.guess_type(file_path)
-            if not content_type:
-                content_type = 'application/octet-stream'
-                
-            # Get file size
-            file_size = os.path.getsize(file_path)
-            
-            # Set headers
-            self.send_response(200)
-            self.send_header('Content-type', content_type)
-            self.send_header('Content-Length', str(file_size))
-            self.end_headers()
-            
-            # Read and send the file
-            with open(file_path, 'rb') as f:
-                self.wfile.write(f.read())
-                
-        except Exception as e:
-            print(f"Error serving static file: {e}")
-            self.send_response(500)
-            self.end_headers()
+                return True
+        return False
     
-    def do_GET(self):
-        parsed_url = urllib.parse.urlparse(self.path)
-        path = parsed_url.path
-        
-        # Handle static files (images, CSS, JS, etc.)
-        if path.startswith('/static/'):
-            file_path = os.path.join(os.path.dirname(__file__), path[1:])
-            # Debugging info
-            print(f"Serving static file: {file_path}")
-            self.serve_static_file(file_path)
+    def do_OPTIONS(self):
+        self._set_response(content_length=0)
+    
+    def _send_empty(self, status_code, headers=None):
+        """Send a bodiless response"""
+        self.send_response(status_code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status_code != 304:
+            self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def serve_static_file(self, url_path):
+        """Serve a file under /static/, streaming it with sendfile
+
+        Supports single byte ranges, Last-Modified / If-Modified-Since and
+        long-lived caching for content-addressed upload names.
+        """
+        # Reject traversal and malformed paths before any filesystem call
+        file_path = resolve_static_path(url_path)
+        if file_path is None:
+            self._send_empty(404)
             return
         
-        # Handle API endpoints
-        # Handle GET /artworks
-        if path == '/artworks':
-            response = get_all_artworks()
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
-            return
+        # Determine the content type
+        content_type, _ = mimetypes.guess_type(file_path)
+        if not content_type:
+            content_type = 'application/octet-stream'
         
-        # Handle GET /artworks/{id}
-        elif path.startswith('/artworks/') and len(path.split('/')) == 3:
-            artwork_id = path.split('/')[2]
-            response = get_artwork(artwork_id)
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
-            return
+        # Serve a precompressed sidecar (file.br / file.gz) for text-like assets
+        content_encoding = None
+        if is_compressible(content_type):
+            sidecar_path, content_encoding = find_sidecar(file_path, self.headers.get('Accept-Encoding', ''))
+            if sidecar_path:
+                file_path = sidecar_path
         
-        # Handle GET /exhibitions
-        elif path == '/exhibitions':
-            response = get_all_exhibitions()
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
+        try:
+            try:
+                f = open(file_path, 'rb')
+            except FileNotFoundError:
+                # Resized image variants are rendered on first request
+                if not ensure_variant(file_path):
+                    raise
+                f = open(file_path, 'rb')
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            self._send_empty(404)
             return
-        
-        # Handle GET /exhibitions/{id}
-        elif path.startswith('/exhibitions/') and len(path.split('/')) == 3:
-            exhibition_id = path.split('/')[2]
-            response = get_exhibition(exhibition_id)
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
+        except OSError as e:
+            logger.error("Error serving static file: %s", e)
+            self._send_empty(500)
             return
         
-        # Handle GET /messages (admin only)
-        elif path == '/messages':
-            print("Processing GET /messages request")
-            auth_header = self.headers.get('Authorization', '')
-            print(f"Authorization header: {auth_header[:20]}... (truncated)")
-            
-            # Get messages
-            response = get_messages(auth_header)
-            print(f"Get messages response: {response}")
-            
-            if "error" in response:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": response["error"]}).encode())
-                return
-            
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
-            return
-            
-        # Handle GET /tickets (admin only)
-        elif path == '/tickets':
-            print("Processing GET /tickets request")
-            auth_header = self.headers.get('Authorization', '')
+        with f:
+            touch_variant(file_path)
+            stat = os.fstat(f.fileno())
+            file_size = stat.st_size
+            last_modified = http_date(stat.st_mtime)
+            headers = {
+                'Last-Modified': last_modified,
+                'Cache-Control': cache_control(file_path),
+                'Accept-Ranges': 'bytes',
+            }
+            if is_compressible(content_type):
+                headers['Vary'] = 'Accept-Encoding'
+            
+            if not_modified_since(self.headers.get('If-Modified-Since'), stat.st_mtime):
+                self._send_empty(304, headers)
+                return
+            
+            # Only honour Range if If-Range (when sent) still matches this file
+            byte_range = None
+            if_range = self.headers.get('If-Range')
+            if not if_range or if_range == last_modified:
+                byte_range = parse_range(self.headers.get('Range'), file_size)
+            
+            if byte_range is False:
+                headers['Content-Range'] = f'bytes */{file_size}'
+                self._send_empty(416, headers)
+                return
+            
+            if byte_range:
+                start, end = byte_range
+                status_code = 206
+                headers['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+            else:
+                start, end = 0, file_size - 1
+                status_code = 200
+            length = end - start + 1 if file_size else 0
             
-            # Verify admin access
-            token = extract_auth_token(auth_header)
-            if not token:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
-                return
+            self.send_response(status_code)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Length', str(length))
+            if content_encoding:
+                self.send_header('Content-Encoding', content_encoding)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
             
-            payload = verify_token(token)
-            if not payload.get("is_admin", False):
-                self._set_response(403)
-                self.wfile.write(json_dumps({"error": "Admin access required"}).encode())
+            if self.command == 'HEAD' or length == 0:
                 return
             
-            # Get tickets from database
-            from db_operations import get_all_tickets
-            response = get_all_tickets()
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
-            return
+            # Zero-copy transfer straight from the page cache to the socket
+            try:
+                self.connection.sendfile(f, offset=start, count=length)
+            except OSError as e:
+                logger.error("Error serving static file: %s", e)
+                # Headers are already out, so the connection can't be reused
+                self.close_connection = True
+    
+    def _dispatch(self, method):
+        """Look up the route for this request, enforce its role and call it"""
+        parsed_url = urllib.parse.urlparse(self.path)
+        path = parsed_url.path
         
-        # Handle GET /orders (admin only)
-        elif path == '/orders':
-            print("Processing GET /orders request")
-            auth_header = self.headers.get('Authorization', '')
-            
-            # Verify admin access
-            token = extract_auth_token(auth_header)
-            if not token:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
-                return
-            
-            payload = verify_token(token)
-            if not payload.get("is_admin", False):
-                self._set_response(403)
-                self.wfile.write(json_dumps({"error": "Admin access required"}).encode())
-                return
-            
-            # Get orders from database
-            from db_operations import get_all_orders
-            response = get_all_orders()
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
-            return
-
-        # Handle GET /artists (admin only)
-        elif path == '/artists':
-            print("Processing GET /artists request")
-            auth_header = self.headers.get('Authorization', '')
-            
-            # Verify admin access
-            token = extract_auth_token(auth_header)
-            if not token:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
-                return
-            
-            payload = verify_token(token)
-            if not payload.get("is_admin", False):
-                self._set_response(403)
-                self.wfile.write(json_dumps({"error": "Admin access required"}).encode())
-                return
-            
-            # Get artists from database
-            response = get_all_artists()
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
+        route, params = ROUTER.match(method, path)
+        if route is None:
+            self._send_json({"error": "Resource not found"}, 404)
             return
-            
-        # Handle GET /artist/artworks (artist only)
-        elif path == '/artist/artworks':
-            auth_header = self.headers.get('Authorization', '')
-            
-            # Verify artist access
-            token = extract_auth_token(auth_header)
-            if not token:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
-                return
-            
-            payload = verify_token(token)
-            if not payload.get("is_artist", False):
-                self._set_response(403)
-                self.wfile.write(json_dumps({"error": "Artist access required"}).encode())
-                return
-            
-            # Get artworks by artist ID
-            artist_id = payload.get("sub")
-            response = get_artist_artworks(artist_id)
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
+        
+        self.route_label = route.pattern
+        self.query = {key: values[0] for key, values in parse_qs(parsed_url.query).items()}
+        self.user_info = None
+        if not route.is_public and not self._authenticate(route.roles):
             return
-            
-        # Handle GET /artist/orders (artist only)
-        elif path == '/artist/orders':
-            auth_header = self.headers.get('Authorization', '')
-            
-            # Verify artist access
-            token = extract_auth_token(auth_header)
-            if not token:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
-                return
-            
-            payload = verify_token(token)
-            if not payload.get("is_artist", False):
-                self._set_response(403)
-                self.wfile.write(json_dumps({"error": "Artist access required"}).encode())
+        
+        self.post_data = {}
+        if method in ('POST', 'PUT'):
+            try:
+                self.post_data = self._parse_body()
+            except MultipartError as e:
+                self._send_json({"error": str(e)}, e.status)
                 return
-            
-            # Get orders for artworks by artist ID
-            artist_id = payload.get("sub")
-            response = get_artist_orders(artist_id)
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
-            return
-            
-        # Handle GET /tickets/generate/{id} (generate ticket)
-        elif path.startswith('/tickets/generate/') and len(path.split('/')) == 4:
-            booking_id = path.split('/')[3]
-            print(f"Processing generate ticket request for booking {booking_id}")
-            auth_header = self.headers.get('Authorization', '')
-            
-            # Generate ticket
-            response = generate_ticket(booking_id, auth_header)
-            
-            if "error" in response:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": response["error"]}).encode())
+            except ValueError as e:
+                self._send_json({"error": f"Invalid request body: {e}"}, 400)
                 return
-            
-            self._set_response()
-            self.wfile.write(json_dumps(response).encode())
-            return
         
-        # Default 404 response
-        self._set_response(404)
-        self.wfile.write(json_dumps({"error": "Resource not found"}).encode())
+        route.handler(self, **params)
     
-    def do_POST(self):
-        # Get content length
-        content_length = int(self.headers.get('Content-Length', 0))
-        
-        # Get content type
+    def _authenticate(self, roles):
+        """Verify the bearer token against the route's roles; sends the error response on failure"""
+        token = extract_auth_token(self)
+        if not token:
+            self._send_json({"error": "Authentication required"}, 401)
+            return False
+        
+        payload = verify_token(token)
+        if isinstance(payload, dict) and "error" in payload:
+            self._send_json({"error": payload["error"]}, 401)
+            return False
+        
+        denied = check_roles(roles, payload)
+        if denied:
+            status_code, error_message = denied
+            self._send_json({"error": error_message}, status_code)
+            return False
+        
+        # Attach user info to the handler
+        self.user_info = payload
+        return True
+    
+    def _parse_body(self):
+        """Parse the request body based on its content type"""
         content_type = self.headers.get('Content-Type', '')
+        content_length = int(self.headers.get('Content-Length', 0) or 0)
         
         # Debug information
-        print(f"POST to {self.path} with content type: {content_type}, length: {content_length}")
+        logger.debug("%s to %s with content type: %s, length: %s", self.command, self.path, content_type, content_length)
         
-        # Parse POST data based on content type
-        post_data = {}
+        if content_length <= 0:
+            return {}
         
-        if content_length > 0:
-            if "application/json" in content_type:
-                # Handle JSON data
-                post_data = json.loads(self.rfile.read(content_length).decode('utf-8'))
-                print(f"Parsed JSON data: {post_data}")
-            elif "multipart/form-data" in content_type:
-                # For multipart form data (like file uploads), will be handled in specific endpoints
-                print("Multipart form data detected, will handle in endpoint")
-            else:
-                # Handle plain form data (url-encoded)
-                form_data = self.rfile.read(content_length).decode('utf-8')
-                post_data = parse_qs(form_data)
-                for key in post_data:
-                    post_data[key] = post_data[key][0]
-                print(f"Parsed form data: {post_data}")
+        if "multipart/form-data" in content_type:
+            return self._parse_multipart(content_type, content_length)
         
-        # Process based on path
-        path = self.path
+        if "application/json" in content_type or self.command == 'PUT':
+            # Handle JSON data
+            post_data = json.loads(self._read_body().decode('utf-8'))
+            logger.debug("Parsed JSON data: %s", post_data)
+            return post_data
         
-        # Register user
-        if path == '/register':
-            if not post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Missing registration data"}).encode())
-                return
-            
-            print(f"Registration data: {post_data}")
-            
-            # Check required fields
-            required_fields = ['name', 'email', 'password']
-            missing_fields = [field for field in required_fields if field not in post_data]
-            
-            if missing_fields:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": f"Missing required fields: {', '.join(missing_fields)}"}).encode())
-                return
-            
-            # Register the user
-            response = register_user(
-                post_data['name'], 
-                post_data['email'], 
-                post_data['password'],
-                post_data.get('phone', '')  # Optional field
-            )
-            
-            if "error" in response:
-                self._set_response(400)
-            else:
-                self._set_response(201)
-            
-            self.wfile.write(json_dumps(response).encode())
+        # Handle plain form data (url-encoded)
+        form_data = self._read_body().decode('utf-8')
+        post_data = {key: values[0] for key, values in parse_qs(form_data).items()}
+        logger.debug("Parsed form data: %s", post_data)
+        return post_data
+    
+    def _parse_multipart(self, content_type, content_length):
+        """Stream a multipart body; image file parts are stored and replaced by their URL
+
+        Only authenticated requests may upload files. A file sent as `image`
+        also becomes `imageUrl`, the field create/update handlers read.
+        """
+        open_file = (lambda name, filename, part_type: ImageWriter()) if self.user_info else None
+        fields, files = parse_multipart(self.rfile, content_length, content_type, open_file)
+        self.body_read = True
+        fields.update(files)
+        if 'image' in files:
+            fields.setdefault('imageUrl', files['image'])
+        logger.debug("Parsed multipart fields: %s", fields)
+        return fields
+    
+    def _send_result(self, response, status_code=200):
+        """Send a data-module result, mapping its error message to a status code"""
+        if "error" not in response:
+            self._send_json(response, status_code)
             return
         
-        # Register artist
-        elif path == '/register-artist':
-            if not post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Missing registration data"}).encode())
-                return
-            
-            # Check required fields
-            required_fields = ['name', 'email', 'password']
-            missing_fields = [field for field in required_fields if field not in post_data]
-            
-            if missing_fields:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": f"Missing required fields: {', '.join(missing_fields)}"}).encode())
-                return
-            
-            # Register the artist
-            response = register_artist(
-                post_data['name'], 
-                post_data['email'], 
-                post_data['password'],
-                post_data.get('phone', ''),  # Optional field
-                post_data.get('bio', '')     # Optional field
-            )
-            
-            if "error" in response:
-                self._set_response(400)
-            else:
-                self._set_response(201)
-            
-            self.wfile.write(json_dumps(response).encode())
-            return
+        error_message = response["error"]
+        if "Authentication" in error_message or "authorized" in error_message:
+            error_status = 401
+        elif "Admin" in error_message:
+            error_status = 403
+        elif "not found" in error_message:
+            error_status = 404
+        else:
+            error_status = 400
+        self._send_json({"error": error_message}, error_status)
+    
+    def _page_tag(self):
+        """ETag parts identifying which page of a list was requested"""
+        if 'limit' not in self.query and 'cursor' not in self.query:
+            return ()
+        return (self.query.get('limit', ''), self.query.get('cursor', ''))
+    
+    def _page_params(self):
+        """Parse ?limit=&cursor= for list endpoints; sends a 400 and returns None if invalid"""
+        try:
+            return parse_page_params(self.query)
+        except ValueError as e:
+            self._send_json({"error": str(e)}, 400)
+            return None
+    
+    def _missing_fields(self, required_fields):
+        """Send a 400 and return True if the body lacks any required field"""
+        if not self.post_data:
+            self._send_json({"error": "Missing registration data"}, 400)
+            return True
+        
+        missing_fields = [field for field in required_fields if field not in self.post_data]
+        if missing_fields:
+            self._send_json({"error": f"Missing required fields: {', '.join(missing_fields)}"}, 400)
+            return True
+        return False
+    
+    def _artist_owns_artwork(self, artwork_id, action):
+        """For artist tokens, check ownership of an artwork; sends the error response on failure"""
+        if self.user_info.get("is_admin", False) or not self.user_info.get("is_artist", False):
+            return True
+        
+        artist_id = self.user_info.get("sub")
+        connection = get_db_connection()
+        if connection is None:
+            self._send_json({"error": "Database connection failed"}, 500)
+            return False
+        
+        cursor = connection.cursor()
+        try:
+            # Check both artist_id and artist name for ownership
+            cursor.execute("""
+                SELECT a.id FROM artworks a
+                JOIN artists art ON art.id = %s
+                WHERE a.id = %s AND (a.artist_id = %s OR a.artist = art.name)
+            """, (artist_id, artwork_id, artist_id))
+            
+            if not cursor.fetchone():
+                self._send_json({"error": f"Unauthorized: You can only {action} your own artworks"}, 403)
+                return False
+            return True
+        finally:
+            cursor.close()
+            connection.close()
+    
+    def do_GET(self):
+        parsed_url = urllib.parse.urlparse(self.path)
+        path = parsed_url.path
         
-        # Register corporate user
-        elif path == '/register-corporate':
-            if not post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Missing registration data"}).encode())
-                return
-            
-            print(f"Corporate registration data: {post_data}")
-            
-            # Check required fields
-            required_fields = ['name', 'email', 'password', 'company_name', 'billing_address', 'contact_person']
-            missing_fields = [field for field in required_fields if field not in post_data]
-            
-            if missing_fields:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": f"Missing required fields: {', '.join(missing_fields)}"}).encode())
-                return
-            
-            # Register the corporate user
-            response = register_corporate_user(
-                post_data['name'], 
-                post_data['email'], 
-                post_data['password'],
-                post_data.get('phone', ''),
-                post_data.get('company_name', ''),
-                post_data.get('registration_number', ''),
-                post_data.get('tax_id', ''),
-                post_data.get('billing_address', ''),
-                post_data.get('contact_person', ''),
-                post_data.get('contact_position', '')
-            )
-            
-            if "error" in response:
-                self._set_response(400)
-            else:
-                self._set_response(201)
-            
-            self.wfile.write(json_dumps(response).encode())
+        # Handle static files (images, CSS, JS, etc.)
+        if path.startswith('/static/'):
+            self.route_label = '/static/*'
+            self.serve_static_file(path)
             return
         
-        # User login
-        elif path == '/login':
-            if not post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Missing login data"}).encode())
-                return
-            
-            # Check required fields
-            if 'email' not in post_data or 'password' not in post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Email and password required"}).encode())
-                return
-            
-            # Login the user
-            response = login_user(post_data['email'], post_data['password'])
-            
-            if "error" in response:
-                self._set_response(401)
-                self.wfile.write(json_dumps(response).encode())
-                return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+        self._dispatch('GET')
+    
+    def do_HEAD(self):
+        path = urllib.parse.urlparse(self.path).path
+        if path.startswith('/static/'):
+            self.route_label = '/static/*'
+            self.serve_static_file(path)
             return
-        
-        # Artist login
-        elif path == '/artist-login':
-            if not post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Missing login data"}).encode())
-                return
-            
-            # Check required fields
-            if 'email' not in post_data or 'password' not in post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Email and password required"}).encode())
-                return
-            
-            # Login the artist
-            response = login_artist(post_data['email'], post_data['password'])
-            
-            if "error" in response:
-                self._set_response(401)
-                self.wfile.write(json_dumps(response).encode())
-                return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+        self._send_empty(404)
+    
+    def do_POST(self):
+        self._dispatch('POST')
+    
+    def do_PUT(self):
+        self._dispatch('PUT')
+    
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+    
+    # ---- Catalog ----
+    
+    def list_artworks(self):
+        page = self._page_params()
+        if page is None:
             return
-        
-        # Corporate login
-        elif path == '/corporate-login':
-            if not post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Missing login data"}).encode())
-                return
-            
-            # Check required fields
-            if 'email' not in post_data or 'password' not in post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Email and password required"}).encode())
-                return
-            
-            # Login the corporate user
-            response = login_corporate_user(post_data['email'], post_data['password'])
-            
-            if "error" in response:
-                self._set_response(401)
-                self.wfile.write(json_dumps(response).encode())
-                return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+        # Take the version before querying so a concurrent write can't be
+        # tagged with the old data
+        etag = catalog_etag('artworks', *self._page_tag())
+        if self._not_modified(etag):
             return
-        
-        # Admin login
-        elif path == '/admin-login':
-            if not post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Missing login data"}).encode())
-                return
-            
-            # Check required fields
-            if 'email' not in post_data or 'password' not in post_data:
-                self._set_response(400)
-                self.wfile.write(json_dumps({"error": "Email and password required"}).encode())
-                return
-            
-            # Login as admin
-            response = login_admin(post_data['email'], post_data['password'])
-            
-            if "error" in response:
-                self._set_response(401)
-                self.wfile.write(json_dumps(response).encode())
-                return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+        self._send_json(get_all_artworks(*page), etag=etag)
+    
+    def show_artwork(self, artwork_id):
+        etag = catalog_etag('artworks', artwork_id)
+        if self._not_modified(etag):
             return
-        
-        # Create artwork (admin or artist)
-        elif path == '/artworks':
-            auth_header = self.headers.get('Authorization', '')
-            token = extract_auth_token(auth_header)
-            
-            if not token:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
-                return
-            
-            payload = verify_token(token)
-            if isinstance(payload, dict) and "error" in payload:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": payload["error"]}).encode())
-                return
-            
-            # Check if user is admin or artist
-            if not (payload.get("is_admin", False) or payload.get("is_artist", False)):
-                self._set_response(403)
-                self.wfile.write(json_dumps({"error": "Unauthorized: Admin or artist privileges required"}).encode())
-                return
-            
-            # Add artist_id to the post_data if the request is from an artist
-            if payload.get("is_artist", False):
-                post_data["artist_id"] = payload.get("sub")
-            
-            # Create artwork
-            response = create_artwork(auth_header, post_data)
-            
-            if "error" in response:
-                error_message = response["error"]
-                
-                if "Authentication" in error_message or "authorized" in error_message:
-                    self._set_response(401)
-                elif "Admin" in error_message:
-                    self._set_response(403)
-                else:
-                    self._set_response(400)
-                    
-                self.wfile.write(json_dumps({"error": error_message}).encode())
-                return
-            
-            self._set_response(201)
-            self.wfile.write(json_dumps(response).encode())
+        self._send_json(get_artwork(artwork_id), etag=etag)
+    
+    def upload_image(self):
+        """Store a multipart `image` upload ahead of creating/updating a record"""
+        image_url = self.post_data.get('image')
+        if not isinstance(image_url, str) or not image_url.startswith(UPLOADS_URL):
+            self._send_json({"error": "Send the image as a multipart/form-data 'image' file"}, 400)
             return
+        schedule_variants(image_url)
+        self._send_json({"imageUrl": image_url, "imageVariants": variant_urls(image_url)}, 201)
+    
+    def add_artwork(self):
+        # Add artist_id to the post_data if the request is from an artist
+        if self.user_info.get("is_artist", False):
+            self.post_data["artist_id"] = self.user_info.get("sub")
         
-        # Create exhibition (admin only)
-        elif path == '/exhibitions':
-            auth_header = self.headers.get('Authorization', '')
-            response = create_exhibition(auth_header, post_data)
-            
-            if "error" in response:
-                error_message = response["error"]
-                
-                if "Authentication" in error_message or "authorized" in error_message:
-                    self._set_response(401)
-                elif "Admin" in error_message:
-                    self._set_response(403)
-                else:
-                    self._set_response(400)
-                    
-                self.wfile.write(json_dumps({"error": error_message}).encode())
-                return
-            
-            self._set_response(201)
-            self.wfile.write(json_dumps(response).encode())
+        response = create_artwork(self.user_info, self.post_data)
+        self._send_result(response, 201)
+    
+    def edit_artwork(self, artwork_id):
+        if not self._artist_owns_artwork(artwork_id, "update"):
             return
-        
-        # Create contact message
-        elif path == '/contact':
-            response = create_contact_message(post_data)
-            
-            if "error" in response:
-                self._set_response(400)
-            else:
-                self._set_response(201)
-            
-            self.wfile.write(json_dumps(response).encode())
+        response = update_artwork(self.user_info, artwork_id, self.post_data)
+        self._send_result(response)
+    
+    def remove_artwork(self, artwork_id):
+        if not self._artist_owns_artwork(artwork_id, "delete"):
             return
-        
-        # Update message status (admin only)
-        elif path.startswith('/messages/'):
-            message_id = path.split('/')[2]
-            token = extract_auth_token(self)
-            if not token:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
-                return
-            
-            payload = verify_token(token)
-            if isinstance(payload, dict) and "error" in payload:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": payload["error"]}).encode())
-                return
-            
-            # Check if user is admin
-            if not payload.get("is_admin", False):
-                self._set_response(403)
-                self.wfile.write(json_dumps({"error": "Unauthorized access: Admin privileges required"}).encode())
-                return
-            
-            response = update_message(self.headers.get('Authorization', ''), message_id, post_data)
-            
-            if "error" in response:
-                self._set_response(400)
-            else:
-                self._set_response(200)
-            
-            self.wfile.write(json_dumps(response).encode())
+        response = delete_artwork(self.user_info, artwork_id)
+        self._send_result(response)
+    
+    def list_exhibitions(self):
+        page = self._page_params()
+        if page is None:
             return
-        
-        # New M-Pesa STK Push endpoint
-        elif path == '/mpesa/stk-push':
-            print("Processing M-Pesa STK Push request")
-            response = handle_stk_push_request(post_data)
-            
-            if "error" in response:
-                self._set_response(400)
-                self.wfile.write(json_dumps(response).encode())
-                return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+        etag = catalog_etag('exhibitions', *self._page_tag())
+        if self._not_modified(etag):
             return
-            
-        # M-Pesa callback endpoint
-        elif path == '/mpesa/callback':
-            print("Processing M-Pesa callback")
-            response = handle_mpesa_callback(post_data)
-            
-            if "error" in response:
-                self._set_response(400)
-                self.wfile.write(json_dumps(response).encode())
-                return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+        self._send_json(get_all_exhibitions(*page), etag=etag)
+    
+    def show_exhibition(self, exhibition_id):
+        etag = catalog_etag('exhibitions', exhibition_id)
+        if self._not_modified(etag):
             return
-            
-        # M-Pesa transaction status check endpoint
-        elif path.startswith('/mpesa/status/'):
-            checkout_request_id = path.split('/')[3]
-            print(f"Checking M-Pesa transaction status for: {checkout_request_id}")
-            
-            response = check_transaction_status(checkout_request_id)
-            
-            if "error" in response:
-                self._set_response(400)
-                self.wfile.write(json_dumps(response).encode())
-                return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+        self._send_json(get_exhibition(exhibition_id), etag=etag)
+    
+    def add_exhibition(self):
+        response = create_exhibition(self.user_info, self.post_data)
+        self._send_result(response, 201)
+    
+    def edit_exhibition(self, exhibition_id):
+        response = update_exhibition(self.user_info, exhibition_id, self.post_data)
+        self._send_result(response)
+    
+    def remove_exhibition(self, exhibition_id):
+        response = delete_exhibition(self.user_info, exhibition_id)
+        self._send_result(response)
+    
+    # ---- Accounts ----
+    
+    def signup_user(self):
+        if self._missing_fields(['name', 'email', 'password']):
             return
-        
-        # Default 404 response
-        self._set_response(404)
-        self.wfile.write(json_dumps({"error": "Resource not found"}).encode())
+        response = register_user(
+            self.post_data['name'],
+            self.post_data['email'],
+            self.post_data['password'],
+            self.post_data.get('phone', '')  # Optional field
+        )
+        self._send_json(response, 400 if "error" in response else 201)
     
-    def do_PUT(self):
-        # Get content length
-        content_length = int(self.headers.get('Content-Length', 0))
-        
-        # Parse JSON data
-        post_data = {}
-        if content_length > 0:
-            post_data = json.loads(self.rfile.read(content_length).decode('utf-8'))
-        
-        # Process based on path
-        path = self.path
-        
-        # Update artwork (admin or artist)
-        if path.startswith('/artworks/') and len(path.split('/')) == 3:
-            artwork_id = path.split('/')[2]
-            auth_header = self.headers.get('Authorization', '')
-            
-            # Extract token and verify
-            token = extract_auth_token(auth_header)
-            
-            if not token:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
-                return
-            
-            payload = verify_token(token)
-            if isinstance(payload, dict) and "error" in payload:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": payload["error"]}).encode())
-                return
-            
-            # Check if user is admin or the artist who created the artwork
-            is_admin = payload.get("is_admin", False)
-            is_artist = payload.get("is_artist", False)
-            artist_id = payload.get("sub")
-            
-            if not is_admin and is_artist:
-                # Verify if the artist owns this artwork
-                connection = get_db_connection()
-                if connection is None:
-                    self._set_response(500)
-                    self.wfile.write(json_dumps({"error": "Database connection failed"}).encode())
-                    return
-                
-                cursor = connection.cursor()
-                try:
-                    # Check both artist_id and artist name for ownership
-                    cursor.execute("""
-                        SELECT a.id FROM artworks a
-                        JOIN artists art ON art.id = %s
-                        WHERE a.id = %s AND (a.artist_id = %s OR a.artist = art.name)
-                    """, (artist_id, artwork_id, artist_id))
-                    
-                    result = cursor.fetchone()
-                    
-                    if not result:
-                        self._set_response(403)
-                        self.wfile.write(json_dumps({"error": "Unauthorized: You can only update your own artworks"}).encode())
-                        return
-                finally:
-                    cursor.close()
-                    connection.close()
-            
-            # If admin or verified artist, update artwork
-            response = update_artwork(auth_header, artwork_id, post_data)
-            
-            if "error" in response:
-                error_message = response["error"]
-                
-                if "Authentication" in error_message or "authorized" in error_message:
-                    self._set_response(401)
-                elif "Admin" in error_message:
-                    self._set_response(403)
-                elif "not found" in error_message:
-                    self._set_response(404)
-                else:
-                    self._set_response(400)
-                    
-                self.wfile.write(json_dumps({"error": error_message}).encode())
-                return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+    def signup_artist(self):
+        if self._missing_fields(['name', 'email', 'password']):
             return
-        
-        # Update exhibition (admin only)
-        elif path.startswith('/exhibitions/') and len(path.split('/')) == 3:
-            exhibition_id = path.split('/')[2]
-            auth_header = self.headers.get('Authorization', '')
-            
-            response = update_exhibition(auth_header, exhibition_id, post_data)
-            
-            if "error" in response:
-                error_message = response["error"]
-                
-                if "Authentication" in error_message or "authorized" in error_message:
-                    self._set_response(401)
-                elif "Admin" in error_message:
-                    self._set_response(403)
-                elif "not found" in error_message:
-                    self._set_response(404)
-                else:
-                    self._set_response(400)
-                    
-                self.wfile.write(json_dumps({"error": error_message}).encode())
-                return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+        response = register_artist(
+            self.post_data['name'],
+            self.post_data['email'],
+            self.post_data['password'],
+            self.post_data.get('phone', ''),  # Optional field
+            self.post_data.get('bio', '')     # Optional field
+        )
+        self._send_json(response, 400 if "error" in response else 201)
+    
+    def signup_corporate(self):
+        if self._missing_fields(['name', 'email', 'password', 'company_name', 'billing_address', 'contact_person']):
             return
-        
-        # Default 404 response
-        self._set_response(404)
-        self.wfile.write(json_dumps({"error": "Resource not found"}).encode())
+        response = register_corporate_user(
+            self.post_data['name'],
+            self.post_data['email'],
+            self.post_data['password'],
+            self.post_data.get('phone', ''),
+            self.post_data.get('company_name', ''),
+            self.post_data.get('registration_number', ''),
+            self.post_data.get('tax_id', ''),
+            self.post_data.get('billing_address', ''),
+            self.post_data.get('contact_person', ''),
+            self.post_data.get('contact_position', '')
+        )
+        self._send_json(response, 400 if "error" in response else 201)
     
-    def do_DELETE(self):
-        # Process based on path
-        path = self.path
+    def _login(self, login_fn):
+        if not self.post_data:
+            self._send_json({"error": "Missing login data"}, 400)
+            return
         
-        # Delete artwork (admin or artist)
-        if path.startswith('/artworks/') and len(path.split('/')) == 3:
-            artwork_id = path.split('/')[2]
-            auth_header = self.headers.get('Authorization', '')
-            
-            # Extract token and verify
-            token = extract_auth_token(auth_header)
-            
-            if not token:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
-                return
-            
-            payload = verify_token(token)
-            if isinstance(payload, dict) and "error" in payload:
-                self._set_response(401)
-                self.wfile.write(json_dumps({"error": payload["error"]}).encode())
-                return
-            
-            # Check if user is admin or the artist who created the artwork
-            is_admin = payload.get("is_admin", False)
-            is_artist = payload.get("is_artist", False)
-            artist_id = payload.get("sub")
-            
-            if not is_admin and is_artist:
-                # Verify if the artist owns this artwork
-                connection = get_db_connection()
-                if connection is None:
-                    self._set_response(500)
-                    self.wfile.write(json_dumps({"error": "Database connection failed"}).encode())
-                    return
-                
-                cursor = connection.cursor()
-                try:
-                    # Check both artist_id and artist name for ownership
-                    cursor.execute("""
-                        SELECT a.id FROM artworks a
-                        JOIN artists art ON art.id = %s
-                        WHERE a.id = %s AND (a.artist_id = %s OR a.artist = art.name)
-                    """, (artist_id, artwork_id, artist_id))
-                    
-                    result = cursor.fetchone()
-                    
-                    if not result:
-                        self._set_response(403)
-                        self.wfile.write(json_dumps({"error": "Unauthorized: You can only delete your own artworks"}).encode())
-                        return
-                finally:
-                    cursor.close()
-                    connection.close()
-            
-            # If admin or verified artist, delete artwork
-            response = delete_artwork(auth_header, artwork_id)
-            
-            if "error" in response:
-                error_message = response["error"]
-                
-                if "Authentication" in error_message or "authorized" in error_message:
-                    self._set_response(401)
-                elif "Admin" in error_message:
-                    self._set_response(403)
-                elif "not found" in error_message:
-                    self._set_response(404)
-                else:
-                    self._set_response(400)
-                    
-                self.wfile.write(json_dumps({"error": error_message}).encode())
-                return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+        # Check required fields
+        if 'email' not in self.post_data or 'password' not in self.post_data:
+            self._send_json({"error": "Email and password required"}, 400)
             return
         
-        # Delete exhibition (admin only)
-        elif path.startswith('/exhibitions/') and len(path.split('/')) == 3:
-            exhibition_id = path.split('/')[2]
-            auth_header = self.headers.get('Authorization', '')
-            
-            response = delete_exhibition(auth_header, exhibition_id)
-            
-            if "error" in response:
-                error_message = response["error"]
-                
-                if "Authentication" in error_message or "authorized" in error_message:
-                    self._set_response(401)
-                elif "Admin" in error_message:
-                    self._set_response(403)
-                elif "not found" in error_message:
-                    self._set_response(404)
-                else:
-                    self._set_response(400)
-                    
-                self.wfile.write(json_dumps({"error": error_message}).encode())
+        response = login_fn(self.post_data['email'], self.post_data['password'])
+        self._send_json(response, 401 if "error" in response else 200)
+    
+    def login(self):
+        self._login(login_user)
+    
+    def artist_login(self):
+        self._login(login_artist)
+    
+    def corporate_login(self):
+        self._login(login_corporate_user)
+    
+    def admin_login(self):
+        self._login(login_admin)
+    
+    # ---- Admin and artist dashboards ----
+    
+    def list_tickets(self):
+        page = self._page_params()
+        if page is not None:
+            self._send_json(get_all_tickets(*page))
+    
+    def list_orders(self):
+        page = self._page_params()
+        if page is not None:
+            self._send_json(get_all_orders(*page))
+    
+    def list_artists(self):
+        page = self._page_params()
+        if page is not None:
+            self._send_json(get_all_artists(*page))
+    
+    def server_stats(self):
+        self._send_json({
+            "db_pool": get_pool_stats(),
+            "catalog_cache": cache_stats(),
+            "token_cache": token_cache_stats(),
+            "logging": logging_stats(),
+            "image_migration": migration_stats(),
+            "image_variants": variant_stats(),
+            "mpesa": mpesa_stats(),
+            "mpesa_reconciler": reconciler_stats(),
+            "mpesa_events": stream_stats(),
+            "mpesa_callbacks": callback_queue_stats(),
+        })
+    
+    def list_query_stats(self):
+        order_by = self.query.get('order', 'total_ms')
+        if order_by not in ('total_ms', 'calls', 'avg_ms', 'p95_ms', 'p99_ms', 'max_ms', 'slow'):
+            self._send_json({"error": "Invalid order"}, 400)
+            return
+        try:
+            limit = int(self.query.get('limit', 50))
+        except ValueError:
+            self._send_json({"error": "limit must be an integer"}, 400)
+            return
+        self._send_json({"queries": query_stats(limit, order_by)})
+    
+    def metrics(self):
+        body = render_metrics().encode()
+        self._set_response(200, METRICS_CONTENT_TYPE, content_length=len(body))
+        self.wfile.write(body)
+    
+    def list_artist_artworks(self):
+        self._send_json(get_artist_artworks(self.user_info.get("sub")))
+    
+    def list_artist_orders(self):
+        self._send_json(get_artist_orders(self.user_info.get("sub")))
+    
+    def ticket_pdf(self, booking_id):
+        logger.debug("Processing generate ticket request for booking %s", booking_id)
+        self._send_json(generate_ticket(booking_id))
+    
+    # ---- Contact messages ----
+    
+    def add_message(self):
+        response = create_contact_message(self.post_data)
+        self._send_json(response, 400 if "error" in response else 201)
+    
+    def list_messages(self):
+        page = self._page_params()
+        if page is None:
+            return
+        response = get_messages(self.headers.get('Authorization', ''), *page)
+        if "error" in response:
+            self._send_json({"error": response["error"]}, 401)
+            return
+        self._send_json(response)
+    
+    def edit_message(self, message_id):
+        response = update_message(self.headers.get('Authorization', ''), message_id, self.post_data)
+        self._send_json(response, 400 if "error" in response else 200)
+    
+    # ---- M-Pesa ----
+    
+    def mpesa_stk_push(self):
+        logger.debug("Processing M-Pesa STK Push request")
+        response = handle_stk_push_request(self.post_data)
+        self._send_json(response, 400 if "error" in response else 200)
+    
+    def mpesa_callback(self):
+        logger.debug("Processing M-Pesa callback")
+        # Journal the callback and acknowledge right away; queue workers apply it
+        try:
+            if enqueue_callback(self.post_data):
+                self._send_json({"success": True})
                 return
-            
-            self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+        except Exception as e:
+            logger.error("Could not queue M-Pesa callback, processing it now: %s", e)
+        response = handle_mpesa_callback(self.post_data)
+        self._send_json(response, 400 if "error" in response else 200)
+    
+    def mpesa_status(self, checkout_request_id):
+        logger.debug("Checking M-Pesa transaction status for: %s", checkout_request_id)
+        response = check_transaction_status(checkout_request_id)
+        self._send_json(response, 400 if "error" in response else 200)
+    
+    def mpesa_status_events(self, checkout_request_id):
+        """Server-Sent Events: the current status now, the final one when it settles"""
+        response = check_transaction_status(checkout_request_id)
+        if "error" in response:
+            self._send_result(response)
             return
-        
-        # Default 404 response
-        self._set_response(404)
-        self.wfile.write(json_dumps({"error": "Resource not found"}).encode())
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        # The stream ends when the server closes the connection
+        self.send_header('Connection', 'close')
+        self.close_connection = True
+        self.end_headers()
+        self.wfile.write(stream_preamble(response))
+        # A pending payment keeps the socket open on the notifier thread, not
+        # on this worker; at capacity the client reconnects after `retry`
+        if response["status"] == "pending" and open_status_stream(self.connection, checkout_request_id):
+            self.server.detach_request(self.connection)
+
+# Route table: method, path pattern, handler, required role(s)
+ROUTER = Router()
+for method, pattern, handler, roles in [
+    ('GET', '/artworks', RequestHandler.list_artworks, PUBLIC),
+    ('GET', '/artworks/{artwork_id:int}', RequestHandler.show_artwork, PUBLIC),
+    ('POST', '/uploads/images', RequestHandler.upload_image, (ADMIN, ARTIST)),
+    ('POST', '/artworks', RequestHandler.add_artwork, (ADMIN, ARTIST)),
+    ('PUT', '/artworks/{artwork_id:int}', RequestHandler.edit_artwork, (ADMIN, ARTIST)),
+    ('DELETE', '/artworks/{artwork_id:int}', RequestHandler.remove_artwork, (ADMIN, ARTIST)),
+    
+    ('GET', '/exhibitions', RequestHandler.list_exhibitions, PUBLIC),
+    ('GET', '/exhibitions/{exhibition_id:int}', RequestHandler.show_exhibition, PUBLIC),
+    ('POST', '/exhibitions', RequestHandler.add_exhibition, ADMIN),
+    ('PUT', '/exhibitions/{exhibition_id:int}', RequestHandler.edit_exhibition, ADMIN),
+    ('DELETE', '/exhibitions/{exhibition_id:int}', RequestHandler.remove_exhibition, ADMIN),
+    
+    ('POST', '/register', RequestHandler.signup_user, PUBLIC),
+    ('POST', '/register-artist', RequestHandler.signup_artist, PUBLIC),
+    ('POST', '/register-corporate', RequestHandler.signup_corporate, PUBLIC),
+    ('POST', '/login', RequestHandler.login, PUBLIC),
+    ('POST', '/artist-login', RequestHandler.artist_login, PUBLIC),
+    ('POST', '/corporate-login', RequestHandler.corporate_login, PUBLIC),
+    ('POST', '/admin-login', RequestHandler.admin_login, PUBLIC),
+    
+    ('GET', '/tickets', RequestHandler.list_tickets, ADMIN),
+    ('GET', '/orders', RequestHandler.list_orders, ADMIN),
+    ('GET', '/artists', RequestHandler.list_artists, ADMIN),
+    ('GET', '/admin/stats', RequestHandler.server_stats, ADMIN),
+    ('GET', '/admin/queries', RequestHandler.list_query_stats, ADMIN),
+    ('GET', '/metrics', RequestHandler.metrics, PUBLIC),
+    ('GET', '/artist/artworks', RequestHandler.list_artist_artworks, ARTIST),
+    ('GET', '/artist/orders', RequestHandler.list_artist_orders, ARTIST),
+    ('GET', '/tickets/generate/{booking_id}', RequestHandler.ticket_pdf, USER),
+    
+    ('POST', '/contact', RequestHandler.add_message, PUBLIC),
+    ('GET', '/messages', RequestHandler.list_messages, ADMIN),
+    ('POST', '/messages/{message_id:int}', RequestHandler.edit_message, ADMIN),
+    ('PUT', '/messages/{message_id:int}', RequestHandler.edit_message, ADMIN),
+    
+    ('POST', '/mpesa/stk-push', RequestHandler.mpesa_stk_push, PUBLIC),
+    ('POST', '/mpesa/callback', RequestHandler.mpesa_callback, PUBLIC),
+    ('GET', '/mpesa/status/{checkout_request_id}', RequestHandler.mpesa_status, PUBLIC),
+    ('POST', '/mpesa/status/{checkout_request_id}', RequestHandler.mpesa_status, PUBLIC),
+    ('GET', '/mpesa/status/{checkout_request_id}/events', RequestHandler.mpesa_status_events, PUBLIC),
+]:
+    ROUTER.add(method, pattern, handler, roles)
+
+def start_background_workers(slot=0):
+    """Start background jobs; in pre-fork mode they run in worker slot 0 only"""
+    if slot == 0:
+        start_migration_worker()
+        start_reconciler()
+        start_callback_workers()
 
 def main():
     """Start the server"""
     # Initialize the database
-    print("Initializing database...")
+    logger.info("Initializing database...")
     initialize_database()
     
     # Create uploads directory if it doesn't exist
@@ -1031,18 +854,28 @@ def main():
     # Create default exhibition image
     create_default_exhibition_image()
     
+    # Pre-fork mode: N processes share the port via SO_REUSEPORT
+    if SERVER_PROCESSES > 1:
+        logger.info("Starting server on port %s with %s processes x %s workers...", PORT, SERVER_PROCESSES, SERVER_WORKERS)
+        serve_prefork(("", PORT), RequestHandler, processes=SERVER_PROCESSES,
+                      workers=SERVER_WORKERS, backlog=SERVER_BACKLOG,
+                      child_init=start_background_workers)
+        logger.info("Server closed")
+        return
+    
     # Create an HTTP server
-    print(f"Starting server on port {PORT}...")
-    httpd = socketserver.ThreadingTCPServer(("", PORT), RequestHandler)
-    print(f"Server running on port {PORT}")
+    logger.info("Starting server on port %s with %s workers...", PORT, SERVER_WORKERS)
+    httpd = ThreadPoolServer(("", PORT), RequestHandler, workers=SERVER_WORKERS, backlog=SERVER_BACKLOG)
+    start_background_workers()
+    logger.info("Server running on port %s", PORT)
     
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
-        print("\nShutting down server...")
+        logger.info("Shutting down server...")
     finally:
         httpd.server_close()
-        print("Server closed")
+        logger.info("Server closed")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,58 @@
+import threading
+
+# Request coalescing: concurrent calls with the same key share one execution
+#
+# The first caller for a key runs the function; callers that arrive while it
+# is still running wait for it and get the same result (or exception) instead
+# of issuing their own identical database query.
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesce concurrent identical calls"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"executions": 0, "shared": 0}
+
+    def do(self, key, fn):
+        """Run fn() once for all concurrent callers using the same key"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats["shared"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Later callers start a fresh flight and see fresh data
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["in_flight"] = len(self._calls)
+        return snapshot
@@ -0,0 +1,143 @@
+import functools
+import os
+import re
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+# SQLite stand-in for the MySQL database, used by the benchmark harness
+#
+# connect() returns an object with the parts of the mysql.connector
+# connection/cursor API the data modules use (%s placeholders, NOW(),
+# column_names, lastrowid, ping, in_transaction), so server code runs
+# unchanged on a local file database. create_schema() loads schema.sql,
+# translated to SQLite.
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+sqlite3.register_adapter(Decimal, float)
+# Return the column types mysql.connector would (detect_types=PARSE_DECLTYPES)
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()))
+sqlite3.register_converter('BOOLEAN', lambda value: bool(int(value)))
+
+_PLACEHOLDER_RE = re.compile(r'%s')
+_NOW_RE = re.compile(r'\bNOW\(\)', re.I)
+# SQLite has no row locks (a write locks the whole database)
+_FOR_UPDATE_RE = re.compile(r'\s+FOR\s+UPDATE\b', re.I)
+
+@functools.lru_cache(maxsize=512)
+def translate(sql):
+    """Rewrite MySQL-flavoured SQL used by the data modules for SQLite"""
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _FOR_UPDATE_RE.sub('', sql)
+    return _NOW_RE.sub('CURRENT_TIMESTAMP', sql)
+
+# NOT NULL columns without a DEFAULT get MySQL's implicit default when an
+# INSERT leaves them out (non-strict sql_mode); SQLite would reject the row
+_COLUMN_RE = re.compile(r'^(\s+\w+\s+)([A-Z]+)(\([\d, ]+\))?(\s+NOT NULL)(?!.*\bDEFAULT\b)(.*)$', re.M)
+_IMPLICIT_DEFAULTS = {'VARCHAR': "''", 'TEXT': "''", 'TIMESTAMP': 'CURRENT_TIMESTAMP'}
+
+def _column_default(match):
+    prefix, col_type, size, not_null, rest = match.groups()
+    if 'PRIMARY KEY' in rest or 'UNIQUE' in rest:
+        return match.group(0)
+    default = _IMPLICIT_DEFAULTS.get(col_type, '0')
+    return f"{prefix}{col_type}{size or ''}{not_null} DEFAULT {default}{rest}"
+
+def schema_sql(path=SCHEMA_PATH):
+    """Return schema.sql translated to SQLite DDL"""
+    with open(path) as f:
+        sql = f.read()
+    sql = sql.replace('SERIAL PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT')
+    return _COLUMN_RE.sub(_column_default, sql)
+
+class SQLiteCursor:
+    """mysql.connector-style cursor over a sqlite3 cursor"""
+
+    def __init__(self, raw_cursor):
+        self._raw = raw_cursor
+
+    def execute(self, operation, params=None):
+        self._raw.execute(translate(operation), tuple(params or ()))
+
+    def executemany(self, operation, seq_params):
+        self._raw.executemany(translate(operation), seq_params)
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    @property
+    def column_names(self):
+        return tuple(col[0] for col in self._raw.description or ())
+
+    @property
+    def lastrowid(self):
+        return self._raw.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    def fetchone(self):
+        return self._raw.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._raw.fetchmany(size)
+
+    def fetchall(self):
+        return self._raw.fetchall()
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def close(self):
+        self._raw.close()
+
+class SQLiteConnection:
+    """mysql.connector-style connection over a sqlite3 connection"""
+
+    def __init__(self, raw_connection):
+        self._raw = raw_connection
+
+    def cursor(self, *args, **kwargs):
+        # buffered=/dictionary= options are accepted and ignored
+        return SQLiteCursor(self._raw.cursor())
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False):
+        self._raw.execute('SELECT 1')
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        self._raw.close()
+
+def connect(path):
+    """Open a stand-in connection; safe to hand between pool threads"""
+    raw = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                          detect_types=sqlite3.PARSE_DECLTYPES)
+    raw.execute('PRAGMA journal_mode=WAL')
+    raw.execute('PRAGMA synchronous=NORMAL')
+    raw.execute('PRAGMA foreign_keys=ON')
+    return SQLiteConnection(raw)
+
+def create_schema(path):
+    """Create every table and index from schema.sql in a SQLite file"""
+    raw = sqlite3.connect(path)
+    try:
+        raw.executescript(schema_sql())
+        raw.commit()
+    finally:
+        raw.close()
@@ -0,0 +1,93 @@
+import os
+import re
+import urllib.parse
+from email.utils import formatdate, parsedate_to_datetime
+
+# Helpers for serving files under /static/
+
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+# Cache lifetimes (seconds)
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 3600))
+
+# Upload names that embed a content hash never change, so they can be cached
+# for a year; anything else might be overwritten in place
+_IMMUTABLE_NAME_RE = re.compile(r"(^|[_.-])[0-9a-f]{16,}(\.[A-Za-z0-9]+)+$")
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def resolve_static_path(url_path):
+    """Map a /static/... URL path to a file path, or None if it is unsafe
+
+    All checks are string-only, so nothing touches the filesystem for a
+    rejected request.
+    """
+    if not url_path.startswith('/static/'):
+        return None
+    relative = urllib.parse.unquote(url_path[len('/static/'):])
+    if not relative or '\x00' in relative or '\\' in relative:
+        return None
+
+    segments = relative.split('/')
+    if any(segment in ('', '.', '..') for segment in segments):
+        return None
+
+    file_path = os.path.normpath(os.path.join(STATIC_ROOT, *segments))
+    if os.path.commonpath([STATIC_ROOT, file_path]) != STATIC_ROOT:
+        return None
+    return file_path
+
+def is_immutable(file_path):
+    """Whether a static file name is content-addressed and safe to cache forever"""
+    return bool(_IMMUTABLE_NAME_RE.search(os.path.basename(file_path)))
+
+def cache_control(file_path):
+    if is_immutable(file_path):
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={STATIC_MAX_AGE}"
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+def not_modified_since(header, mtime):
+    """True if the If-Modified-Since header is at or after the file's mtime"""
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError, IndexError):
+        return False
+    if since is None:
+        return False
+    # HTTP dates have one-second resolution
+    return int(mtime) <= since.timestamp()
+
+def parse_range(header, file_size):
+    """Parse a single-range Range header
+
+    Returns (start, end) inclusive, None to serve the whole file (no header,
+    multiple ranges or an unknown unit), or False if the range can't be
+    satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, file_size - length), file_size - 1
+
+    start = int(first)
+    end = int(last) if last else file_size - 1
+    if start >= file_size or end < start:
+        return False
+    return start, min(end, file_size - 1)
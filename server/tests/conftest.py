@@ -0,0 +1,68 @@
+import http.client
+import os
+import sys
+import threading
+
+import pytest
+
+# The server modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class Response:
+    def __init__(self, response):
+        self.status = response.status
+        self.headers = response.headers
+        self.body = response.read()
+
+class Client:
+    """One keep-alive connection to the test server"""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+
+    def request(self, method, path, body=None, headers=None, token=None):
+        headers = dict(headers or {})
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        self.connection.request(method, path, body=body, headers=headers)
+        return Response(self.connection.getresponse())
+
+    def close(self):
+        self.connection.close()
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """The real RequestHandler over a fresh SQLite stand-in database"""
+    import catalog_cache
+    import database
+    import server
+    import sqlite_db
+    from worker_server import ThreadPoolServer
+
+    path = str(tmp_path / 'gallery.db')
+    sqlite_db.create_schema(path)
+    database.set_connect_function(lambda: sqlite_db.connect(path))
+    # Catalog entries cached by an earlier test's database must not leak in
+    monkeypatch.setattr(catalog_cache, '_cache', catalog_cache.TTLCache(catalog_cache.CATALOG_CACHE_SIZE))
+
+    httpd = ThreadPoolServer(('127.0.0.1', 0), server.RequestHandler, workers=4)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    client = Client(httpd.server_address[1])
+    try:
+        yield client
+    finally:
+        client.close()
+        httpd.shutdown()
+        httpd.server_close()
+        database.set_connect_function(database._connect)
+
+@pytest.fixture
+def token():
+    """token(is_admin=True, ...) signs a JWT the server accepts"""
+    from auth import generate_token
+
+    def token(sub=1, name='Test', **roles):
+        return generate_token(sub, name, **roles)
+
+    return token
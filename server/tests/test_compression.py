@@ -0,0 +1,79 @@
+import gzip
+import json
+import os
+import zlib
+
+import pytest
+
+from compression import choose_encoding, compress_body, find_sidecar, parse_accept_encoding
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding('') == {}
+    assert parse_accept_encoding('gzip, deflate;q=0.5, br;q=bad, ') == {'gzip': 1.0, 'deflate': 0.5, 'br': 0.0}
+    assert parse_accept_encoding('GZIP ; q=0.3') == {'gzip': 0.3}
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate', 'gzip'),
+    ('deflate', 'deflate'),
+    ('deflate;q=1, gzip;q=0.5', 'deflate'),
+    ('gzip;q=0, deflate;q=0', None),
+    ('*', 'gzip'),
+    ('*;q=0.5, gzip;q=0', 'deflate'),
+    ('br', None),
+    ('', None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header, ('gzip', 'deflate')) == expected
+
+def test_compress_body():
+    body = b'{"title": "Sunrise"}' * 100
+    compressed, encoding = compress_body(body, 'gzip, deflate')
+    assert encoding == 'gzip' and gzip.decompress(compressed) == body
+    compressed, encoding = compress_body(body, 'deflate')
+    assert encoding == 'deflate' and zlib.decompress(compressed) == body
+    assert compress_body(body, 'identity') == (body, None)
+    # Small bodies are not worth the CPU
+    assert compress_body(b'{}', 'gzip') == (b'{}', None)
+
+def test_find_sidecar(tmp_path):
+    asset = tmp_path / 'app.js'
+    asset.write_text('console.log(1)')
+    assert find_sidecar(str(asset), 'gzip, br') == (None, None)
+
+    (tmp_path / 'app.js.gz').write_bytes(b'gz')
+    (tmp_path / 'app.js.br').write_bytes(b'br')
+    assert find_sidecar(str(asset), 'gzip, br') == (str(asset) + '.br', 'br')
+    assert find_sidecar(str(asset), 'gzip') == (str(asset) + '.gz', 'gzip')
+    assert find_sidecar(str(asset), 'identity') == (None, None)
+
+    # A sidecar older than the asset is stale
+    os.utime(tmp_path / 'app.js.br', (0, 0))
+    assert find_sidecar(str(asset), 'br, gzip') == (str(asset) + '.gz', 'gzip')
+
+@pytest.fixture
+def artworks(api):
+    import database
+    connection = database.get_db_connection()
+    cursor = connection.cursor()
+    for n in range(20):
+        cursor.execute("INSERT INTO artworks (title, artist, description, price, image_url) "
+                       "VALUES (%s, %s, %s, %s, %s)", (f'Artwork {n}', 'Anon', 'x' * 100, 100, 'a.jpg'))
+    connection.commit()
+    cursor.close()
+    connection.close()
+    return api
+
+def test_json_responses_are_compressed_when_accepted(artworks):
+    plain = artworks.request('GET', '/artworks')
+    assert plain.status == 200
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+
+    compressed = artworks.request('GET', '/artworks', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert int(compressed.headers['Content-Length']) == len(compressed.body) < len(plain.body)
+    assert json.loads(gzip.decompress(compressed.body)) == json.loads(plain.body)
+
+    refused = artworks.request('GET', '/artworks', headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in refused.headers
+    assert refused.body == plain.body
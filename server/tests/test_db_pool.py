@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+import artwork
+import database
+import exhibition
+import sqlite_db
+from db_pool import ConnectionPool, PoolTimeoutError
+
+class FakeConnection:
+    def __init__(self):
+        self.in_transaction = False
+        self.closed = False
+        self.rollbacks = 0
+        self.alive = True
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise OSError("server has gone away")
+
+    def cursor(self):
+        return object()
+
+@pytest.fixture
+def opened():
+    connections = []
+
+    def connect():
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    return connect, connections
+
+def test_connections_are_reused(opened):
+    connect, connections = opened
+    pool = ConnectionPool(connect, size=2)
+
+    first = pool.get_connection()
+    first.close()
+    first.close()  # a second close is harmless
+    second = pool.get_connection()
+
+    assert second is first
+    assert len(connections) == 1
+    stats = pool.stats()
+    assert (stats["checkouts"], stats["created"], stats["reused"]) == (2, 1, 1)
+    assert (stats["open"], stats["in_use"], stats["idle"]) == (1, 1, 0)
+
+def test_uncommitted_work_is_rolled_back_on_return(opened):
+    connect, connections = opened
+    pool = ConnectionPool(connect, size=1)
+    connection = pool.get_connection()
+    connections[0].in_transaction = True
+    connection.close()
+    assert connections[0].rollbacks == 1
+
+def test_connection_is_recycled_after_max_uses(opened):
+    connect, connections = opened
+    pool = ConnectionPool(connect, size=1, max_uses=2)
+    for _ in range(3):
+        pool.get_connection().close()
+    assert len(connections) == 2
+    assert connections[0].closed and not connections[1].closed
+    assert pool.stats()["recycled"] == 1
+
+def test_connection_is_recycled_after_max_age(opened):
+    connect, connections = opened
+    pool = ConnectionPool(connect, size=1, max_age=0.05)
+    pool.get_connection().close()
+    time.sleep(0.06)
+    pool.get_connection().close()
+    assert len(connections) == 2
+    assert connections[0].closed
+
+def test_dead_idle_connection_is_replaced(opened):
+    connect, connections = opened
+    pool = ConnectionPool(connect, size=1, ping_interval=0)
+    pool.get_connection().close()
+    connections[0].alive = False
+    connection = pool.get_connection()
+    assert connection._raw is connections[1]
+    assert pool.stats()["health_check_failures"] == 1
+
+def test_exhausted_pool_times_out(opened):
+    connect, _ = opened
+    pool = ConnectionPool(connect, size=1, timeout=0.1)
+    held = pool.get_connection()
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.get_connection()
+    assert time.monotonic() - started >= 0.1
+    assert pool.stats()["timeouts"] == 1
+    held.close()
+
+def test_waiter_gets_the_returned_connection(opened):
+    connect, _ = opened
+    pool = ConnectionPool(connect, size=1, timeout=5)
+    held = pool.get_connection()
+    threading.Timer(0.05, held.close).start()
+    assert pool.get_connection() is held
+
+def test_failed_connect_frees_the_slot():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("connection refused")
+        return FakeConnection()
+
+    pool = ConnectionPool(connect, size=1, timeout=0.1)
+    with pytest.raises(OSError):
+        pool.get_connection()
+    assert pool.get_connection() is not None
+    assert pool.stats()["connect_failures"] == 1
+
+@pytest.fixture
+def one_connection_db(tmp_path, monkeypatch):
+    """The real module pool over a SQLite stand-in, limited to one connection"""
+    path = str(tmp_path / 'gallery.db')
+    sqlite_db.create_schema(path)
+    monkeypatch.setitem(database.DB_POOL_CONFIG, 'size', 1)
+    monkeypatch.setitem(database.DB_POOL_CONFIG, 'timeout', 0.5)
+    monkeypatch.setattr(artwork, 'schedule_variants', lambda image_url: None)
+    monkeypatch.setattr(exhibition, 'schedule_variants', lambda image_url: None)
+    database.set_connect_function(lambda: sqlite_db.connect(path))
+    yield
+    database.set_connect_function(database._connect)
+
+ADMIN = {"sub": "1", "is_admin": True}
+
+def test_catalog_writes_need_only_one_pool_slot(one_connection_db):
+    fields = {"title": "Dawn", "artist": "Anon", "description": "-", "price": 100,
+              "imageUrl": "/static/uploads/dawn.jpg"}
+    created = artwork.create_artwork(ADMIN, fields)
+    assert created.get("title") == "Dawn", created
+    updated = artwork.update_artwork(ADMIN, created["id"], dict(fields, title="Dusk"))
+    assert updated.get("title") == "Dusk", updated
+
+    fields = {"title": "Lamu", "description": "-", "location": "Nairobi", "startDate": "2025-01-01",
+              "endDate": "2025-02-01", "ticketPrice": 500, "totalSlots": 10, "status": "upcoming",
+              "imageUrl": "/static/uploads/lamu.jpg"}
+    created = exhibition.create_exhibition(ADMIN, fields)
+    assert created.get("title") == "Lamu", created
+    updated = exhibition.update_exhibition(ADMIN, created["id"], dict(fields, title="Malindi", availableSlots=10))
+    assert updated.get("title") == "Malindi", updated
+
+    assert database.get_pool_stats()["timeouts"] == 0
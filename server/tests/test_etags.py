@@ -0,0 +1,77 @@
+import gzip
+import json
+
+import pytest
+
+from catalog_version import bump_version, catalog_etag, get_version
+
+ARTWORK = {"title": "Dawn", "artist": "Anon", "description": "x" * 2000, "price": 100,
+           "imageUrl": "/static/uploads/dawn.jpg"}
+
+@pytest.fixture
+def catalog(api, token, monkeypatch):
+    import artwork
+    monkeypatch.setattr(artwork, 'schedule_variants', lambda image_url: None)
+    admin = token(is_admin=True)
+    response = api.request('POST', '/artworks', body=json.dumps(ARTWORK),
+                           headers={'Content-Type': 'application/json'}, token=admin)
+    assert response.status == 201, response.body
+    return api, admin, json.loads(response.body)["id"]
+
+def test_catalog_etag_follows_the_version():
+    before = catalog_etag('exhibitions', 7)
+    assert catalog_etag('exhibitions', 7) == before
+    assert catalog_etag('exhibitions', 8) != before
+    assert bump_version('exhibitions') == get_version('exhibitions')
+    assert catalog_etag('exhibitions', 7) != before
+    with pytest.raises(ValueError):
+        catalog_etag('tickets')
+
+def test_matching_etag_gets_304(catalog):
+    api, _, artwork_id = catalog
+    for path in ('/artworks', f'/artworks/{artwork_id}'):
+        first = api.request('GET', path)
+        etag = first.headers['ETag']
+        assert first.status == 200 and first.headers['Cache-Control'] == 'no-cache'
+
+        for if_none_match in (etag, 'W/' + etag, f'"other", {etag}', '*'):
+            response = api.request('GET', path, headers={'If-None-Match': if_none_match})
+            assert (response.status, response.body) == (304, b'')
+            assert response.headers['Vary'] == 'Accept-Encoding'
+
+        assert api.request('GET', path, headers={'If-None-Match': '"stale"'}).status == 200
+
+def test_compressed_responses_have_their_own_tag(catalog):
+    api, _, artwork_id = catalog
+    plain = api.request('GET', f'/artworks/{artwork_id}')
+    compressed = api.request('GET', f'/artworks/{artwork_id}', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert json.loads(gzip.decompress(compressed.body)) == json.loads(plain.body)
+
+    # Either form of the tag revalidates
+    response = api.request('GET', f'/artworks/{artwork_id}',
+                           headers={'If-None-Match': compressed.headers['ETag'], 'Accept-Encoding': 'gzip'})
+    assert response.status == 304
+
+def test_write_changes_the_etag(catalog):
+    api, admin, artwork_id = catalog
+    etag = api.request('GET', '/artworks').headers['ETag']
+
+    response = api.request('PUT', f'/artworks/{artwork_id}', body=json.dumps(dict(ARTWORK, title="Dusk")),
+                           headers={'Content-Type': 'application/json'}, token=admin)
+    assert response.status == 200, response.body
+
+    response = api.request('GET', '/artworks', headers={'If-None-Match': etag})
+    assert response.status == 200
+    assert response.headers['ETag'] != etag
+    assert json.loads(response.body)["artworks"][0]["title"] == "Dusk"
+
+def test_pages_and_errors(catalog):
+    api, _, _ = catalog
+    whole = api.request('GET', '/artworks').headers['ETag']
+    page = api.request('GET', '/artworks?limit=1').headers['ETag']
+    assert page != whole
+
+    missing = api.request('GET', '/artworks/999999')
+    assert 'ETag' not in missing.headers
@@ -0,0 +1,92 @@
+import base64
+
+import pytest
+
+import database
+import image_migration
+import image_store
+import sqlite_db
+from image_migration import MigrationWorker, migrate_all
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+GOOD = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+BAD = 'data:image/png;base64,abc'
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / 'gallery.db')
+    sqlite_db.create_schema(path)
+    database.set_connect_function(lambda: sqlite_db.connect(path))
+    monkeypatch.setattr(image_store, 'UPLOADS_DIR', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(image_migration, 'invalidate', lambda table: None)
+    monkeypatch.setattr(image_migration, 'schedule_variants', lambda path: None)
+    yield sqlite_db.connect(path)
+    database.set_connect_function(database._connect)
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Records every value handed to the real store_inline_image"""
+    calls = []
+
+    def store_inline_image(image_url):
+        calls.append(image_url)
+        return image_store.store_inline_image(image_url)
+
+    monkeypatch.setattr(image_migration, 'store_inline_image', store_inline_image)
+    return calls
+
+def add_artworks(connection, *image_urls):
+    cursor = connection.cursor()
+    for image_url in image_urls:
+        cursor.execute("INSERT INTO artworks (title, artist, description, price, image_url) "
+                       "VALUES (%s, %s, %s, %s, %s)", ('Untitled', 'Anon', '-', 100, image_url))
+    connection.commit()
+
+def image_urls(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT image_url FROM artworks ORDER BY id")
+    return [row[0] for row in cursor.fetchall()]
+
+def test_undecodable_rows_are_left_alone_and_tried_once(db, decodes):
+    stored = image_store.UPLOADS_URL + image_store.content_name(PNG, '.png')
+    add_artworks(db, GOOD, BAD, 'base64,' + base64.b64encode(PNG).decode(), 'data:image/png,notbase64')
+    failed = {}
+
+    assert migrate_all(batch_size=2, failed=failed) == {'artworks': 2, 'exhibitions': 0}
+    assert failed == {'artworks': {2, 4}, 'exhibitions': set()}
+    assert image_urls(db) == [stored, BAD, stored, 'data:image/png,notbase64']
+    assert len(decodes) == 4
+
+    # The next pass still reads the bad rows but no longer decodes them
+    assert migrate_all(batch_size=2, failed=failed) == {'artworks': 0, 'exhibitions': 0}
+    assert len(decodes) == 4
+
+def test_file_paths_mentioning_base64_are_not_inline(db, decodes):
+    add_artworks(db, '/static/uploads/base64-poster.png', 'poster_base64.jpg')
+    assert migrate_all() == {'artworks': 0, 'exhibitions': 0}
+    assert decodes == []
+
+def test_without_a_failed_set_every_pass_retries(db, decodes):
+    add_artworks(db, BAD)
+    migrate_all()
+    migrate_all()
+    assert decodes == [BAD, BAD]
+    assert image_urls(db) == [BAD]
+
+def test_worker_reports_undecodable_rows(db, decodes):
+    add_artworks(db, GOOD, BAD)
+    worker = MigrationWorker(interval=60)
+    worker._stop.set()  # run a single pass
+    worker._run()
+    worker._run()
+
+    stats = worker.stats()
+    assert stats["converted"] == 1
+    assert stats["undecodable"] == {'artworks': 1, 'exhibitions': 0}
+    assert stats["passes"] == 2
+    assert decodes == [GOOD, BAD]
+
+def test_store_inline_image_has_no_placeholder():
+    assert image_store.store_inline_image(BAD) is None
+    assert image_store.store_inline_image('data:image/png,notbase64') is None
+    assert image_store.store_inline_image('data:image/png;base64,') is None
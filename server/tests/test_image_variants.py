@@ -0,0 +1,81 @@
+import os
+import time
+
+import pytest
+
+from image_variants import VariantCache
+
+@pytest.fixture
+def write(tmp_path):
+    """Write a variant file of the given size, age seconds old"""
+    clock = time.time()
+
+    def write(name, size, age=0):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * size)
+        os.utime(path, (clock - age, clock - age))
+        return str(path), size
+
+    return write
+
+def remaining(tmp_path):
+    return sorted(path.name for path in tmp_path.rglob('*') if path.is_file())
+
+def test_existing_files_are_evicted_oldest_first(tmp_path, write):
+    write('ab/cd/old.w320.jpg', 100, age=300)
+    write('ab/cd/mid.w320.jpg', 100, age=200)
+    write('ab/cd/new.w320.jpg', 100, age=100)
+    cache = VariantCache(str(tmp_path), max_bytes=300)
+
+    cache.add([write('ab/cd/added.w320.jpg', 100)])
+
+    assert remaining(tmp_path) == ['added.w320.jpg', 'mid.w320.jpg', 'new.w320.jpg']
+    assert cache.stats() == {"added": 1, "evicted": 1, "files": 3, "bytes": 300, "max_bytes": 300}
+
+def test_eviction_continues_until_under_budget(tmp_path, write):
+    cache = VariantCache(str(tmp_path), max_bytes=300)
+    cache.add([write(f'ab/cd/{n}.w320.jpg', 100, age=100 - n) for n in range(3)])
+    assert cache.stats()["bytes"] == 300
+
+    cache.add([write('ab/cd/large.w1280.jpg', 250)])
+
+    assert remaining(tmp_path) == ['large.w1280.jpg']
+    assert cache.stats()["bytes"] == 250
+    assert cache.stats()["evicted"] == 3
+
+def test_touch_protects_recently_used_files(tmp_path, write):
+    first = write('ab/cd/first.w320.jpg', 100, age=300)
+    write('ab/cd/second.w320.jpg', 100, age=200)
+    cache = VariantCache(str(tmp_path), max_bytes=200)
+    cache.add([])
+
+    cache.touch(first[0])
+    cache.add([write('ab/cd/third.w320.jpg', 100)])
+
+    assert remaining(tmp_path) == ['first.w320.jpg', 'third.w320.jpg']
+
+def test_rewritten_file_replaces_its_old_size(tmp_path, write):
+    cache = VariantCache(str(tmp_path), max_bytes=1000)
+    cache.add([write('ab/cd/a.w320.jpg', 400)])
+    cache.add([write('ab/cd/a.w320.jpg', 100)])
+    assert cache.stats()["bytes"] == 100
+    assert cache.stats()["files"] == 1
+
+def test_newest_file_is_kept_even_over_budget(tmp_path, write):
+    cache = VariantCache(str(tmp_path), max_bytes=50)
+    cache.add([write('ab/cd/a.w320.jpg', 100)])
+    assert remaining(tmp_path) == ['a.w320.jpg']
+    assert cache.stats()["evicted"] == 0
+
+def test_files_deleted_elsewhere_still_free_their_bytes(tmp_path, write):
+    gone = write('ab/cd/gone.w320.jpg', 100, age=200)
+    write('ab/cd/kept.w320.jpg', 100, age=100)
+    cache = VariantCache(str(tmp_path), max_bytes=200)
+    cache.add([])
+    os.unlink(gone[0])  # e.g. removed by another pre-fork worker
+
+    cache.add([write('ab/cd/new.w320.jpg', 100)])
+
+    assert remaining(tmp_path) == ['kept.w320.jpg', 'new.w320.jpg']
+    assert cache.stats()["bytes"] == 200
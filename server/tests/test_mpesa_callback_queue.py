@@ -0,0 +1,154 @@
+import time
+
+import pytest
+
+import mpesa_callback_queue
+from mpesa_callback_queue import CallbackQueue, CallbackWorkers, retry_delay
+
+class Clock:
+    """Stands in for the time module so leases and retry delays can be skipped"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(mpesa_callback_queue, 'time', clock)
+    return clock
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return CallbackQueue(str(tmp_path / 'data' / 'callbacks.db'))
+
+@pytest.fixture
+def results(monkeypatch):
+    """apply_callback replacement: pops the next outcome (a dict or an exception)"""
+    outcomes, applied = [], []
+
+    def apply_callback(payload):
+        applied.append(payload)
+        outcome = outcomes.pop(0) if outcomes else {"message": "ok"}
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(mpesa_callback_queue, 'apply_callback', apply_callback)
+    return outcomes, applied
+
+def last_error(queue, callback_id):
+    return queue._connection().execute("SELECT last_error FROM callbacks WHERE id = ?", (callback_id,)).fetchone()[0]
+
+def test_claims_are_leased(queue, clock):
+    callback_id = queue.put({"CheckoutRequestID": "ws_1"})
+    assert queue.claim() == (callback_id, {"CheckoutRequestID": "ws_1"}, 0)
+    assert queue.claim() is None
+
+    # A worker that dies mid-callback leaves it to be claimed again
+    clock.advance(mpesa_callback_queue._LEASE)
+    assert queue.claim() == (callback_id, {"CheckoutRequestID": "ws_1"}, 1)
+
+def test_claims_follow_arrival_order(queue, clock):
+    first = queue.put({"n": 1})
+    clock.advance(1)
+    second = queue.put({"n": 2})
+    assert [queue.claim()[0], queue.claim()[0]] == [first, second]
+
+def test_applied_callback_is_removed(queue, results):
+    _, applied = results
+    workers = CallbackWorkers(queue, max_attempts=3)
+    queue.put({"CheckoutRequestID": "ws_1"})
+
+    workers._process(*queue.claim())
+
+    assert applied == [{"CheckoutRequestID": "ws_1"}]
+    assert queue.counts() == {"queued": 0, "dead": 0}
+    assert workers.stats()["processed"] == 1
+
+def test_failures_are_retried_with_backoff(queue, clock, results, monkeypatch):
+    monkeypatch.setattr(mpesa_callback_queue, 'MPESA_CALLBACK_RETRY_DELAY', 2)
+    outcomes, _ = results
+    outcomes.extend([{"error": "Transaction not found"}, ConnectionError("database down")])
+    workers = CallbackWorkers(queue, max_attempts=5)
+    callback_id = queue.put({"CheckoutRequestID": "ws_1"})
+
+    workers._process(*queue.claim())
+    assert last_error(queue, callback_id) == "Transaction not found"
+    clock.advance(1.9)
+    assert queue.claim() is None
+    clock.advance(0.1)
+    claimed = queue.claim()
+    assert claimed[2] == 1
+
+    workers._process(*claimed)
+    assert last_error(queue, callback_id) == "database down"
+    clock.advance(3.9)
+    assert queue.claim() is None
+    clock.advance(0.1)
+    workers._process(*queue.claim())
+
+    assert queue.counts() == {"queued": 0, "dead": 0}
+    assert workers.stats()["retried"] == 2
+    assert workers.stats()["processed"] == 1
+
+def test_callback_is_dead_lettered_after_max_attempts(queue, clock, results):
+    outcomes, applied = results
+    outcomes.extend([RuntimeError("boom")] * 3)
+    workers = CallbackWorkers(queue, max_attempts=3)
+    callback_id = queue.put({"CheckoutRequestID": "ws_1"})
+
+    for _ in range(3):
+        clock.advance(mpesa_callback_queue.MPESA_CALLBACK_MAX_RETRY_DELAY)
+        workers._process(*queue.claim())
+
+    assert len(applied) == 3
+    assert queue.counts() == {"queued": 0, "dead": 1}
+    clock.advance(mpesa_callback_queue._LEASE)
+    assert queue.claim() is None
+    [dead] = queue.dead()
+    assert (dead["id"], dead["attempts"], dead["last_error"]) == (callback_id, 3, "boom")
+    assert workers.stats()["dead_lettered"] == 1
+
+    # Requeued callbacks start over with a fresh set of attempts
+    assert queue.requeue_dead() == 1
+    assert queue.claim() == (callback_id, {"CheckoutRequestID": "ws_1"}, 0)
+
+def test_malformed_callback_is_dead_lettered_at_once(queue, results):
+    outcomes, _ = results
+    outcomes.append(ValueError("Missing CheckoutRequestID"))
+    workers = CallbackWorkers(queue, max_attempts=8)
+    queue.put({})
+
+    workers._process(*queue.claim())
+
+    assert queue.counts() == {"queued": 0, "dead": 1}
+    assert queue.dead()[0]["last_error"] == "Missing CheckoutRequestID"
+
+def test_retry_delay_doubles_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(mpesa_callback_queue, 'MPESA_CALLBACK_RETRY_DELAY', 2)
+    monkeypatch.setattr(mpesa_callback_queue, 'MPESA_CALLBACK_MAX_RETRY_DELAY', 30)
+    assert [retry_delay(attempts) for attempts in range(1, 7)] == [2, 4, 8, 16, 30, 30]
+
+def test_worker_threads_drain_the_queue(tmp_path, results):
+    _, applied = results
+    queue = CallbackQueue(str(tmp_path / 'callbacks.db'))
+    workers = CallbackWorkers(queue, workers=2, poll_interval=0.05)
+    workers.start()
+    try:
+        for n in range(5):
+            queue.put({"n": n})
+        workers.notify()
+        deadline = time.monotonic() + 5
+        while workers.stats()["processed"] < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        workers.stop()
+
+    assert sorted(payload["n"] for payload in applied) == [0, 1, 2, 3, 4]
+    assert queue.counts() == {"queued": 0, "dead": 0}
@@ -0,0 +1,84 @@
+import socket
+import time
+
+import pytest
+
+import mpesa_events
+from mpesa_events import StatusStreams, format_event, status_message
+
+def stream(streams, checkout_request_id):
+    """Open a stream over a socket pair; returns the client end"""
+    client, server = socket.socketpair()
+    client.settimeout(5)
+    assert streams.open(server, checkout_request_id)
+    return client
+
+def read_until_closed(client):
+    data = b''
+    while chunk := client.recv(4096):
+        data += chunk
+    return data
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+@pytest.fixture
+def settled(monkeypatch):
+    """What fetch_settled reports: {checkout_request_id: (status, result_desc)}"""
+    settled = {}
+    monkeypatch.setattr(mpesa_events, 'fetch_settled',
+                        lambda ids: {i: settled[i] for i in ids if i in settled})
+    return settled
+
+def test_status_message():
+    assert status_message("pending")["message"] == "Payment is being processed"
+    assert status_message("completed") == {"status": "completed", "message": "Payment completed"}
+    assert status_message("failed", "Request cancelled by user")["message"] == "Request cancelled by user"
+
+def test_publish_is_delivered_before_the_next_poll(settled):
+    streams = StatusStreams(poll_interval=60, heartbeat=60)
+    client = stream(streams, 'ws_CO_1')
+    other = stream(streams, 'ws_CO_2')
+
+    streams.publish('ws_CO_1', 'completed')
+    assert read_until_closed(client) == format_event(status_message('completed'))
+    wait_for(lambda: streams.stats()["delivered"] == 1)
+    assert streams.stats()["open"] == 1
+    assert streams.stats()["polls"] == 0
+
+    other.close()
+    wait_for(lambda: streams.stats()["open"] == 0)
+    assert streams.stats()["disconnected"] == 1
+
+def test_poll_delivers_payments_settled_elsewhere(settled):
+    streams = StatusStreams(poll_interval=0.05, heartbeat=60)
+    client = stream(streams, 'ws_CO_1')
+    wait_for(lambda: streams.stats()["polls"] >= 1)
+
+    settled['ws_CO_1'] = ('failed', 'Insufficient balance')
+    assert read_until_closed(client) == format_event(status_message('failed', 'Insufficient balance'))
+
+def test_streams_expire_after_max_age(settled):
+    streams = StatusStreams(poll_interval=60, heartbeat=0.05, max_age=0.2)
+    client = stream(streams, 'ws_CO_1')
+    data = read_until_closed(client)
+    assert data.startswith(b': keep-alive\n\n')
+    assert set(data.split(b'\n\n')) == {b': keep-alive', b''}
+    wait_for(lambda: streams.stats()["expired"] == 1)
+
+def test_streams_beyond_capacity_are_rejected(settled):
+    streams = StatusStreams(max_streams=1, poll_interval=60, heartbeat=60)
+    client = stream(streams, 'ws_CO_1')
+
+    spare, server = socket.socketpair()
+    assert not streams.open(server, 'ws_CO_2')
+    assert streams.stats()["rejected"] == 1
+
+    streams.publish('ws_CO_1', 'completed')
+    read_until_closed(client)
+    wait_for(lambda: streams.stats()["open"] == 0)
+    assert streams.open(server, 'ws_CO_2')
+    spare.close()
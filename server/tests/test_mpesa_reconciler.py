@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import mpesa_reconciler
+from mpesa_reconciler import PaymentReconciler
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(mpesa_reconciler, 'time', SimpleNamespace(monotonic=lambda: clock.now, time=lambda: clock.now))
+    return clock
+
+@pytest.fixture
+def safaricom(monkeypatch):
+    """reconcile() answers from `safaricom.results` (missing ids are still pending)"""
+    safaricom = SimpleNamespace(results={}, queried=[])
+
+    def reconcile(checkout_request_id):
+        safaricom.queried.append(checkout_request_id)
+        result = safaricom.results.get(checkout_request_id)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(mpesa_reconciler, 'reconcile', reconcile)
+    return safaricom
+
+def test_new_transactions_wait_for_the_first_delay():
+    reconciler = PaymentReconciler(first_delay=20)
+    assert reconciler._due(['a', 'b'], 1000) == []
+    assert reconciler._due(['a', 'b'], 1019) == []
+    assert reconciler._due(['a', 'b', 'c'], 1020) == ['a', 'b']
+    assert reconciler._due(['a', 'b', 'c'], 1040) == ['a', 'b', 'c']
+
+def test_due_is_capped_at_the_batch_size():
+    reconciler = PaymentReconciler(batch_size=2, first_delay=0)
+    reconciler._due(['a', 'b', 'c'], 1000)
+    assert reconciler._due(['a', 'b', 'c'], 1000) == ['a', 'b']
+
+def test_ids_no_longer_pending_are_dropped():
+    reconciler = PaymentReconciler(first_delay=20)
+    reconciler._due(['a', 'b'], 1000)
+    reconciler._due(['b'], 1010)
+    assert reconciler.stats()["tracked"] == 1
+    # Seen again later, it starts over from the first delay
+    assert reconciler._due(['a', 'b'], 1020) == ['b']
+
+def test_pending_queries_back_off(clock, safaricom):
+    reconciler = PaymentReconciler(first_delay=20, max_delay=100)
+    reconciler._due(['a'], clock.now)
+
+    delays = []
+    for _ in range(5):
+        reconciler._check('a')
+        delays.append(reconciler._schedule['a'][0] - clock.now)
+    assert delays == [20, 40, 80, 100, 100]
+    assert reconciler._schedule['a'][1] == 5
+    assert reconciler.stats()["queries"] == 5
+
+def test_settled_transactions_leave_the_schedule(clock, safaricom):
+    safaricom.results = {'a': 'completed', 'b': 'failed', 'c': ConnectionError('timeout')}
+    reconciler = PaymentReconciler(first_delay=0)
+    reconciler._due(['a', 'b', 'c'], clock.now)
+    for checkout_request_id in 'abc':
+        reconciler._check(checkout_request_id)
+
+    stats = reconciler.stats()
+    assert list(reconciler._schedule) == ['c']
+    assert (stats["completed"], stats["failed"], stats["errors"], stats["queries"]) == (1, 1, 1, 3)
+
+def test_run_pass_queries_due_transactions(clock, safaricom, monkeypatch):
+    monkeypatch.setattr(mpesa_reconciler, 'fetch_pending', lambda: ['a', 'b'])
+    safaricom.results = {'a': 'completed'}
+    reconciler = PaymentReconciler(first_delay=20)
+    with ThreadPoolExecutor(2) as executor:
+        assert reconciler.run_pass(executor) == 0
+        clock.now += 20
+        assert reconciler.run_pass(executor) == 2
+    assert sorted(safaricom.queried) == ['a', 'b']
+    assert list(reconciler._schedule) == ['b']
+
+def test_reconcile_maps_the_result_code(monkeypatch):
+    settled = []
+    monkeypatch.setattr(mpesa_reconciler, 'settle_transaction', lambda *args: settled.append(args))
+    replies = {'a': {"ResultCode": 0, "ResultDesc": "Paid"}, 'b': {"ResultCode": "1032", "ResultDesc": "Cancelled"},
+               'c': {"errorCode": "500.001.1001"}, 'd': None}
+    monkeypatch.setattr(mpesa_reconciler, 'query_stk_status', replies.get)
+
+    assert [mpesa_reconciler.reconcile(c) for c in 'abcd'] == ['completed', 'failed', None, None]
+    assert settled == [('a', 'completed', '0', 'Paid'), ('b', 'failed', '1032', 'Cancelled')]
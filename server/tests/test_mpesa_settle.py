@@ -0,0 +1,88 @@
+import pytest
+
+import database
+import mpesa
+import sqlite_db
+from mpesa import settle_transaction
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'gallery.db')
+    sqlite_db.create_schema(path)
+    database.set_connect_function(lambda: sqlite_db.connect(path))
+    yield sqlite_db.connect(path)
+    database.set_connect_function(database._connect)
+
+@pytest.fixture
+def events(monkeypatch):
+    """Catalog invalidations and published statuses, in order"""
+    events = []
+    monkeypatch.setattr(mpesa, 'invalidate', lambda table: events.append(('invalidate', table)))
+    monkeypatch.setattr(mpesa, 'publish_status', lambda *args: events.append(('publish',) + args))
+    return events
+
+def insert(connection, table, **values):
+    cursor = connection.cursor()
+    cursor.execute(f"INSERT INTO {table} ({', '.join(values)}) VALUES ({', '.join(['%s'] * len(values))})",
+                   tuple(values.values()))
+    connection.commit()
+    return cursor.lastrowid
+
+def query(connection, sql, *params):
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    return cursor.fetchone()
+
+@pytest.fixture
+def artwork_payment(db):
+    artwork_id = insert(db, 'artworks', title='Dawn', artist='Anon', description='-', price=100, image_url='a.jpg')
+    order_id = insert(db, 'artwork_orders', artwork_id=artwork_id, name='A', email='a@example.com', phone='0700',
+                      delivery_address='Nairobi', payment_method='mpesa', total_amount=100)
+    insert(db, 'mpesa_transactions', checkout_request_id='ws_CO_1', order_type='artwork', order_id=order_id,
+           amount=100)
+    return artwork_id, order_id
+
+@pytest.fixture
+def booking_payment(db):
+    exhibition_id = insert(db, 'exhibitions', title='Light', description='-', location='Nairobi',
+                           start_date='2026-01-01 10:00:00', end_date='2026-01-31 18:00:00',
+                           ticket_price=50, total_slots=10, available_slots=10)
+    booking_id = insert(db, 'exhibition_bookings', exhibition_id=exhibition_id, name='A', email='a@example.com',
+                        phone='0700', slots=3, payment_method='mpesa', total_amount=150)
+    insert(db, 'mpesa_transactions', checkout_request_id='ws_CO_2', order_type='exhibition', order_id=booking_id,
+           amount=150)
+    return exhibition_id, booking_id
+
+def test_completed_payment_settles_the_order(db, events, artwork_payment):
+    artwork_id, order_id = artwork_payment
+    assert settle_transaction('ws_CO_1', 'completed', '0', 'Paid') == {"success": True, "status": "completed"}
+
+    assert query(db, "SELECT status, result_code, result_desc FROM mpesa_transactions") == ('completed', '0', 'Paid')
+    assert query(db, "SELECT payment_status FROM artwork_orders WHERE id = %s", order_id) == ('completed',)
+    assert query(db, "SELECT status FROM artworks WHERE id = %s", artwork_id) == ('sold',)
+    assert events == [('invalidate', 'artworks'), ('publish', 'ws_CO_1', 'completed', 'Paid')]
+
+def test_repeated_settlement_is_a_no_op(db, events, booking_payment):
+    exhibition_id, _ = booking_payment
+    assert settle_transaction('ws_CO_2', 'completed', '0', 'Paid')["status"] == "completed"
+    assert settle_transaction('ws_CO_2', 'completed', '0', 'Paid') == {
+        "success": True, "status": "completed", "duplicate": True}
+
+    # The slots are taken once, and only the first settlement is announced
+    assert query(db, "SELECT available_slots FROM exhibitions WHERE id = %s", exhibition_id) == (7,)
+    assert events == [('invalidate', 'exhibitions'), ('publish', 'ws_CO_2', 'completed', 'Paid')]
+
+def test_final_status_is_not_overwritten(db, events, artwork_payment):
+    artwork_id, order_id = artwork_payment
+    settle_transaction('ws_CO_1', 'failed', '1032', 'Request cancelled by user')
+    assert settle_transaction('ws_CO_1', 'completed', '0', 'Paid') == {
+        "success": True, "status": "failed", "duplicate": True}
+
+    assert query(db, "SELECT status, result_code FROM mpesa_transactions") == ('failed', '1032')
+    assert query(db, "SELECT payment_status FROM artwork_orders WHERE id = %s", order_id) == ('failed',)
+    assert query(db, "SELECT status FROM artworks WHERE id = %s", artwork_id) == ('available',)
+    assert events == [('publish', 'ws_CO_1', 'failed', 'Request cancelled by user')]
+
+def test_unknown_transaction(db, events):
+    assert settle_transaction('ws_CO_missing', 'completed') == {"error": "Transaction not found"}
+    assert events == []
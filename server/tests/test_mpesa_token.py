@@ -0,0 +1,97 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import mpesa
+from mpesa import AccessTokenCache
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+@pytest.fixture
+def oauth(monkeypatch):
+    """Serves access tokens from `oauth.replies`, the latest reply repeating"""
+    oauth = SimpleNamespace(now=1000.0, replies=[], calls=0, gate=None, fetching=threading.Event())
+
+    def request(method, path, **kwargs):
+        assert path.startswith("/oauth/v1/generate")
+        oauth.calls += 1
+        oauth.fetching.set()
+        if oauth.gate:
+            oauth.gate.wait(5)
+        reply = oauth.replies[min(oauth.calls, len(oauth.replies)) - 1]
+        if isinstance(reply, Exception):
+            raise reply
+        return FakeResponse(reply)
+
+    monkeypatch.setattr(mpesa, '_request', request)
+    monkeypatch.setattr(mpesa, 'time', SimpleNamespace(monotonic=lambda: oauth.now))
+    return oauth
+
+def test_token_is_reused_until_the_refresh_margin(oauth):
+    oauth.replies = [{"access_token": "one", "expires_in": "3599"}, {"access_token": "two", "expires_in": "3599"}]
+    cache = AccessTokenCache(refresh_margin=60)
+    assert cache.get() == "one"
+    oauth.now += 3500
+    assert cache.get() == "one"
+    assert oauth.calls == 1
+
+    oauth.now += 40  # inside the margin
+    assert cache.get() == "two"
+    assert cache.stats() == {"fetches": 2, "failures": 0, "expires_in": 3599.0}
+
+def test_failed_refresh_keeps_the_valid_token(oauth):
+    oauth.replies = [{"access_token": "one", "expires_in": 100}, {"errorMessage": "busy"}]
+    cache = AccessTokenCache(refresh_margin=60)
+    assert cache.get() == "one"
+    oauth.now += 50
+    assert cache.get() == "one"
+    oauth.now += 50  # expired
+    assert cache.get() is None
+    assert cache.stats()["failures"] == 2
+
+    oauth.replies.append(ConnectionError("down"))
+    assert cache.get() is None
+    assert cache.stats()["failures"] == 3
+
+def test_invalidate_only_drops_the_rejected_token(oauth):
+    oauth.replies = [{"access_token": "one"}, {"access_token": "two"}]
+    cache = AccessTokenCache(refresh_margin=60)
+    assert cache.get() == "one"
+    cache.invalidate("stale")
+    assert cache.get() == "one"
+    cache.invalidate("one")
+    assert cache.get() == "two"
+
+def test_one_thread_fetches_an_expired_token(oauth):
+    oauth.replies = [{"access_token": "one"}]
+    oauth.gate = threading.Event()
+    cache = AccessTokenCache(refresh_margin=60)
+    with ThreadPoolExecutor(8) as pool:
+        results = [pool.submit(cache.get) for _ in range(8)]
+        oauth.gate.set()
+        assert {result.result() for result in results} == {"one"}
+    assert oauth.calls == 1
+
+def test_others_keep_the_old_token_during_a_refresh(oauth):
+    oauth.replies = [{"access_token": "one", "expires_in": 100}, {"access_token": "two"}]
+    cache = AccessTokenCache(refresh_margin=60)
+    assert cache.get() == "one"
+    oauth.now += 50
+
+    oauth.gate = threading.Event()
+    oauth.fetching.clear()
+    with ThreadPoolExecutor(1) as pool:
+        refresh = pool.submit(cache.get)
+        assert oauth.fetching.wait(5)
+        # The refresh is blocked on the API; nobody else waits for it
+        assert cache.get() == "one"
+        oauth.gate.set()
+        assert refresh.result() == "two"
+    assert cache.get() == "two"
@@ -0,0 +1,188 @@
+import io
+
+import pytest
+
+import image_store
+import multipart
+from image_store import ImageWriter
+from multipart import MultipartError, PayloadTooLarge, get_boundary, parse_header_options, parse_multipart
+
+BOUNDARY = 'xYzZY'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+class Writer:
+    """Collects one uploaded file in memory"""
+
+    def __init__(self, uploads, name, filename, content_type):
+        self.uploads = uploads
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.data = b''
+        self.state = 'open'
+        uploads.append(self)
+
+    def write(self, chunk):
+        self.data += chunk
+
+    def commit(self):
+        self.state = 'committed'
+        return (self.filename, self.content_type, self.data)
+
+    def abort(self):
+        self.state = 'aborted'
+
+@pytest.fixture
+def uploads():
+    return []
+
+def opener(uploads):
+    return lambda name, filename, content_type: Writer(uploads, name, filename, content_type)
+
+def field(name, value):
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n').encode() + value + b'\r\n'
+
+def file_part(name, filename, data, content_type='image/png'):
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n').encode() + data + b'\r\n'
+
+def body(*parts, preamble=b'', epilogue=b''):
+    return preamble + b''.join(parts) + f'--{BOUNDARY}--\r\n'.encode() + epilogue
+
+def parse(data, uploads=None, **limits):
+    stream = io.BytesIO(data)
+    open_file = opener(uploads) if uploads is not None else None
+    return parse_multipart(stream, len(data), CONTENT_TYPE, open_file, **limits)
+
+# Data that almost matches the delimiter must survive a split at any offset
+TRICKY = b'\x89PNG\r\n--xYzZ\r\n-\r\n--xYzZX\r\n--xYz' + bytes(range(256))
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 5, 7, 64, 64 * 1024])
+def test_fields_and_files_across_chunk_boundaries(monkeypatch, uploads, chunk_size):
+    monkeypatch.setattr(multipart, 'MULTIPART_CHUNK_SIZE', chunk_size)
+    data = body(field('title', 'Sunrise – Lamu'.encode()), file_part('image', 'a.png', TRICKY),
+                field('price', b'1500'), preamble=b'ignored preamble\r\n', epilogue=b'ignored epilogue')
+
+    fields, files = parse(data, uploads)
+
+    assert fields == {'title': 'Sunrise – Lamu', 'price': '1500'}
+    assert files == {'image': ('a.png', 'image/png', TRICKY)}
+    assert [writer.state for writer in uploads] == ['committed']
+
+def test_empty_field_and_body_without_parts():
+    assert parse(body(field('note', b''))) == ({'note': ''}, {})
+    assert parse(body()) == ({}, {})
+
+def test_body_over_limit_is_rejected_before_reading():
+    stream = io.BytesIO(b'')
+    with pytest.raises(PayloadTooLarge) as error:
+        parse_multipart(stream, 101, CONTENT_TYPE, max_body=100)
+    assert error.value.status == 413
+    assert stream.tell() == 0
+
+def test_file_over_limit_is_aborted(uploads):
+    data = body(file_part('image', 'big.png', b'x' * 101))
+    with pytest.raises(PayloadTooLarge, match='big.png'):
+        parse(data, uploads, max_file_size=100)
+    assert [writer.state for writer in uploads] == ['aborted']
+
+def test_file_at_limit_is_accepted(uploads):
+    _, files = parse(body(file_part('image', 'ok.png', b'x' * 100)), uploads, max_file_size=100)
+    assert files['image'][2] == b'x' * 100
+
+def test_field_over_limit(monkeypatch):
+    monkeypatch.setattr(multipart, 'MULTIPART_CHUNK_SIZE', 8)
+    with pytest.raises(PayloadTooLarge, match="'description'"):
+        parse(body(field('description', b'y' * 65)), max_field_size=64)
+
+def test_too_many_parts():
+    data = body(*[field(f'f{n}', b'v') for n in range(4)])
+    assert len(parse(data, max_parts=4)[0]) == 4
+    with pytest.raises(PayloadTooLarge, match='More than 3'):
+        parse(data, max_parts=3)
+
+def test_empty_file_is_rejected(uploads):
+    with pytest.raises(MultipartError, match='empty') as error:
+        parse(body(file_part('image', 'empty.png', b'')), uploads)
+    assert error.value.status == 400
+    assert [writer.state for writer in uploads] == ['aborted']
+
+def test_files_need_an_opener():
+    with pytest.raises(MultipartError, match='not accepted'):
+        parse(body(file_part('image', 'a.png', b'data')))
+
+def test_truncated_body(uploads):
+    data = body(file_part('image', 'a.png', b'x' * 50))
+    with pytest.raises(MultipartError, match='ended early'):
+        parse_multipart(io.BytesIO(data[:-25]), len(data), CONTENT_TYPE, opener(uploads))
+    assert [writer.state for writer in uploads] == ['aborted']
+
+@pytest.mark.parametrize('data', [
+    field('title', b'no closing boundary'),
+    b'no boundary at all',
+    f'--{BOUNDARY}XX\r\n'.encode(),
+    f'--{BOUNDARY}\r\nContent-Disposition: form-data\r\n\r\nvalue\r\n--{BOUNDARY}--'.encode(),
+    f'--{BOUNDARY}\r\nContent-Disposition: attachment; name="a"\r\n\r\nvalue\r\n--{BOUNDARY}--'.encode(),
+])
+def test_malformed_bodies(data):
+    with pytest.raises(MultipartError) as error:
+        parse(data)
+    assert error.value.status == 400
+
+def test_oversized_part_headers(monkeypatch):
+    monkeypatch.setattr(multipart, '_MAX_HEADER_SIZE', 64)
+    monkeypatch.setattr(multipart, 'MULTIPART_CHUNK_SIZE', 16)
+    data = body(field('x' * 100, b'value'))
+    with pytest.raises(MultipartError, match='headers too large'):
+        parse(data)
+
+@pytest.mark.parametrize('content_type', [
+    'application/json',
+    'multipart/form-data',
+    'multipart/form-data; boundary=',
+    'multipart/form-data; boundary=' + 'b' * 71,
+])
+def test_invalid_boundary(content_type):
+    with pytest.raises(MultipartError, match='boundary'):
+        get_boundary(content_type)
+
+def test_quoted_boundary_and_options():
+    assert get_boundary('Multipart/Form-Data; boundary="a=b c"') == b'a=b c'
+    assert parse_header_options('form-data; name="image"; filename="my \\"best\\".png"') == (
+        'form-data', {'name': 'image', 'filename': 'my "best".png'})
+
+def test_later_failure_aborts_committed_files(uploads):
+    data = body(file_part('image', 'a.png', b'x' * 10), file_part('extra', 'b.png', b'y' * 101))
+    with pytest.raises(PayloadTooLarge):
+        parse(data, uploads, max_file_size=100)
+    assert [writer.state for writer in uploads] == ['aborted', 'aborted']
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_store, 'UPLOADS_DIR', str(tmp_path))
+    return tmp_path
+
+def stored_files(root):
+    return sorted(str(path.relative_to(root)) for path in root.rglob('*') if path.is_file())
+
+def parse_into_store(data, **limits):
+    return parse_multipart(io.BytesIO(data), len(data), CONTENT_TYPE,
+                           lambda name, filename, content_type: ImageWriter(), **limits)
+
+def test_rejected_body_leaves_no_files_in_the_store(store):
+    data = body(file_part('image', 'a.png', PNG), file_part('extra', 'b.png', PNG + b'\x00' * 100))
+    with pytest.raises(PayloadTooLarge):
+        parse_into_store(data, max_file_size=100)
+    assert stored_files(store) == []
+
+def test_rejected_body_keeps_images_stored_earlier(store):
+    _, files = parse_into_store(body(file_part('image', 'a.png', PNG)))
+    before = stored_files(store)
+    assert len(before) == 1 and files['image'].endswith('.png')
+
+    data = body(file_part('image', 'a.png', PNG), field('note', b'z' * 65))
+    with pytest.raises(PayloadTooLarge):
+        parse_into_store(data, max_field_size=64)
+    assert stored_files(store) == before
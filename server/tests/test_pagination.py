@@ -0,0 +1,95 @@
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+
+from pagination import (decode_cursor, encode_cursor, keyset_clause, limit_clause,
+                        parse_page_params, split_page)
+
+@pytest.mark.parametrize('sort_value, expected', [
+    (datetime(2025, 3, 4, 5, 6, 7), '2025-03-04 05:06:07'),
+    (date(2025, 3, 4), '2025-03-04'),
+    ('Nairobi', 'Nairobi'),
+    (1500, 1500),
+    (12.5, 12.5),
+    (None, None),  # nullable sort columns such as created_at
+])
+def test_cursor_round_trip(sort_value, expected):
+    cursor = encode_cursor(sort_value, 42)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (expected, 42)
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'not a cursor!',
+    encode_cursor('2025-01-01', 1)[:-3],
+    encode_cursor('2025-01-01', '1'),  # id must be an integer
+    encode_cursor(['a'], 1),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor)
+
+def test_split_page_without_limit_returns_everything():
+    rows = [(3, 'c'), (2, 'b'), (1, 'a')]
+    assert split_page(rows, None, 1, 0) == (rows, None)
+
+def test_split_page_short_page_has_no_cursor():
+    rows = [(3, 'c'), (2, 'b')]
+    assert split_page(rows, 2, 1, 0) == (rows, None)
+
+def test_split_page_drops_look_ahead_row():
+    rows = [(3, 'c'), (2, 'b'), (1, 'a')]
+    page, cursor = split_page(rows, 2, 1, 0)
+    assert page == rows[:2]
+    assert decode_cursor(cursor) == ('b', 2)
+
+def test_keyset_clause_direction():
+    assert keyset_clause('created_at', 'id', None) == ("", ())
+    sql, params = keyset_clause('created_at', 'id', ('2025-01-01', 7), nullable=False)
+    assert sql == "(created_at < %s OR (created_at = %s AND id < %s))"
+    assert params == ('2025-01-01', '2025-01-01', 7)
+    sql, _ = keyset_clause('start_date', 'id', ('2025-01-01', 7), descending=False)
+    assert sql == "(start_date > %s OR (start_date = %s AND id > %s))"
+
+def test_keyset_clause_with_nulls():
+    sql, _ = keyset_clause('created_at', 'id', ('2025-01-01', 7))
+    assert sql == "(created_at < %s OR (created_at = %s AND id < %s) OR created_at IS NULL)"
+    assert keyset_clause('created_at', 'id', (None, 7)) == ("(created_at IS NULL AND id < %s)", (7,))
+    assert keyset_clause('created_at', 'id', (None, 7), descending=False) == (
+        "((created_at IS NULL AND id > %s) OR created_at IS NOT NULL)", (7,))
+
+@pytest.mark.parametrize('descending', [True, False])
+def test_pages_cover_rows_with_null_sort_values(descending):
+    rows = [(1, '2025-01-02'), (2, None), (3, '2025-01-01'), (4, None), (5, '2025-01-02'), (6, '2025-01-03')]
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, created_at TEXT)")
+    connection.executemany("INSERT INTO t VALUES (?, ?)", rows)
+    order = "DESC" if descending else "ASC"
+
+    seen, after = [], None
+    while True:
+        where_sql, where_params = keyset_clause('created_at', 'id', after, descending=descending)
+        limit_sql, limit_params = limit_clause(2)
+        query = (f"SELECT id, created_at FROM t {'WHERE ' + where_sql if where_sql else ''} "
+                 f"ORDER BY created_at {order}, id {order} {limit_sql}").replace('%s', '?')
+        page, cursor = split_page(connection.execute(query, where_params + limit_params).fetchall(), 2, 1, 0)
+        seen += [row[0] for row in page]
+        if cursor is None:
+            break
+        after = parse_page_params({'limit': '2', 'cursor': cursor})[1]
+
+    expected = connection.execute(f"SELECT id FROM t ORDER BY created_at {order}, id {order}").fetchall()
+    assert seen == [row[0] for row in expected]
+
+def test_limit_clause_fetches_one_extra_row():
+    assert limit_clause(None) == ("", ())
+    assert limit_clause(10) == ("LIMIT %s", (11,))
+
+def test_parse_page_params():
+    assert parse_page_params({}) == (None, None)
+    assert parse_page_params({'cursor': encode_cursor('x', 3)}) == (50, ('x', 3))
+    assert parse_page_params({'limit': '1000'}) == (200, None)
+    for bad in ('0', 'ten'):
+        with pytest.raises(ValueError):
+            parse_page_params({'limit': bad})
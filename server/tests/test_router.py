@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from router import ADMIN, ARTIST, PUBLIC, USER, Route, Router, check_roles
+
+def handler(name):
+    return lambda *args, **kwargs: name
+
+@pytest.fixture
+def router():
+    router = Router()
+    router.add('GET', '/artworks', handler('list'))
+    router.add('GET', '/artworks/{artwork_id:int}', handler('show'))
+    router.add('GET', '/artworks/featured', handler('featured'))
+    router.add('get', '/tickets/generate/{booking_id}', handler('ticket'), USER)
+    router.add('GET', '/{page}/about', handler('about'))
+    return router
+
+def matched(router, method, path):
+    route, params = router.match(method, path)
+    return (route.handler() if route else None), params
+
+def test_static_and_typed_routes(router):
+    assert matched(router, 'GET', '/artworks') == ('list', {})
+    assert matched(router, 'GET', '/artworks/42') == ('show', {'artwork_id': 42})
+    assert matched(router, 'GET', '/tickets/generate/AB-12') == ('ticket', {'booking_id': 'AB-12'})
+
+def test_static_route_wins_over_parameter(router):
+    assert matched(router, 'GET', '/artworks/featured') == ('featured', {})
+
+def test_leading_parameter_routes(router):
+    assert matched(router, 'GET', '/gallery/about') == ('about', {'page': 'gallery'})
+
+@pytest.mark.parametrize('method, path', [
+    ('GET', '/artworks/abc'),        # int converter
+    ('GET', '/artworks/42/extra'),   # segment count
+    ('POST', '/artworks/42'),        # method
+    ('GET', '/exhibitions'),
+    ('GET', '/'),
+])
+def test_unmatched_requests(router, method, path):
+    assert router.match(method, path) == (None, None)
+
+def test_unknown_converter_is_rejected():
+    with pytest.raises(ValueError, match="Unknown path parameter type 'uuid'"):
+        Route('GET', '/things/{id:uuid}', None, PUBLIC)
+
+def test_route_roles():
+    assert Route('GET', '/a', None, ADMIN).roles == (ADMIN,)
+    assert Route('GET', '/a', None, (ADMIN, ARTIST)).roles == (ADMIN, ARTIST)
+    assert Route('GET', '/a', None, PUBLIC).is_public
+    assert not Route('GET', '/a', None, USER).is_public
+
+@pytest.mark.parametrize('roles, claims, allowed', [
+    ((PUBLIC,), {}, True),
+    ((USER,), {}, True),
+    ((ADMIN,), {"is_admin": True}, True),
+    ((ADMIN,), {"is_artist": True}, False),
+    ((ADMIN, ARTIST), {"is_artist": True}, True),
+    ((ARTIST,), {"is_admin": True}, False),
+])
+def test_check_roles(roles, claims, allowed):
+    assert (check_roles(roles, claims) is None) == allowed
+
+def test_check_roles_names_the_required_roles():
+    assert check_roles((ADMIN, ARTIST), {}) == (403, "Unauthorized access: Admin or Artist privileges required")
+
+def test_server_enforces_route_roles(api, token):
+    response = api.request('GET', '/orders')
+    assert (response.status, json.loads(response.body)) == (401, {"error": "Authentication required"})
+
+    response = api.request('GET', '/orders', token='not-a-jwt')
+    assert response.status == 401
+
+    response = api.request('GET', '/orders', token=token(is_artist=True))
+    assert response.status == 403
+    assert json.loads(response.body)["error"] == "Unauthorized access: Admin privileges required"
+
+    response = api.request('GET', '/orders', token=token(is_admin=True))
+    assert response.status == 200
+
+    assert api.request('GET', '/no/such/route').status == 404
+    assert api.request('GET', '/artworks/not-a-number').status == 404
@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import catalog_cache
+from catalog_cache import TTLCache
+from singleflight import SingleFlight
+
+def blocking_loader(result):
+    """Loader that counts its calls and blocks until released"""
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return load, release, calls
+
+def wait_for_waiters(flights, count):
+    for _ in range(500):
+        if flights.stats()["shared"] >= count:
+            return
+        time.sleep(0.01)
+    raise AssertionError("callers never joined the flight")
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    load, release, calls = blocking_loader({"rows": [1, 2]})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flights.do, 'key', load) for _ in range(8)]
+        wait_for_waiters(flights, 7)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flights.stats() == {"executions": 1, "shared": 7, "in_flight": 0}
+
+def test_waiters_receive_the_leaders_exception():
+    flights = SingleFlight()
+    load, release, calls = blocking_loader(RuntimeError("database down"))
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flights.do, 'key', load) for _ in range(4)]
+        wait_for_waiters(flights, 3)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match='database down'):
+                future.result()
+    assert len(calls) == 1
+
+def test_different_keys_and_later_calls_run_separately():
+    flights = SingleFlight()
+    assert flights.do('a', lambda: 1) == 1
+    assert flights.do('b', lambda: 2) == 2
+    assert flights.do('a', lambda: 3) == 3  # the first flight has landed
+    assert flights.stats() == {"executions": 3, "shared": 0, "in_flight": 0}
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(catalog_cache, '_cache', TTLCache(max_size=8, ttl=60))
+    monkeypatch.setattr(catalog_cache, '_flights', SingleFlight())
+
+def test_cached_coalesces_concurrent_misses(fresh_cache):
+    load, release, calls = blocking_loader(["artwork"])
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        futures = [pool.submit(catalog_cache.cached, 'artworks', ('list', None, None), load)
+                   for _ in range(6)]
+        wait_for_waiters(catalog_cache._flights, 5)
+        release.set()
+        assert [future.result() for future in futures] == [["artwork"]] * 6
+    assert len(calls) == 1
+
+    # The shared result was cached, so the next call never reaches the loader
+    assert catalog_cache.cached('artworks', ('list', None, None), lambda: ["stale"]) == ["artwork"]
+
+def test_cached_does_not_store_error_payloads(fresh_cache):
+    error = {"error": "Database connection failed"}
+    assert catalog_cache.cached('exhibitions', ('list',), lambda: error) == error
+    assert catalog_cache.cached('exhibitions', ('list',), lambda: ["ok"]) == ["ok"]
+
+def test_invalidate_forces_a_reload(fresh_cache):
+    assert catalog_cache.cached('artworks', ('detail', 1), lambda: "old") == "old"
+    catalog_cache.invalidate('artworks')
+    assert catalog_cache.cached('artworks', ('detail', 1), lambda: "new") == "new"
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+import static_files
+from static_files import cache_control, http_date, not_modified_since, parse_range, resolve_static_path
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('bytes=0-99', (0, 99)),
+    ('bytes=900-', (900, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=-5000', (0, 999)),
+    ('bytes=990-5000', (990, 999)),
+    ('bytes=1000-', False),
+    ('bytes=50-10', False),
+    ('bytes=-0', False),
+    ('bytes=0-1,5-6', None),  # multiple ranges: whole file
+    ('items=0-1', None),
+    ('bytes=-', None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+def test_not_modified_since():
+    mtime = 1_700_000_000.7
+    assert not_modified_since(http_date(mtime), mtime)
+    assert not_modified_since(http_date(mtime + 60), mtime)
+    assert not not_modified_since(http_date(mtime - 60), mtime)
+    assert not not_modified_since(None, mtime)
+    assert not not_modified_since('yesterday', mtime)
+
+def test_cache_control():
+    assert cache_control('/x/uploads/3f2a9c0d1e2b4a5f.jpg').endswith('immutable')
+    assert cache_control('/x/uploads/ab/cd/abcd3f2a9c0d1e2b4a5f.w640.webp').endswith('immutable')
+    assert cache_control('/x/css/site.css') == f'public, max-age={static_files.STATIC_MAX_AGE}'
+
+@pytest.mark.parametrize('url_path', [
+    '/static/../server.py',
+    '/static/%2e%2e/server.py',
+    '/static/uploads/../../server.py',
+    '/static/uploads//a.jpg',
+    '/static/a%00.jpg',
+    '/static/..%5cserver.py',
+    '/static/',
+    '/uploads/a.jpg',
+])
+def test_unsafe_paths_are_rejected(url_path):
+    assert resolve_static_path(url_path) is None
+
+def test_resolve_static_path():
+    assert resolve_static_path('/static/uploads/a%20b.jpg') == os.path.join(static_files.STATIC_ROOT, 'uploads', 'a b.jpg')
+
+@pytest.fixture
+def static(api, tmp_path, monkeypatch):
+    root = tmp_path / 'static'
+    root.mkdir()
+    (root / 'data.bin').write_bytes(bytes(range(256)) * 4)
+    os.utime(root / 'data.bin', (1_700_000_000, 1_700_000_000))
+    monkeypatch.setattr(static_files, 'STATIC_ROOT', str(root))
+    return api
+
+def test_whole_file(static):
+    response = static.request('GET', '/static/data.bin')
+    assert response.status == 200
+    assert response.body == bytes(range(256)) * 4
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Last-Modified'] == http_date(1_700_000_000)
+
+    assert static.request('GET', '/static/missing.bin').status == 404
+    assert static.request('GET', '/static/../data.bin').status == 404
+
+def test_range_requests(static):
+    response = static.request('GET', '/static/data.bin', headers={'Range': 'bytes=10-19'})
+    assert response.status == 206
+    assert response.body == bytes(range(10, 20))
+    assert response.headers['Content-Range'] == 'bytes 10-19/1024'
+    assert response.headers['Content-Length'] == '10'
+
+    response = static.request('GET', '/static/data.bin', headers={'Range': 'bytes=-4'})
+    assert (response.status, response.body) == (206, bytes(range(252, 256)))
+
+    response = static.request('GET', '/static/data.bin', headers={'Range': 'bytes=2000-'})
+    assert response.status == 416
+    assert response.headers['Content-Range'] == 'bytes */1024'
+
+def test_if_range_must_match_last_modified(static):
+    current = http_date(1_700_000_000)
+    response = static.request('GET', '/static/data.bin', headers={'Range': 'bytes=0-0', 'If-Range': current})
+    assert response.status == 206
+
+    stale = http_date(1_600_000_000)
+    response = static.request('GET', '/static/data.bin', headers={'Range': 'bytes=0-0', 'If-Range': stale})
+    assert response.status == 200 and len(response.body) == 1024
+
+def test_if_modified_since(static):
+    response = static.request('GET', '/static/data.bin', headers={'If-Modified-Since': http_date(1_700_000_000)})
+    assert (response.status, response.body) == (304, b'')
+    assert response.headers['Last-Modified'] == http_date(1_700_000_000)
+
+    response = static.request('GET', '/static/data.bin', headers={'If-Modified-Since': http_date(1_600_000_000)})
+    assert response.status == 200
@@ -0,0 +1,64 @@
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+
+import middleware
+from middleware import SECRET_KEY, VerifiedTokenCache, verify_token
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(middleware, 'time', SimpleNamespace(time=lambda: now[0]))
+    return now
+
+def test_entries_expire_with_the_token(clock):
+    cache = VerifiedTokenCache()
+    cache.set('a', {"sub": "1", "exp": clock[0] + 60})
+    assert cache.get('a') == {"sub": "1", "exp": clock[0] + 60}
+
+    clock[0] += 60
+    assert cache.get('a') is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "size": 0, "max_size": 1024}
+
+def test_tokens_without_exp_are_not_cached(clock):
+    cache = VerifiedTokenCache()
+    cache.set('a', {"sub": "1"})
+    cache.set('b', {"sub": "1", "exp": "tomorrow"})
+    assert cache.get('a') is None and cache.get('b') is None
+    assert cache.stats()["size"] == 0
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = VerifiedTokenCache(max_size=2)
+    for token in 'ab':
+        cache.set(token, {"sub": token, "exp": clock[0] + 60})
+    cache.get('a')
+    cache.set('c', {"sub": "c", "exp": clock[0] + 60})
+
+    assert cache.get('b') is None
+    assert cache.get('a')["sub"] == "a" and cache.get('c')["sub"] == "c"
+    assert cache.stats()["evictions"] == 1
+
+def test_get_returns_a_copy(clock):
+    cache = VerifiedTokenCache()
+    cache.set('a', {"sub": "1", "exp": clock[0] + 60})
+    cache.get('a')["is_admin"] = True
+    assert "is_admin" not in cache.get('a')
+
+def test_verify_token_reuses_the_verification(monkeypatch):
+    monkeypatch.setattr(middleware, '_token_cache', VerifiedTokenCache())
+    token = jwt.encode({"sub": "7", "name": "Test", "exp": int(time.time()) + 60}, SECRET_KEY, algorithm="HS256")
+
+    decode = jwt.decode
+    calls = []
+    monkeypatch.setattr(middleware.jwt, 'decode', lambda *args, **kwargs: calls.append(1) or decode(*args, **kwargs))
+
+    assert verify_token(token)["sub"] == "7"
+    assert verify_token(token)["sub"] == "7"
+    assert len(calls) == 1
+
+    expired = jwt.encode({"sub": "7", "exp": int(time.time()) - 1}, SECRET_KEY, algorithm="HS256")
+    assert verify_token(expired) == {"error": "Token expired"}
+    assert verify_token('not-a-jwt')["error"].startswith("Invalid token")
+    assert middleware.token_cache_stats()["size"] == 1
@@ -0,0 +1,67 @@
+import http.client
+import threading
+import time
+
+import pytest
+
+from worker_server import PooledRequestHandler, ThreadPoolServer
+
+class EchoHandler(PooledRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = 15
+    busy_idle_timeout = 0.5
+
+    def do_GET(self):
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        if self.server_busy():
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadPoolServer(('127.0.0.1', 0), EchoHandler, workers=2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def get(connection, path):
+    connection.request('GET', path)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+def test_idle_keepalive_connections_yield_to_waiting_clients(server):
+    port = server.server_address[1]
+    # Every worker is held by an idle keep-alive connection
+    idle = [http.client.HTTPConnection('127.0.0.1', port, timeout=10) for _ in range(server.workers)]
+    for connection in idle:
+        assert get(connection, '/warm') == (200, b'/warm')
+
+    started = time.monotonic()
+    assert get(http.client.HTTPConnection('127.0.0.1', port, timeout=10), '/new') == (200, b'/new')
+    assert time.monotonic() - started < 3
+
+def test_idle_connection_stays_open_when_pool_is_free(server):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+    assert get(connection, '/one') == (200, b'/one')
+    time.sleep(1)  # longer than busy_idle_timeout
+    sock = connection.sock
+    assert get(connection, '/two') == (200, b'/two')
+    assert connection.sock is sock
+
+def test_pipelined_requests_are_served(server):
+    import socket
+    with socket.create_connection(server.server_address, timeout=5) as sock:
+        sock.sendall(b'GET /a HTTP/1.1\r\nHost: x\r\n\r\nGET /b HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+        data = b''
+        while chunk := sock.recv(4096):
+            data += chunk
+    assert data.count(b'HTTP/1.1 200') == 2
+    assert data.endswith(b'/b')
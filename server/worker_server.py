@@ -0,0 +1,232 @@
+import http.server
+import os
+import queue
+import selectors
+import signal
+import socket
+import socketserver
+import threading
+import time
+from app_logging import get_logger, shutdown_logging
+
+logger = get_logger(__name__)
+
+# HTTP server variants used by server.main()
+#
+# ThreadPoolServer replaces socketserver.ThreadingTCPServer: instead of one new
+# thread per connection it hands accepted sockets to a fixed set of worker
+# threads. serve_prefork() runs several such servers in child processes that
+# all bind the same port with SO_REUSEPORT so the kernel spreads connections
+# across them.
+
+class ThreadPoolServer(socketserver.TCPServer):
+    """TCP server that processes requests on a fixed-size worker thread pool"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, workers=16, backlog=128,
+                 queue_size=None, reuse_port=False):
+        self.workers = max(1, int(workers))
+        # Size of the kernel accept backlog passed to listen()
+        self.request_queue_size = max(1, int(backlog))
+        self.reuse_port = reuse_port
+        # Accepted connections waiting for a free worker. When it is full the
+        # accept loop blocks and further clients queue in the kernel backlog.
+        self._pending = queue.Queue(maxsize=queue_size or self.workers * 4)
+        self._threads = []
+        # Connections a handler took over (see detach_request)
+        self._detached = set()
+        self._detached_lock = threading.Lock()
+        socketserver.TCPServer.__init__(self, server_address, handler_class)
+        self._start_workers()
+
+    def server_bind(self):
+        if self.reuse_port:
+            if not hasattr(socket, "SO_REUSEPORT"):
+                raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        socketserver.TCPServer.server_bind(self)
+
+    def _start_workers(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"http-worker-{i}")
+            thread.daemon = self.daemon_threads
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                with self._detached_lock:
+                    detached = request in self._detached
+                    self._detached.discard(request)
+                if not detached:
+                    self.shutdown_request(request)
+
+    def has_waiting_connections(self):
+        """True while accepted connections are queued for a free worker"""
+        return not self._pending.empty()
+
+    def detach_request(self, request):
+        """Keep the connection open after the handler returns
+
+        For long-lived responses (e.g. event streams) that are written from
+        another thread: the worker goes back to the pool and whoever took the
+        socket is responsible for closing it.
+        """
+        with self._detached_lock:
+            self._detached.add(request)
+
+    def process_request(self, request, client_address):
+        """Queue the connection for the worker pool instead of spawning a thread"""
+        self._pending.put((request, client_address))
+
+    def server_close(self):
+        socketserver.TCPServer.server_close(self)
+        for _ in self._threads:
+            self._pending.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+# How often an idle keep-alive connection checks whether others are waiting
+_IDLE_POLL_INTERVAL = 0.25
+
+class PooledRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Request handler for ThreadPoolServer that gives idle workers back
+
+    A kept-alive connection holds its pool worker while it waits for the next
+    request. As long as no other connection is queued that is harmless, and
+    the connection may stay idle for `timeout` seconds. Once connections are
+    waiting for a worker, an idle connection is closed after
+    `busy_idle_timeout` seconds instead; subclasses should also stop offering
+    keep-alive while server_busy() is true.
+    """
+
+    busy_idle_timeout = 1.0
+
+    def setup(self):
+        super().setup()
+        self._kept_alive = False
+
+    def server_busy(self):
+        return self.server.has_waiting_connections()
+
+    def handle_one_request(self):
+        if self._kept_alive and not self._wait_for_request():
+            self.close_connection = True
+            return
+        super().handle_one_request()
+        self._kept_alive = True
+
+    def _wait_for_request(self):
+        """Wait for the next request on this connection; False to close it instead"""
+        # A pipelined request may already be in the read buffer
+        self.connection.setblocking(False)
+        try:
+            if self.rfile.peek(1):
+                return True
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+        idle_since = time.monotonic()
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.connection, selectors.EVENT_READ)
+            while True:
+                if selector.select(_IDLE_POLL_INTERVAL):
+                    return True  # a request, or EOF which ends the loop anyway
+                idle = time.monotonic() - idle_since
+                if self.timeout is not None and idle >= self.timeout:
+                    return False
+                if idle >= self.busy_idle_timeout and self.server_busy():
+                    return False
+
+def serve_prefork(server_address, handler_class, processes=2, workers=16, backlog=128, child_init=None):
+    """Run `processes` worker processes that share the listening port
+
+    Each child runs its own ThreadPoolServer bound with SO_REUSEPORT. The
+    parent only supervises: it restarts children that exit unexpectedly and
+    forwards SIGINT/SIGTERM to them on shutdown. child_init(slot), if given,
+    runs in each child (including restarts) before it starts serving.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("Pre-fork mode requires SO_REUSEPORT support")
+
+    children = {}
+    stopping = False
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            # Never fall back into the supervisor loop below: the child has a
+            # copy of `children` and the parent's signal handlers
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                if child_init is not None:
+                    child_init(slot)
+                _run_child(server_address, handler_class, workers, backlog)
+            except BaseException:
+                logger.exception("Worker process %s (slot %s) failed", os.getpid(), slot)
+                shutdown_logging()  # os._exit skips atexit
+                os._exit(1)
+            shutdown_logging()
+            os._exit(0)
+        children[pid] = slot
+        logger.info("Started worker process %s (slot %s)", pid, slot)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for slot in range(max(1, int(processes))):
+        spawn(slot)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None:
+            continue
+        if not stopping:
+            logger.warning("Worker process %s exited with status %s, restarting", pid, status)
+            time.sleep(1)
+            spawn(slot)
+
+def _run_child(server_address, handler_class, workers, backlog):
+    # Children shut down cleanly on SIGTERM from the parent; Ctrl+C goes to
+    # the whole process group so let the parent coordinate it.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    httpd = ThreadPoolServer(server_address, handler_class, workers=workers,
+                             backlog=backlog, reuse_port=True)
+
+    def stop(signum, frame):
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()